@@ -0,0 +1,43 @@
+import asyncio
+import logging
+from datetime import timedelta
+
+from Services.Tasks.repository import open_tasks_repository
+
+
+class TasksArchiver:
+    """
+        Background mover of old DONE tasks into tasks_archive.
+        Works in bounded batches (one short transaction each) with a pause in between
+    """
+
+    def __init__(self, older_than_days: int, batch_size: int = 1000, max_batches: int = 100, pause: float = 0.1):
+        self.older_than = timedelta(days=older_than_days)
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.pause = pause
+
+
+    async def archive(self, database) -> int:
+        archived = 0
+        async with open_tasks_repository(database) as repository:
+            for _ in range(self.max_batches):
+                moved = await repository.archive_done(self.older_than, self.batch_size)
+                archived += moved
+                if moved < self.batch_size:
+                    break
+                await asyncio.sleep(self.pause)
+
+        if archived:
+            logging.info(f"Archived tasks: {archived}")
+        return archived
+
+
+    async def run_forever(self, database, interval: int) -> None:
+        """archival loop, started from the app lifespan"""
+        while True:
+            try:
+                await self.archive(database)
+            except Exception as e:
+                logging.error(f"Tasks archival failed: {e}")
+            await asyncio.sleep(interval)
@@ -0,0 +1,69 @@
+import logging
+
+from fastapi import APIRouter, HTTPException, Depends
+
+from Services.Tasks.model import Task
+from Services.Tasks.schema import BatchRequest, BatchResult, BatchResultsAdapter, BatchCreateTask, BatchUpdateTask, \
+    BatchDeleteTask, BatchGetTask, TaskRead
+from Services.Tasks.router import write_rate_limit
+from Services.Tasks.serivce import tasks_service, TasksService
+from Shared.Auth.auth import get_me
+from Shared.CustomError.custom_error import NotFoundInDBError, ArchivedRecordError
+from Shared.Utils.Responses import AdapterJSONResponse
+
+batch_router = APIRouter()
+
+
+class BatchOperationError(Exception):
+    def __init__(self, index: int, status: int, detail: str):
+        self.index = index
+        self.status = status
+        self.detail = detail
+
+
+async def run_operation(operation, tasks: TasksService, me) -> BatchResult:
+    if isinstance(operation, BatchCreateTask):
+        db_task = await tasks.create_task({**operation.data.__dict__, "customer_name": me.name, "user_id": me.id})
+        return BatchResult(201, TaskRead.model_validate(db_task))
+    if isinstance(operation, BatchUpdateTask):
+        db_task = await tasks.update_task({**operation.data.__dict__}, operation.id)
+        return BatchResult(200, TaskRead.model_validate(db_task))
+    if isinstance(operation, BatchDeleteTask):
+        await tasks.delete_task(operation.id)
+        return BatchResult(204)
+    if isinstance(operation, BatchGetTask):
+        return BatchResult(200, TaskRead.model_validate(await tasks.get_task(operation.id)))
+
+    filters = {Task.status: operation.status, Task.priority: operation.priority}
+    min_filters = {Task.priority: operation.min_priority}
+    sort = operation.sort.value if operation.sort else None
+    db_tasks = await tasks.get_by_filters(operation.created_at, filters, min_filters=min_filters, sort=sort,
+                                          order=operation.order.value, limit=operation.limit)
+    return BatchResult(200, db_tasks)
+
+
+@batch_router.post('/batch', name='несколько операций с задачами одним запросом и одной транзакцией',
+                   response_model=list[BatchResult], dependencies=[Depends(write_rate_limit)])
+async def batch(request: BatchRequest, tasks = tasks_service, me=Depends(get_me)):
+    """
+        operations run in order in one transaction: if one fails nothing is committed
+        and the response is that operation's error with its index
+    """
+    try:
+        results = []
+        async with tasks.single_transaction():
+            for index, operation in enumerate(request.operations):
+                try:
+                    results.append(await run_operation(operation, tasks, me))
+                except ArchivedRecordError:
+                    raise BatchOperationError(index, 409, 'Задача перенесена в архив')
+                except NotFoundInDBError:
+                    raise BatchOperationError(index, 404, 'Задача не найдена')
+        logging.info(f"Batch of {len(results)} task operations")
+
+        return AdapterJSONResponse(results, BatchResultsAdapter)
+    except BatchOperationError as e:
+        raise HTTPException(status_code=e.status, detail={"index": e.index, "detail": e.detail})
+    except Exception as e:
+        logging.error(f"Unexpected error in batch: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=e)
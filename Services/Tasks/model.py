@@ -1,20 +1,115 @@
-from sqlalchemy import ForeignKey, Enum
+from datetime import datetime
+
+from sqlalchemy import ForeignKey, Enum, Index, BigInteger, Sequence, UniqueConstraint, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from Services.Tasks.schema import TaskStatus, TaskPriority
 from Shared.Base.BaseModel import Base
+from Shared.Base.Types import IntEnum
+
+
+# bumped on every insert/update/delete of a task, cursor for delta sync
+tasks_change_seq = Sequence("tasks_change_seq", metadata=Base.metadata)
 
 
 class Task(Base):
+    # in Postgres the table is range-partitioned by created_at with PK (id, created_at),
+    # see migration 2e171948245e; the mapping itself does not need to know about it
     __tablename__ = "tasks"
+    __table_args__ = (
+        # covers the filter columns plus updated_at: ETag version query is index-only
+        Index("ix_tasks_status_priority_created_at", "status", "priority", "created_at",
+              postgresql_include=["updated_at"]),
+        # one index per supported sort: top-N is an index scan with early stop (either direction)
+        Index("ix_tasks_priority_id", "priority", "id"),
+        Index("ix_tasks_created_at_id", "created_at", "id"),
+        Index("ix_tasks_updated_at_id", "updated_at", "id"),
+        # archival candidates
+        Index("ix_tasks_done_updated_at", "updated_at", postgresql_where=text("status = 'DONE'")),
+        # work queue: claim order is highest priority, then oldest; unleased tasks and leases
+        # (expired ones found by claimed_until) are indexed apart, a claim never scans live leases
+        Index("ix_tasks_unclaimed_priority_id", text("priority DESC"), "id",
+              postgresql_where=text("status = 'PENDING' AND claimed_until IS NULL")),
+        Index("ix_tasks_pending_claimed_until", "claimed_until",
+              postgresql_where=text("status = 'PENDING' AND claimed_until IS NOT NULL")),
+    )
 
 
     customer_name: Mapped[str] = mapped_column(nullable=False)
     title: Mapped[str] = mapped_column()
     description: Mapped[str] = mapped_column(nullable=False)
     status: Mapped[str] = mapped_column(Enum(TaskStatus), default=TaskStatus.PENDING)
-    priority: Mapped[int] = mapped_column(Enum(TaskPriority), default=TaskPriority.MEDIUM)
+    priority: Mapped[int] = mapped_column(IntEnum(TaskPriority), default=TaskPriority.MEDIUM)
+    change_seq: Mapped[int] = mapped_column(BigInteger, tasks_change_seq, index=True,
+                                            server_default=tasks_change_seq.next_value())
+    # work queue lease: a PENDING task is claimable when claimed_until is empty or in the past
+    claimed_by: Mapped[int | None] = mapped_column(nullable=True)
+    claimed_until: Mapped[datetime | None] = mapped_column(nullable=True)
+
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    user = relationship("User", back_populates="tasks")
+
+
+class TaskTombstone(Base):
+    """deleted task marker for delta sync"""
+    __tablename__ = "task_tombstones"
+
+    record_id: Mapped[int] = mapped_column(nullable=False)
+    change_seq: Mapped[int] = mapped_column(BigInteger, nullable=False, index=True)
+
+
+class ArchivedTask(Base):
+    """
+        DONE task moved out of the hot table, same columns as Task.
+        Only the primary key and user_id are indexed to keep the table compact
+    """
+    __tablename__ = "tasks_archive"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    customer_name: Mapped[str] = mapped_column(nullable=False)
+    title: Mapped[str] = mapped_column()
+    description: Mapped[str] = mapped_column(nullable=False)
+    status: Mapped[str] = mapped_column(Enum(TaskStatus))
+    priority: Mapped[int] = mapped_column(IntEnum(TaskPriority))
+    change_seq: Mapped[int] = mapped_column(BigInteger)
+    claimed_by: Mapped[int | None] = mapped_column(nullable=True)
+    claimed_until: Mapped[datetime | None] = mapped_column(nullable=True)
+    archived_at: Mapped[datetime] = mapped_column(default=datetime.utcnow, nullable=False)
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), index=True)
+
+
+
+class UserTaskCounter(Base):
+    """number of a user's tasks (hot and archived) per status and priority, kept by TasksRepository writes"""
+    __tablename__ = "user_task_counters"
+    __table_args__ = (
+        UniqueConstraint("user_id", "status", "priority", name="uq_user_task_counters_group"),
+    )
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
+    status: Mapped[str] = mapped_column(Enum(TaskStatus))
+    priority: Mapped[int] = mapped_column(IntEnum(TaskPriority))
+    count: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
 
+class TaskHistory(Base):
+    """
+        append-only log of task status / priority changes, written in batches by Shared.Database.History.HistoryLog.
+        In Postgres the table is range-partitioned by changed_at with PK (id, changed_at), see migration 2d3dd3e5d652;
+        no foreign key, the history outlives deleted and purged tasks until its partition is detached
+    """
+    __tablename__ = "task_history"
+    __table_args__ = (
+        Index("ix_task_history_task_id_changed_at", "task_id", "changed_at"),
+    )
 
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
-    user = relationship("User", back_populates="tasks")
\ No newline at end of file
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    task_id: Mapped[int] = mapped_column(nullable=False)
+    field: Mapped[str] = mapped_column(nullable=False)
+    old_value = mapped_column(JSONB)
+    new_value = mapped_column(JSONB)
+    # updated_at of the task write; created_at is when the batch was written
+    changed_at: Mapped[datetime] = mapped_column(nullable=False)
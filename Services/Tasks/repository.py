@@ -1,35 +1,531 @@
+import asyncio
+import contextlib
+from collections import Counter
+from datetime import datetime, timedelta
+
 from fastapi import Depends
-from sqlalchemy import or_, func, select
+from sqlalchemy.orm import object_session
+from sqlalchemy import or_, func, select, delete, insert, update, union_all, text, table, column, literal, cast, \
+    tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from Services.Tasks.model import Task
+from Services.Tasks.model import Task, TaskTombstone, tasks_change_seq, ArchivedTask, UserTaskCounter, TaskHistory
+from Services.Tasks.schema import TaskRow, TaskChanges, TaskStatus, TaskClaim, TaskHistoryEntry, TASK_FIELDS
 from Shared.Base.BaseRepository import BaseRepository
-from Shared.Database.Sessions import get_session
+from Shared.Base.Settings import Settings
+from Shared.Cache.query_cache import create_query_cache
+from Shared.Cache.single_flight import SingleFlight
+from Shared.Database.ChangeFeed import change_seq_watermark, reserve_change_seq
+from Shared.Database.Counters import GroupCounters
+from Shared.Database.History import HistoryLog
+from Shared.CustomError.custom_error import NotFoundInDBError, ArchivedRecordError
+from Shared.Database.Partitions import MonthlyPartitions
+from Shared.Database.Sessions import get_session, AsyncDatabase
+from Shared.Database.Shards import shard_of, id_shard, merge_sorted
 from Shared.Utils.Handle_db_errors import handle_db_errors
 
 
+# list entries are invalidated per status (or priority) they filter on, see QueryCache
+TASKS_CACHE_TAGS = ("status", "priority")
+tasks_query_cache = create_query_cache(Settings.cache.backend, Settings.cache.ttl, Settings.cache.max_size,
+                                       Settings.cache.url, namespace="tasks:", tag_columns=TASKS_CACHE_TAGS)
+tasks_single_flight = SingleFlight()
+
+# tasks is range-partitioned by created_at (see migration 2e171948245e)
+tasks_partitions = MonthlyPartitions("tasks", Settings.partitions.months_ahead, Settings.partitions.retention_months)
+
+# per-user counts by status and priority; archiving moves rows between tables and leaves them as is
+tasks_counters = GroupCounters(UserTaskCounter, ("user_id", "status", "priority"))
+
+# status / priority changes of updates, flushed in batches to task_history on the main database
+task_history = HistoryLog(TaskHistory, "task_id", ("status", "priority"), Settings.history.batch_size)
+task_history_partitions = MonthlyPartitions("task_history", Settings.partitions.months_ahead,
+                                            Settings.history.retention_months)
+
+# session-local staging table of copy_import, emptied by every commit
+TASKS_IMPORT_COLUMNS = ("title", "description", "status", "priority")
+tasks_import = table("tasks_import", *(column(name) for name in TASKS_IMPORT_COLUMNS))
+CREATE_TASKS_IMPORT = text(
+    "CREATE TEMP TABLE IF NOT EXISTS tasks_import "
+    "(title text, description text, status text, priority smallint) ON COMMIT DELETE ROWS"
+)
+
+
 class TasksRepository(BaseRepository):
     model = Task
+    row_struct = TaskRow
+    query_cache = tasks_query_cache
+    change_seq = tasks_change_seq
+    tombstone_model = TaskTombstone
+    archive_model = ArchivedTask
+    counters = tasks_counters
+    single_flight = tasks_single_flight
+    history = task_history
+
+
+    async def cache_stats(self) -> dict:
+        stats = await self.query_cache.stats()
+        return {**stats, "single_flight": self.single_flight.stats()}
 
 
     @handle_db_errors
-    async def search_tasks(self, search_term: str):
-        """search term in  tasks title/description"""
+    async def search_tasks(self, search_term: str, fields: list[str] | None = None, include_archived: bool = False,
+                           coalesce: bool = True):
+        """search term in  tasks title/description, coalesce - share the query with identical concurrent calls"""
 
-        search_filter = or_(
-            func.lower(Task.title).contains(func.lower(search_term)),
-            func.lower(Task.description).contains(func.lower(search_term))
-        )
+        def search(model):
+            search_filter = or_(
+                func.lower(model.title).contains(func.lower(search_term)),
+                func.lower(model.description).contains(func.lower(search_term))
+            )
+            return self._select(fields, model).filter(search_filter)
+
+        query = self._with_archive(search, include_archived)
+
+        return await self._fetch_rows(query, fields, coalesce)
+
+
+    @handle_db_errors
+    async def archive_done(self, older_than: timedelta, batch_size: int = 1000) -> int:
+        """
+            move one batch of DONE tasks not updated for `older_than` into tasks_archive,
+            a single DELETE ... RETURNING -> INSERT statement, rows locked by others are skipped
+        """
+        cutoff = datetime.utcnow() - older_than
+        task_ids = (select(Task.id)
+                    .where(Task.status == TaskStatus.DONE, Task.updated_at < cutoff)
+                    .order_by(Task.updated_at).limit(batch_size)
+                    .with_for_update(skip_locked=True).scalar_subquery())
+        moved = delete(Task).where(Task.id.in_(task_ids)).returning(*Task.__table__.columns).cte("moved_tasks")
 
-        query = select(self.model).filter(search_filter)
+        columns = [column.key for column in Task.__table__.columns]
+        query = insert(ArchivedTask).from_select(
+            columns + ["archived_at"],
+            select(*(moved.c[name] for name in columns), func.timezone('UTC', func.now())),
+        )
         result = await self.session.execute(query)
+        await self.session.commit()
+
+        if result.rowcount:
+            self.single_flight.forget()
+            await self.query_cache.clear()
+        return result.rowcount
+
+
+
+    @staticmethod
+    def _claimable(n: int, now: datetime):
+        """
+            the best n claimable tasks (id, created_at, priority), locked; rows locked by concurrent
+            claims are skipped. Unleased tasks and expired leases come from their own partial indexes,
+            so live leases are never scanned past; up to n of each are locked, the best n are returned
+        """
+        branches = [
+            select(Task.id, Task.created_at, Task.priority)
+            .where(Task.status == TaskStatus.PENDING, claimable)
+            .order_by(Task.priority.desc(), Task.id).limit(n)
+            .with_for_update(skip_locked=True).cte(name)
+            for name, claimable in (("unleased", Task.claimed_until.is_(None)),
+                                    ("lease_expired", Task.claimed_until < now))
+        ]
+        claimable = union_all(*(select(branch) for branch in branches)).subquery("claimable")
+        return (select(claimable.c.id, claimable.c.created_at, claimable.c.priority)
+                .order_by(claimable.c.priority.desc(), claimable.c.id).limit(n))
+
+
+    @staticmethod
+    def _lease(worker_id: int, claimed_until: datetime, *where):
+        return (update(Task).where(*where)
+                .values(claimed_by=worker_id, claimed_until=claimed_until)
+                .returning(*(getattr(Task, name) for name in TASK_FIELDS)))
+
+
+    @handle_db_errors
+    async def claim(self, worker_id: int, n: int, lease: timedelta) -> TaskClaim:
+        """
+            atomically lease up to n PENDING tasks (highest priority, then oldest) to the worker.
+            Rows locked by concurrent claims are skipped, so workers never wait on each other
+            or get the same task; tasks with an expired lease are claimable again
+        """
+        now = datetime.utcnow()
+        claimed_until = now + lease
+        candidates = self._claimable(n, now).cte("candidates")
+        # created_at is the partition key, matching on it keeps the update to the candidates' partitions
+        query = self._lease(worker_id, claimed_until,
+                            Task.id == candidates.c.id, Task.created_at == candidates.c.created_at)
+        rows = [TaskRow(*row) for row in await self.session.execute(query)]
+        await self.session.commit()
+
+        rows.sort(key=lambda row: (-row.priority, row.id))
+        return TaskClaim(tasks=rows, claimed_until=claimed_until)
+
+
+    @handle_db_errors
+    async def lock_claimable(self, n: int, now: datetime) -> list:
+        """claim() in two steps: the candidates, locked until lease_locked() ends the transaction"""
+        return (await self.session.execute(self._claimable(n, now))).all()
+
+
+    @handle_db_errors
+    async def lease_locked(self, candidates: list, worker_id: int, claimed_until: datetime) -> list[TaskRow]:
+        """lease some of the lock_claimable() rows and commit, the locks of the others are released"""
+        rows = []
+        if candidates:
+            keys = [(candidate.id, candidate.created_at) for candidate in candidates]
+            query = self._lease(worker_id, claimed_until, tuple_(Task.id, Task.created_at).in_(keys))
+            rows = [TaskRow(*row) for row in await self.session.execute(query)]
+        await self.session.commit()
+        return rows
+
+
+    @handle_db_errors
+    async def copy_import(self, rows: list[tuple], customer_name: str, user_id: int) -> int:
+        """
+            bulk insert of the user's (title, description, status name, priority) rows, one transaction:
+            COPY into the staging table, then one INSERT ... SELECT into tasks (ids, change_seq and
+            partition routing as for any insert) and the counters in one statement
+        """
+        try:
+            connection = await self.session.connection()
+            await connection.execute(CREATE_TASKS_IMPORT)
+            raw_connection = await connection.get_raw_connection()
+            await raw_connection.driver_connection.copy_records_to_table(
+                "tasks_import", records=rows, columns=TASKS_IMPORT_COLUMNS)
+
+            await reserve_change_seq(self.session, tasks_change_seq)
+            now = datetime.utcnow()
+            query = insert(Task).from_select(
+                ["customer_name", "user_id", *TASKS_IMPORT_COLUMNS, "created_at", "updated_at"],
+                select(literal(customer_name), literal(user_id), tasks_import.c.title, tasks_import.c.description,
+                       cast(tasks_import.c.status, Task.status.type), tasks_import.c.priority,
+                       literal(now), literal(now)),
+            )
+            result = await self.session.execute(query)
+
+            deltas = Counter((user_id, TaskStatus[status], priority) for _, _, status, priority in rows)
+            await tasks_counters.add(self.session, deltas)
+            await self.session.commit()
+        except Exception:
+            # COPY errors come from the driver, not SQLAlchemy
+            await self.session.rollback()
+            raise
+
+        # bulk insert bypasses per-row invalidation
+        self.single_flight.forget()
+        await self.query_cache.clear()
+        return result.rowcount
+
+
+    @handle_db_errors
+    async def rebuild_counters(self, user_ids: list[int]) -> None:
+        """recount the per-user counters of these users from tasks + tasks_archive, one transaction"""
+        group_by = tasks_counters.group_by
+        source = union_all(
+            select(*(getattr(Task, name) for name in group_by)).where(Task.user_id.in_(user_ids)),
+            select(*(getattr(ArchivedTask, name) for name in group_by)).where(ArchivedTask.user_id.in_(user_ids)),
+        ).subquery()
+        await tasks_counters.rebuild(self.session, source, "user_id", user_ids)
+        await self.session.commit()
+
+
+    @handle_db_errors
+    async def get_history(self, task_id: int) -> list[TaskHistoryEntry]:
+        """status / priority changes of the task, oldest first (flushed and still buffered ones)"""
+        return [TaskHistoryEntry(*row) for row in await self.history.read(self.session, task_id)]
+
+
+    @handle_db_errors
+    async def get_changes(self, since: int = 0, limit: int = 1000) -> TaskChanges:
+        """
+            tasks created/updated and tasks deleted after the `since` change cursor,
+            at most `limit` changes in change_seq order. Changes at or above a value still held by
+            an open transaction wait for the next call, so the cursor never skips a late commit
+        """
+        if not isinstance(since, int):
+            raise ValueError("Cursor of sharded tasks, tasks are not sharded")
+        watermark = await change_seq_watermark(self.session, tasks_change_seq)
+        query = (self._select().add_columns(Task.change_seq)
+                 .where(Task.change_seq > since, Task.change_seq <= watermark)
+                 .order_by(Task.change_seq).limit(limit))
+        changed = [(row[-1], TaskRow(*row[:-1])) for row in await self.session.execute(query)]
+
+        query = (select(TaskTombstone.change_seq, TaskTombstone.record_id)
+                 .where(TaskTombstone.change_seq > since, TaskTombstone.change_seq <= watermark)
+                 .order_by(TaskTombstone.change_seq).limit(limit))
+        deleted = [(row.change_seq, row.record_id) for row in await self.session.execute(query)]
+
+        # both lists are sorted, the first `limit` of the merge is a gapless prefix of the change log
+        changes = sorted(changed + deleted, key=lambda change: change[0])[:limit]
+        cursor = changes[-1][0] if changes else since
+
+        return TaskChanges(
+            changed=[change for seq, change in changes if isinstance(change, TaskRow)],
+            deleted=[change for seq, change in changes if not isinstance(change, TaskRow)],
+            cursor=cursor,
+        )
+
+
+# per shard: the same query returns other rows on every shard, shard 0 shares the unsharded ones
+tasks_shard_caches = {0: tasks_query_cache}
+tasks_shard_single_flights = {0: tasks_single_flight}
+
+
+def shard_repository(session: AsyncSession, shard: int) -> TasksRepository:
+    """TasksRepository on one shard's session, with that shard's query cache and single-flight"""
+    if shard not in tasks_shard_caches:
+        tasks_shard_caches[shard] = create_query_cache(Settings.cache.backend, Settings.cache.ttl,
+                                                       Settings.cache.max_size, Settings.cache.url,
+                                                       namespace=f"tasks:{shard}:", tag_columns=TASKS_CACHE_TAGS)
+        tasks_shard_single_flights[shard] = SingleFlight()
+    repository = TasksRepository(session)
+    repository.query_cache = tasks_shard_caches[shard]
+    repository.single_flight = tasks_shard_single_flights[shard]
+    return repository
+
+
+async def clear_tasks_query_caches() -> None:
+    """after bulk task writes that bypass per-row invalidation"""
+    for query_cache in tasks_shard_caches.values():
+        await query_cache.clear()
+
+
+def tasks_shard_database(user_id: int):
+    """database holding the user's tasks, None without sharding (the main database)"""
+    shards = AsyncDatabase.shards
+    if len(shards) <= 1:
+        return None
+    return shards[shard_of(user_id, len(shards))]
+
+
+class ShardedTasksRepository:
+    """
+        TasksRepository API over tasks hash-sharded by user_id (Settings.database.shards):
+        a user's tasks, archive and counters live on shard_of(user_id), ids are interleaved per shard
+        (python -m Services.Tasks.shards). Creates and id lookups go to one shard, cross-user reads
+        run on every shard concurrently and are merged with the sort, order and limit re-applied.
+        There is no cross-shard transaction: single_transaction() is atomic per shard only
+    """
+
+    def __init__(self, repositories: list[TasksRepository]):
+        self.repositories = repositories
+
+
+    @classmethod
+    @contextlib.asynccontextmanager
+    async def open(cls, databases):
+        """one session per shard database (connected on first use only), closed on exit"""
+        async with contextlib.AsyncExitStack() as stack:
+            sessions = [await stack.enter_async_context(database.session()) for database in databases]
+            yield cls([shard_repository(session, shard) for shard, session in enumerate(sessions)])
+
+
+    def for_user(self, user_id: int) -> TasksRepository:
+        return self.repositories[shard_of(user_id, len(self.repositories))]
+
+
+    async def _all_shards(self, call) -> list:
+        return await asyncio.gather(*(call(repository) for repository in self.repositories))
+
+
+    async def _by_id(self, record_id: int, call):
+        """
+            call on the shard that allocated the id; rows written before sharding was enabled
+            (or moved between shards) are looked up on the others
+        """
+        home = id_shard(record_id, len(self.repositories))
+        others = self.repositories[:home] + self.repositories[home + 1:]
+        archived = None
+        for repository in [self.repositories[home], *others]:
+            try:
+                return await call(repository)
+            except ArchivedRecordError as e:
+                archived = e
+            except NotFoundInDBError:
+                continue
+        if archived is not None:
+            raise archived
+        raise NotFoundInDBError
+
+
+    async def get_by_filters(self, created_after: datetime = None, filters: dict | None = None,
+                             fields: list[str] | None = None, include_archived: bool = False,
+                             min_filters: dict | None = None, sort: str | None = None,
+                             order: str = "desc", limit: int | None = None, coalesce: bool = True):
+        # the merge needs the sort column, it is dropped afterwards unless requested
+        unrequested = sort if fields and sort and sort not in fields else None
+        shard_fields = fields + [sort] if unrequested else fields
+        results = await self._all_shards(lambda repository: repository.get_by_filters(
+            created_after, filters, shard_fields, include_archived, min_filters, sort, order, limit, coalesce))
+        rows = merge_sorted(results, sort, order, limit)
+        if unrequested:
+            rows = [{name: value for name, value in row.items() if name != unrequested} for row in rows]
+        return rows
+
+
+    async def get_versioned_by_filters(self, created_after: datetime = None, filters: dict | None = None,
+                                       fields: list[str] | None = None, include_archived: bool = False,
+                                       min_filters: dict | None = None, sort: str | None = None,
+                                       order: str = "desc", limit: int | None = None, unchanged=None):
+        """every shard's (version, rows) pair, versions combined as in filters_version, rows merged"""
+        unrequested = sort if fields and sort and sort not in fields else None
+        shard_fields = fields + [sort] if unrequested else fields
+        results = await self._all_shards(lambda repository: repository.get_versioned_by_filters(
+            created_after, filters, shard_fields, include_archived, min_filters, sort, order, limit))
+        updated = [updated_at for (updated_at, _), _ in results if updated_at is not None]
+        version = (max(updated, default=None), sum(count for (_, count), _ in results))
+        if unchanged is not None and unchanged(version):
+            return version, None
+
+        rows = merge_sorted([rows for _, rows in results], sort, order, limit)
+        if unrequested:
+            rows = [{name: value for name, value in row.items() if name != unrequested} for row in rows]
+        return version, rows
+
+
+    async def search_tasks(self, search_term: str, fields: list[str] | None = None, include_archived: bool = False,
+                           coalesce: bool = True):
+        results = await self._all_shards(
+            lambda repository: repository.search_tasks(search_term, fields, include_archived, coalesce))
+        return merge_sorted(results)
+
+
+    async def facet_counts(self, facets: list[str], created_after: datetime = None, filters: dict | None = None,
+                           include_archived: bool = False, min_filters: dict | None = None) -> dict:
+        results = await self._all_shards(lambda repository: repository.facet_counts(
+            facets, created_after, filters, include_archived, min_filters))
+        counts = {"total": 0, **{name: {} for name in facets}}
+        for result in results:
+            counts["total"] += result["total"]
+            for name in facets:
+                for value, count in result[name].items():
+                    counts[name][value] = counts[name].get(value, 0) + count
+        return counts
+
+
+    async def filters_version(self, created_after: datetime = None, filters: dict | None = None,
+                              include_archived: bool = False, min_filters: dict | None = None):
+        results = await self._all_shards(lambda repository: repository.filters_version(
+            created_after, filters, include_archived, min_filters))
+        updated = [updated_at for updated_at, _ in results if updated_at is not None]
+        return max(updated, default=None), sum(count for _, count in results)
+
+
+    async def id(self, model_id: int, include_archived: bool = False):
+        return await self._by_id(model_id, lambda repository: repository.id(model_id, include_archived))
+
+
+    async def id_version(self, model_id: int, include_archived: bool = False):
+        return await self._by_id(model_id, lambda repository: repository.id_version(model_id, include_archived))
+
+
+    async def create(self, data: dict):
+        return await self.for_user(data["user_id"]).create(data)
+
+
+    async def update(self, instance, update_data: dict):
+        """on the shard whose session loaded the instance"""
+        session = object_session(instance)
+        repository = next(repository for repository in self.repositories
+                          if repository.session.sync_session is session)
+        return await repository.update(instance, update_data)
+
+
+    async def delete(self, model_id: int):
+        return await self._by_id(model_id, lambda repository: repository.delete(model_id))
+
+
+    async def claim(self, worker_id: int, n: int, lease: timedelta) -> TaskClaim:
+        """
+            every shard locks its best n claimable tasks, the best n of all of them are leased
+            and the other locks released: priority order holds across shards as on one database
+        """
+        now = datetime.utcnow()
+        claimed_until = now + lease
+        candidates = await self._all_shards(lambda repository: repository.lock_claimable(n, now))
+        ranked = sorted(((shard, row) for shard, rows in enumerate(candidates) for row in rows),
+                        key=lambda item: (-item[1].priority, item[1].id))
+        chosen = {(shard, row.id) for shard, row in ranked[:n]}
+
+        leased = await asyncio.gather(*(
+            repository.lease_locked([row for row in rows if (shard, row.id) in chosen], worker_id, claimed_until)
+            for shard, (repository, rows) in enumerate(zip(self.repositories, candidates))))
+        tasks = sorted((row for rows in leased for row in rows), key=lambda row: (-row.priority, row.id))
+        return TaskClaim(tasks=tasks, claimed_until=claimed_until)
+
+
+    async def copy_import(self, rows: list[tuple], customer_name: str, user_id: int) -> int:
+        return await self.for_user(user_id).copy_import(rows, customer_name, user_id)
+
+
+    async def archive_done(self, older_than: timedelta, batch_size: int = 1000) -> int:
+        """one batch per shard"""
+        return sum(await self._all_shards(lambda repository: repository.archive_done(older_than, batch_size)))
+
+
+    async def rebuild_counters(self, user_ids: list[int]) -> None:
+        by_shard = {}
+        for user_id in user_ids:
+            by_shard.setdefault(shard_of(user_id, len(self.repositories)), []).append(user_id)
+        await asyncio.gather(*(self.repositories[shard].rebuild_counters(ids) for shard, ids in by_shard.items()))
+
+
+    async def get_history(self, task_id: int) -> list[TaskHistoryEntry]:
+        """the history log is written to the main database, whichever shard holds the task"""
+        async with AsyncDatabase.session() as session:
+            return await TasksRepository(session).get_history(task_id)
+
+
+    async def get_changes(self, since: int | list[int] = 0, limit: int = 1000) -> TaskChanges:
+        """
+            composite cursor, one change_seq per shard: every shard is read from its own position,
+            up to limit / shards changes each. A plain int cursor (issued before sharding) continues
+            shard 0, which kept the unsharded rows, the other shards start over
+        """
+        shards = len(self.repositories)
+        cursors = since if isinstance(since, list) else [since] + [0] * (shards - 1)
+        if len(cursors) != shards:
+            raise ValueError(f"Cursor of {len(cursors)} shards, {shards} configured")
+
+        share = max(1, limit // shards)
+        results = await asyncio.gather(*(repository.get_changes(cursor, share)
+                                         for repository, cursor in zip(self.repositories, cursors)))
+        return TaskChanges(
+            changed=[row for result in results for row in result.changed],
+            deleted=[record_id for result in results for record_id in result.deleted],
+            cursor=".".join(str(result.cursor) for result in results),
+        )
+
+
+    @contextlib.asynccontextmanager
+    async def single_transaction(self):
+        """one transaction per shard, committed one after another (no two-phase commit)"""
+        async with contextlib.AsyncExitStack() as stack:
+            for repository in self.repositories:
+                await stack.enter_async_context(repository.single_transaction())
+            yield
+
+
+    async def cache_stats(self) -> dict:
+        return {"shards": await self._all_shards(lambda repository: repository.cache_stats())}
 
-        return result.scalars().all()
 
+@contextlib.asynccontextmanager
+async def open_tasks_repository(database):
+    """repository over the database, or over its shard map when it has several shards"""
+    if len(database.shards) > 1:
+        async with ShardedTasksRepository.open(database.shards) as repository:
+            yield repository
+    else:
+        async with database.session() as session:
+            yield TasksRepository(session)
 
 
 async def get_tasks_repository(session: AsyncSession = Depends(get_session)):
-    return TasksRepository(session)
+    if len(AsyncDatabase.shards) > 1:
+        async with ShardedTasksRepository.open(AsyncDatabase.shards) as repository:
+            yield repository
+    else:
+        yield TasksRepository(session)
 
 
 tasks_repository: TasksRepository = Depends(get_tasks_repository)
\ No newline at end of file
@@ -1,22 +1,77 @@
 import logging
 from datetime import datetime
 
-from fastapi import APIRouter, HTTPException, Depends, Query
+import orjson
+from fastapi import APIRouter, HTTPException, Depends, Query, Header, Response, Request
 
 from Services.Tasks.model import Task
 from Shared.Auth.auth import get_me
-from Services.Tasks.schema import CreateTask, TaskUpdate, TaskStatus, TaskPriority
+from Services.Tasks.schema import CreateTask, TaskUpdate, TaskStatus, TaskPriority, TaskRead, TaskRowsAdapter, \
+    TASK_FIELDS, TaskChanges, TaskChangesAdapter, TaskSort, SortOrder, TaskClaim, TaskClaimAdapter, \
+    TasksWithFacets, TasksWithFacetsAdapter, TaskFacetsAdapter, TaskHistoryEntry, TaskHistoryAdapter
 from Services.Tasks.serivce import tasks_service
+from Shared.Base.Settings import Settings
+from Shared.CustomError.custom_error import NotFoundInDBError, ArchivedRecordError
+from Shared.Utils.Etag import make_etag, etag_matches
+from Shared.Utils.RateLimit import RateLimit
+from Shared.Utils.Responses import AdapterJSONResponse, UploadStreamingResponse, negotiated_response, \
+    prefers_msgpack
+from Shared.Utils.Uploads import iter_csv, iter_ndjson
 
 tasks_router = APIRouter()
 
+list_rate_limit = RateLimit("tasks_list", Settings.rate_limit.tasks_list)
+search_rate_limit = RateLimit("tasks_search", Settings.rate_limit.tasks_search)
+write_rate_limit = RateLimit("tasks_write", Settings.rate_limit.tasks_write)
 
-@tasks_router.get('/tasks', name='получение списка задач с фильтрацией по статусу, приоритету, дате создания')
+# upload Content-Type -> record parser of the import endpoint
+IMPORT_FORMATS = {"text/csv": iter_csv, "application/x-ndjson": iter_ndjson, "application/jsonl": iter_ndjson}
+
+
+def task_fields(
+        fields: str | None = Query(None, description=f"Список полей через запятую: {', '.join(TASK_FIELDS)}")
+) -> list[str] | None:
+    """sparse fieldset, id is always returned"""
+    if not fields:
+        return None
+
+    requested = [name.strip() for name in fields.split(',') if name.strip()]
+    unknown = [name for name in requested if name not in TASK_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    return ['id'] + [name for name in dict.fromkeys(requested) if name != 'id']
+
+
+def tasks_response(db_tasks, fields: list[str] | None, headers: dict | None = None, facets=None,
+                   accept: str | None = None):
+    """JSON, or MessagePack of the same body when the Accept header asks for it"""
+    if facets is not None:
+        if fields:
+            content = {"tasks": db_tasks, "facets": TaskFacetsAdapter.dump_python(facets, mode="json")}
+            return negotiated_response(content, accept=accept, headers=headers)
+        return negotiated_response(TasksWithFacets(db_tasks, facets), TasksWithFacetsAdapter, accept, headers)
+    if fields:
+        return negotiated_response(db_tasks, accept=accept, headers=headers)
+    return negotiated_response(db_tasks, TaskRowsAdapter, accept, headers)
+
+
+@tasks_router.get('/tasks', name='получение списка задач с фильтрацией по статусу, приоритету, дате создания',
+                  response_model=list[TaskRead] | TasksWithFacets, dependencies=[Depends(list_rate_limit)])
 async def tasks_by_filter(
         created_at: datetime | None = Query(None,
                                             description="Дата создания в формате ISO 8601 (YYYY-MM-DDTHH:MM:SS)"),
         status: TaskStatus | None = None,
         priority: TaskPriority | None = None,
+        min_priority: TaskPriority | None = None,
+        sort: TaskSort | None = None,
+        order: SortOrder = SortOrder.DESC,
+        limit: int | None = Query(None, ge=1, le=1000, description="Первые N задач (вместе с sort - top N)"),
+        fields: list[str] | None = Depends(task_fields),
+        include_archived: bool = False,
+        facets: bool = Query(False, description="Вернуть {tasks, facets} со счетчиками по статусу и приоритету"),
+        if_none_match: str | None = Header(None),
+        accept: str | None = Header(None),
         tasks = tasks_service,
         me=Depends(get_me)
 ):
@@ -25,31 +80,138 @@ async def tasks_by_filter(
             Task.status: status,
             Task.priority: priority
         }
+        min_filters = {
+            Task.priority: min_priority
+        }
+        sort = sort.value if sort else None
+
+        def etag_of(version) -> str:
+            # the MessagePack body is another representation, it gets its own ETag
+            return make_etag(*version, created_at, status, priority, min_priority, sort, order.value, limit, fields,
+                             include_archived, facets, prefers_msgpack(accept))
 
-        db_tasks = await tasks.get_by_filters(created_at, filters)
+        # the ETag comes from the version read (or cached) together with the rows, never newer than them
+        version, db_tasks = await tasks.get_versioned_by_filters(
+            created_at, filters, fields, include_archived, min_filters, sort, order.value, limit,
+            unchanged=lambda version: etag_matches(if_none_match, etag_of(version)))
+        etag = etag_of(version)
+        if db_tasks is None or etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag, "Vary": "Accept"})
+
+        facet_counts = None
+        if facets:
+            facet_counts = await tasks.facet_counts(created_at, filters, include_archived, min_filters)
         logging.info(f"Get tasks by filters")
 
-        return db_tasks
+        return tasks_response(db_tasks, fields, headers={"ETag": etag}, facets=facet_counts, accept=accept)
     except Exception as e:
         logging.error(f"Unexpected error in get tasks by filters: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=e)
 
 
-@tasks_router.get('/tasks/search', name='поиск задач по подстроке в названии или описании')
+@tasks_router.get('/tasks/search', name='поиск задач по подстроке в названии или описании',
+                  response_model=list[TaskRead], dependencies=[Depends(search_rate_limit)])
 async def search_tasks(
     search_term: str,
+    fields: list[str] | None = Depends(task_fields),
+    include_archived: bool = False,
+    accept: str | None = Header(None),
     tasks = tasks_service,
     me=Depends(get_me)
 ):
     try:
-        db_tasks = await tasks.search_tasks(search_term)
-        return db_tasks
+        db_tasks = await tasks.search_tasks(search_term, fields, include_archived)
+        return tasks_response(db_tasks, fields, accept=accept)
     except Exception as e:
         logging.error(f"Unexpected error in search tasks: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=e)
 
 
-@tasks_router.post('/tasks', name='создание задачи', status_code=201)
+@tasks_router.get('/changes', name='изменения задач после курсора (delta sync)', response_model=TaskChanges,
+                  dependencies=[Depends(list_rate_limit)])
+async def tasks_changes(
+        since: str = Query("0", pattern=r"^\d+(\.\d+)*$",
+                           description="cursor из предыдущего ответа, 0 - полная синхронизация"),
+        limit: int = Query(1000, ge=1, le=5000),
+        accept: str | None = Header(None),
+        tasks = tasks_service,
+        me=Depends(get_me)
+):
+    try:
+        changes = await tasks.get_changes(since, limit)
+        logging.info(f"Get tasks changes since {since}")
+
+        return negotiated_response(changes, TaskChangesAdapter, accept)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logging.error(f"Unexpected error in get tasks changes: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=e)
+
+
+@tasks_router.post('/claim', name='взять задачи из очереди (аренда)', response_model=TaskClaim,
+                   dependencies=[Depends(write_rate_limit)])
+async def claim_tasks(
+        n: int = Query(1, ge=1, le=100, description="Сколько задач взять"),
+        lease: int | None = Query(None, ge=1, le=86400,
+                                  description="Аренда в секундах, после нее незавершенная задача возвращается в очередь"),
+        tasks = tasks_service,
+        me=Depends(get_me)
+):
+    try:
+        claim = await tasks.claim_tasks(me.id, n, lease or Settings.queue.lease_seconds)
+        logging.info(f"Tasks claimed by {me.id}: {len(claim.tasks)}")
+
+        return AdapterJSONResponse(claim, TaskClaimAdapter)
+    except Exception as e:
+        logging.error(f"Unexpected error in claim tasks: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=e)
+
+
+@tasks_router.get('/tasks/{task_id}', name='получение задачи', response_model=TaskRead)
+async def get_task(
+        task_id: int,
+        response: Response,
+        if_none_match: str | None = Header(None),
+        tasks = tasks_service,
+        me=Depends(get_me)
+):
+    try:
+        etag = make_etag(task_id, await tasks.task_version(task_id))
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+
+        db_task = await tasks.get_task(task_id)
+        response.headers["ETag"] = etag
+
+        return db_task
+    except NotFoundInDBError:
+        raise HTTPException(status_code=404, detail='Задача не найдена')
+    except Exception as e:
+        logging.error(f"Unexpected error in get task: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=e)
+
+
+@tasks_router.get('/tasks/{task_id}/history', name='история изменений статуса и приоритета задачи',
+                  response_model=list[TaskHistoryEntry])
+async def task_history(task_id: int, tasks = tasks_service, me=Depends(get_me)):
+    try:
+        entries = await tasks.task_history(task_id)
+
+        return AdapterJSONResponse(entries, TaskHistoryAdapter)
+    except NotFoundInDBError:
+        raise HTTPException(status_code=404, detail='Задача не найдена')
+    except Exception as e:
+        logging.error(f"Unexpected error in get task history: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=e)
+
+
+@tasks_router.get('/cache/stats', name='статистика кэша списков задач')
+async def cache_stats(tasks = tasks_service, me=Depends(get_me)):
+    return await tasks.cache_stats()
+
+
+@tasks_router.post('/tasks', name='создание задачи', status_code=201, response_model=TaskRead)
 async def create_tasks(task: CreateTask, tasks = tasks_service, me=Depends(get_me)):
     try:
         db_task = await tasks.create_task({**task.__dict__, "customer_name": me.name, "user_id": me.id})
@@ -61,13 +223,58 @@ async def create_tasks(task: CreateTask, tasks = tasks_service, me=Depends(get_m
         raise HTTPException(status_code=500, detail=e)
 
 
-@tasks_router.put('/tasks/{task_id}', name='обновление задачи')
+@tasks_router.post('/tasks/import', name='импорт задач из CSV / NDJSON (потоковая загрузка)',
+                   dependencies=[Depends(write_rate_limit)])
+async def import_tasks(request: Request, chunk_size: int = Query(5000, ge=1, le=50000),
+                       tasks = tasks_service, me=Depends(get_me)):
+    """
+        Body - CSV with a header row or NDJSON, columns / keys as in task creation.
+        Response - NDJSON report streamed while the upload is read: {"row", "error"} per rejected row,
+        {"rows", "imported", "errors"} per loaded chunk, then the same with "done"
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    parse = IMPORT_FORMATS.get(content_type)
+    if parse is None:
+        raise HTTPException(status_code=415, detail=f"Expected Content-Type: {', '.join(IMPORT_FORMATS)}")
+
+    customer_name, user_id = me.name, me.id
+
+    async def report():
+        try:
+            async for line in tasks.import_tasks(parse(request.stream()), customer_name, user_id, chunk_size):
+                yield orjson.dumps(line) + b"\n"
+        except Exception as e:
+            logging.error(f"Unexpected error in import tasks: {e}", exc_info=True)
+            yield orjson.dumps({"done": False, "error": "Import failed"}) + b"\n"
+
+    return UploadStreamingResponse(report(), media_type="application/x-ndjson")
+
+
+@tasks_router.put('/tasks/{task_id}', name='обновление задачи', response_model=TaskRead)
 async def update_task(task_id: str, update_data: TaskUpdate, tasks = tasks_service, me=Depends(get_me)):
     try:
         db_task = await tasks.update_task({**update_data.__dict__}, task_id)
         logging.info(f"Task {task_id} updated", exc_info=True)
 
         return db_task
+    except ArchivedRecordError:
+        raise HTTPException(status_code=409, detail='Задача перенесена в архив, изменить ее нельзя')
+    except NotFoundInDBError:
+        raise HTTPException(status_code=404, detail='Задача не найдена')
     except Exception as e:
         logging.error(f"Unexpected error in create tasks: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=e)
+
+
+@tasks_router.delete('/tasks/{task_id}', name='удаление задачи', status_code=204)
+async def delete_task(task_id: int, tasks = tasks_service, me=Depends(get_me)):
+    try:
+        await tasks.delete_task(task_id)
+        logging.info(f"Task {task_id} deleted")
+    except ArchivedRecordError:
+        raise HTTPException(status_code=409, detail='Задача перенесена в архив, удалить ее нельзя')
+    except NotFoundInDBError:
+        raise HTTPException(status_code=404, detail='Задача не найдена')
+    except Exception as e:
+        logging.error(f"Unexpected error in delete task: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=e)
@@ -1,7 +1,9 @@
+from dataclasses import dataclass, fields
 from datetime import datetime
 from enum import Enum
+from typing import Annotated, Any, Literal
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
 
 
 class TaskStatus(str, Enum):
@@ -17,6 +19,17 @@ class TaskPriority(int, Enum):
     HIGHEST = 5
 
 
+class TaskSort(str, Enum):
+    PRIORITY = "priority"
+    CREATED_AT = "created_at"
+    UPDATED_AT = "updated_at"
+
+
+class SortOrder(str, Enum):
+    ASC = "asc"
+    DESC = "desc"
+
+
 class CreateTask(BaseModel):
     title: str
     description: str | None = None
@@ -31,7 +44,138 @@ class TaskUpdate(BaseModel):
     priority: TaskPriority | None = None
 
 
+class TaskRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    customer_name: str
+    title: str
+    description: str
+    status: TaskStatus
+    priority: TaskPriority
+    user_id: int
+    created_at: datetime
+    updated_at: datetime
+
+
 class TaskFilters(BaseModel):
     created_at: datetime | None = None
     status: TaskStatus | None = None
-    priority: TaskPriority | None = None
\ No newline at end of file
+    priority: TaskPriority | None = None
+
+
+class BatchCreateTask(BaseModel):
+    op: Literal["create"]
+    data: CreateTask
+
+
+class BatchUpdateTask(BaseModel):
+    op: Literal["update"]
+    id: int
+    data: TaskUpdate
+
+
+class BatchDeleteTask(BaseModel):
+    op: Literal["delete"]
+    id: int
+
+
+class BatchGetTask(BaseModel):
+    op: Literal["get"]
+    id: int
+
+
+class BatchListTasks(BaseModel):
+    op: Literal["list"]
+    created_at: datetime | None = None
+    status: TaskStatus | None = None
+    priority: TaskPriority | None = None
+    min_priority: TaskPriority | None = None
+    sort: TaskSort | None = None
+    order: SortOrder = SortOrder.DESC
+    limit: int | None = Field(None, ge=1, le=1000)
+
+
+BatchOperation = Annotated[BatchCreateTask | BatchUpdateTask | BatchDeleteTask | BatchGetTask | BatchListTasks,
+                           Field(discriminator="op")]
+
+
+class BatchRequest(BaseModel):
+    operations: list[BatchOperation] = Field(min_length=1, max_length=100)
+
+
+@dataclass(slots=True)
+class TaskRow:
+    """lightweight task row for list reads (no ORM instance behind it)"""
+    id: int
+    customer_name: str
+    title: str
+    description: str
+    status: TaskStatus
+    priority: TaskPriority
+    user_id: int
+    created_at: datetime
+    updated_at: datetime
+
+
+@dataclass(slots=True)
+class TaskChanges:
+    """
+        delta since a change cursor: created/updated tasks, ids of deleted ones and the next cursor,
+        a change_seq, or "<seq>.<seq>..." - one per shard - when tasks are sharded
+    """
+    changed: list[TaskRow]
+    deleted: list[int]
+    cursor: int | str
+
+
+@dataclass(slots=True)
+class TaskHistoryEntry:
+    """one field of a task update: old and new value as in TaskRead, changed_at - updated_at of the update"""
+    field: str
+    old_value: Any
+    new_value: Any
+    changed_at: datetime
+
+
+@dataclass(slots=True)
+class TaskClaim:
+    """tasks claimed by a worker and the lease end, unfinished tasks return to the queue after it"""
+    tasks: list[TaskRow]
+    claimed_until: datetime
+
+
+@dataclass(slots=True)
+class TaskFacets:
+    """counts of the filtered tasks, total and per status / priority"""
+    total: int
+    status: dict[TaskStatus, int]
+    priority: dict[TaskPriority, int]
+
+
+@dataclass(slots=True)
+class TasksWithFacets:
+    tasks: list[TaskRow]
+    facets: TaskFacets
+
+
+@dataclass(slots=True)
+class BatchResult:
+    """result of one batch operation: the status code and body the single endpoint would return"""
+    status: int
+    body: Any = None
+
+
+# same shape as TaskRead, built once and reused for every list response
+TaskRowsAdapter = TypeAdapter(list[TaskRow])
+TaskChangesAdapter = TypeAdapter(TaskChanges)
+TaskClaimAdapter = TypeAdapter(TaskClaim)
+TaskHistoryAdapter = TypeAdapter(list[TaskHistoryEntry])
+TaskFacetsAdapter = TypeAdapter(TaskFacets)
+TasksWithFacetsAdapter = TypeAdapter(TasksWithFacets)
+
+BatchResultsAdapter = TypeAdapter(list[BatchResult])
+
+TASK_FACETS = ("status", "priority")
+
+TASK_FIELDS = tuple(field.name for field in fields(TaskRow))
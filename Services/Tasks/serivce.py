@@ -1,10 +1,13 @@
-from datetime import datetime
-from typing import Any
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator
 
+from pydantic import ValidationError
 from sqlalchemy import Column
 from fastapi import Depends
 
 from Services.Tasks.repository import TasksRepository, get_tasks_repository
+from Services.Tasks.schema import TaskFacets, TASK_FACETS, CreateTask
+from Shared.Utils.Uploads import UploadError
 
 
 class TasksService:
@@ -13,14 +16,84 @@ class TasksService:
         self._repository = repository
 
 
-    async def get_by_filters(self, created_after: datetime, filters: dict[Column[Any], Any | None] | None = None):
-        """get tasks by filters (created_at, status, priority)"""
-        return await self._repository.get_by_filters(created_after, filters)
+    async def get_by_filters(self, created_after: datetime, filters: dict[Column[Any], Any | None] | None = None,
+                             fields: list[str] | None = None, include_archived: bool = False,
+                             min_filters: dict[Column[Any], Any | None] | None = None, sort: str | None = None,
+                             order: str = "desc", limit: int | None = None):
+        """get tasks by filters (created_at, status, priority, min priority), optionally sorted / top N"""
+        return await self._repository.get_by_filters(created_after, filters, fields, include_archived,
+                                                     min_filters, sort, order, limit)
 
 
-    async def search_tasks(self, search_term: str):
+    async def get_versioned_by_filters(self, created_after: datetime,
+                                       filters: dict[Column[Any], Any | None] | None = None,
+                                       fields: list[str] | None = None, include_archived: bool = False,
+                                       min_filters: dict[Column[Any], Any | None] | None = None,
+                                       sort: str | None = None, order: str = "desc", limit: int | None = None,
+                                       unchanged=None):
+        """(filters_version, tasks) of one read for an ETag; tasks is None when unchanged(version)"""
+        return await self._repository.get_versioned_by_filters(created_after, filters, fields, include_archived,
+                                                               min_filters, sort, order, limit, unchanged)
+
+
+    async def facet_counts(self, created_after: datetime, filters: dict[Column[Any], Any | None] | None = None,
+                           include_archived: bool = False,
+                           min_filters: dict[Column[Any], Any | None] | None = None) -> TaskFacets:
+        """task counts per status and priority for the same filters as get_by_filters"""
+        counts = await self._repository.facet_counts(list(TASK_FACETS), created_after, filters, include_archived,
+                                                     min_filters)
+        return TaskFacets(**counts)
+
+
+    async def filters_version(self, created_after: datetime, filters: dict[Column[Any], Any | None] | None = None,
+                              include_archived: bool = False,
+                              min_filters: dict[Column[Any], Any | None] | None = None):
+        """(max updated_at, count) of the filtered tasks, used for ETag"""
+        return await self._repository.filters_version(created_after, filters, include_archived, min_filters)
+
+
+    async def task_version(self, task_id: int):
+        """updated_at of the task (hot or archived), used for ETag"""
+        return await self._repository.id_version(task_id, include_archived=True)
+
+
+    async def get_task(self, task_id: int):
+        """Get task by id (hot or archived)"""
+        return await self._repository.id(task_id, include_archived=True)
+
+
+    async def task_history(self, task_id: int):
+        """Status / priority changes of the task; NotFoundInDBError for an unknown task without history"""
+        entries = await self._repository.get_history(task_id)
+        if not entries:
+            await self._repository.id_version(task_id, include_archived=True)
+        return entries
+
+
+    async def search_tasks(self, search_term: str, fields: list[str] | None = None, include_archived: bool = False):
         """Search tasks"""
-        return await self._repository.search_tasks(search_term)
+        return await self._repository.search_tasks(search_term, fields, include_archived)
+
+
+    async def get_changes(self, since: str, limit: int):
+        """Delta sync: changes after the cursor, a composite one is a list of per-shard cursors"""
+        cursor = [int(seq) for seq in since.split(".")]
+        return await self._repository.get_changes(cursor if len(cursor) > 1 else cursor[0], limit)
+
+
+    async def claim_tasks(self, worker_id: int, n: int, lease_seconds: int):
+        """Work queue: lease up to n pending tasks to the worker"""
+        return await self._repository.claim(worker_id, n, timedelta(seconds=lease_seconds))
+
+
+    def single_transaction(self):
+        """context manager: writes inside it are committed together at the end"""
+        return self._repository.single_transaction()
+
+
+    async def cache_stats(self):
+        """Query cache hit/miss metrics and coalesced (single-flight) reads"""
+        return await self._repository.cache_stats()
 
 
     async def create_task(self, task: dict):
@@ -28,6 +101,47 @@ class TasksService:
         return await self._repository.create(task)
 
 
+    async def import_tasks(self, records: AsyncIterator, customer_name: str, user_id: int,
+                           chunk_size: int = 5000) -> AsyncIterator[dict]:
+        """
+            Bulk import of the user's tasks from (row number, record, error) upload records:
+            rows are validated with CreateTask and loaded chunk by chunk, each chunk committed on its own.
+            Yields a report line per rejected row, one per loaded chunk and a summary (done=False and
+            the error if the upload broke off: the chunks loaded before it stay)
+        """
+        rows = imported = errors = 0
+        chunk = []
+        try:
+            async for number, record, error in records:
+                rows = number
+                if error is None:
+                    try:
+                        task = CreateTask.model_validate(record)
+                    except ValidationError as e:
+                        error = "; ".join(f"{'.'.join(map(str, item['loc']))}: {item['msg']}" for item in e.errors())
+                    else:
+                        if task.description is None:
+                            error = "description: Field required"
+                if error is not None:
+                    errors += 1
+                    yield {"row": number, "error": error}
+                    continue
+
+                chunk.append((task.title, task.description, task.status.name, int(task.priority)))
+                if len(chunk) >= chunk_size:
+                    imported += await self._repository.copy_import(chunk, customer_name, user_id)
+                    chunk = []
+                    yield {"rows": rows, "imported": imported, "errors": errors}
+
+            if chunk:
+                imported += await self._repository.copy_import(chunk, customer_name, user_id)
+        except UploadError as e:
+            yield {"rows": rows, "imported": imported, "errors": errors, "done": False, "error": str(e)}
+            return
+
+        yield {"rows": rows, "imported": imported, "errors": errors, "done": True}
+
+
     async def update_task(self, data: dict, task_id: str):
         """Update task"""
         task = await self._repository.id(int(task_id))
@@ -35,6 +149,11 @@ class TasksService:
         return await self._repository.update(task, data)
 
 
+    async def delete_task(self, task_id: int):
+        """Delete task"""
+        return await self._repository.delete(task_id)
+
+
 async def get_tasks_service(repository: TasksRepository = Depends(get_tasks_repository)):
     return TasksService(repository=repository)
 
@@ -0,0 +1,36 @@
+import asyncio
+import logging
+
+from Services.Tasks.model import Task, TaskTombstone, ArchivedTask, UserTaskCounter, tasks_change_seq
+# the users table is not created on shards, but its mapping types the user_id foreign key columns
+from Services.Users.model import User
+from Shared.Database.Shards import create_shard_schema, interleave_ids, max_id
+
+# everything TasksRepository writes for a user lives on the user's shard
+SHARD_TABLES = [Task.__table__, TaskTombstone.__table__, ArchivedTask.__table__, UserTaskCounter.__table__]
+
+
+async def init_shards(database) -> None:
+    """
+        prepare the shard map of `database`: task tables on the shard databases other than
+        the main one (which has the full schema from the migrations) and interleaved task ids on all.
+        Safe to re-run with the same shard list; the shard count is fixed once tasks are written
+    """
+    above = 0
+    for shard_database in database.shards:
+        async with shard_database.connect() as conn:
+            if shard_database is not database:
+                await create_shard_schema(conn, SHARD_TABLES, [tasks_change_seq])
+            above = max(above, await max_id(conn, ["tasks", "tasks_archive"]))
+
+    for shard, shard_database in enumerate(database.shards):
+        async with shard_database.connect() as conn:
+            await interleave_ids(conn, "tasks_id_seq", shard, len(database.shards), above)
+        logging.info(f"Tasks shard {shard} ready, ids from {above + 1} interleaved by {len(database.shards)}")
+
+
+if __name__ == '__main__':
+    from Shared.Database.Sessions import AsyncDatabase
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(init_shards(AsyncDatabase))
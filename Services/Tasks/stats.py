@@ -0,0 +1,54 @@
+import asyncio
+import logging
+
+from sqlalchemy import select
+
+from Services.Tasks.repository import open_tasks_repository
+from Services.Users.model import User
+
+
+class TaskCountersRepair:
+    """
+        Rebuilds user_task_counters from the tasks tables in batches of users
+        (one short transaction each), fixes drift after manual SQL or bulk deletes
+    """
+
+    def __init__(self, batch_size: int = 500, pause: float = 0.1):
+        self.batch_size = batch_size
+        self.pause = pause
+
+
+    async def repair(self, database) -> int:
+        repaired = 0
+        last_id = 0
+        # users are on the main database, their tasks possibly on shards
+        async with database.session() as session, open_tasks_repository(database) as repository:
+            while True:
+                query = select(User.id).where(User.id > last_id).order_by(User.id).limit(self.batch_size)
+                user_ids = (await session.scalars(query)).all()
+                if not user_ids:
+                    break
+                await repository.rebuild_counters(user_ids)
+                repaired += len(user_ids)
+                last_id = user_ids[-1]
+                await asyncio.sleep(self.pause)
+
+        logging.info(f"Task counters rebuilt for users: {repaired}")
+        return repaired
+
+
+    async def run_forever(self, database, interval: int) -> None:
+        """repair loop, started from the app lifespan"""
+        while True:
+            try:
+                await self.repair(database)
+            except Exception as e:
+                logging.error(f"Task counters repair failed: {e}")
+            await asyncio.sleep(interval)
+
+
+if __name__ == '__main__':
+    from Shared.Base.Settings import Settings
+    from Shared.Database.Sessions import AsyncDatabase
+
+    asyncio.run(TaskCountersRepair(Settings.stats.repair_batch_size).repair(AsyncDatabase))
@@ -7,11 +7,15 @@ from starlette.responses import JSONResponse
 from Services.Users.schema import UserCreate, UserRead
 from Services.Users.serivce import users_service
 from Shared.Auth.auth import get_me
+from Shared.Base.Settings import Settings
 from Shared.CustomError.custom_error import NotFoundInDBError, NotValidPassword
+from Shared.Utils.RateLimit import RateLimit
 
 
 auth_router = APIRouter()
 
+login_rate_limit = RateLimit("login", Settings.rate_limit.login, by_ip=True)
+
 
 @auth_router.post('/register', name='register user', status_code=201, response_model=UserRead)
 async def create_user(user: UserCreate, users=users_service):
@@ -36,7 +40,7 @@ async def refresh(refresh_token: str = None, me=Depends(get_me), users=users_ser
 
 
 
-@auth_router.post('/login', name='login')
+@auth_router.post('/login', name='login', dependencies=[Depends(login_rate_limit)])
 async def login(form_data: OAuth2PasswordRequestForm = Depends(), users=users_service):
     try:
         access_info = await users.login(form_data)
@@ -1,5 +1,6 @@
 import bcrypt
 
+from sqlalchemy import Index, false
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from Services.Tasks.model import Task
@@ -8,14 +9,21 @@ from Shared.Base.BaseModel import Base
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # prefix search by name (LIKE 'abc%') uses btree only with pattern ops
+        Index("ix_users_name_pattern", "name", postgresql_ops={"name": "varchar_pattern_ops"}),
+    )
 
     name: Mapped[str] = mapped_column(nullable=False, unique=True)
     email:Mapped[str] = mapped_column(nullable=False, unique=True, index=True)
     password: Mapped[str] = mapped_column(nullable=False)
     active: Mapped[bool] = mapped_column(default=True, nullable=False)
+    # operator role: bulk deactivation and purge of other users' accounts
+    is_admin: Mapped[bool] = mapped_column(default=False, server_default=false(), nullable=False)
     refresh_token: Mapped[str] = mapped_column(nullable=True)
 
-    tasks: Mapped[list["Task"]] = relationship(back_populates="user", cascade="all, delete-orphan")
+    tasks: Mapped[list["Task"]] = relationship(back_populates="user", cascade="all, delete-orphan",
+                                                 passive_deletes=True)
 
 
     @staticmethod
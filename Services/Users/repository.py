@@ -1,11 +1,18 @@
+from datetime import datetime
+
 from fastapi import Depends
-from sqlalchemy import select, func
+from sqlalchemy import select, func, update, delete, insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from Services.Tasks.model import Task, TaskTombstone, tasks_change_seq, UserTaskCounter, ArchivedTask
+from Services.Tasks.repository import clear_tasks_query_caches, tasks_shard_database
 from Services.Users.model import User
 from Shared.Base.BaseRepository import BaseRepository
-from Shared.Database.Sessions import get_session
+from Shared.Database.ChangeFeed import reserve_change_seq
+from Shared.Database.Sessions import get_session, AsyncDatabase
+from Shared.Database.Shards import shard_of
 from Shared.CustomError.custom_error import NotFoundInDBError
+from Shared.Utils.Handle_db_errors import handle_db_errors
 
 
 class UsersRepository(BaseRepository):
@@ -33,6 +40,146 @@ class UsersRepository(BaseRepository):
         return user
 
 
+    @handle_db_errors
+    async def get_page(self, cursor: int | None = None, limit: int = 50,
+                       active: bool | None = None, name_prefix: str | None = None):
+        """
+            keyset page of users (public columns only), ordered by id.
+            returns limit + 1 rows so the caller can tell if there is a next page
+        """
+        query = select(User.id, User.name, User.email, User.active)
+
+        if cursor is not None:
+            query = query.where(User.id > cursor)
+        if active is not None:
+            query = query.where(User.active == active)
+        if name_prefix:
+            query = query.where(User.name.startswith(name_prefix, autoescape=True))
+
+        query = query.order_by(User.id).limit(limit + 1)
+        result = await self.session.execute(query)
+
+        return result.mappings().all()
+
+
+    @handle_db_errors
+    async def task_counters(self, user_id: int):
+        """
+            (status, priority, count) rows of the user's task counters - an index lookup,
+            NotFoundInDBError if there is no such user. With sharded tasks the counters are on the user's shard
+        """
+        query = (select(UserTaskCounter.status, UserTaskCounter.priority, UserTaskCounter.count)
+                 .where(UserTaskCounter.user_id == user_id))
+        database = tasks_shard_database(user_id)
+        if database is None:
+            rows = (await self.session.execute(query)).all()
+        else:
+            async with database.session() as session:
+                rows = (await session.execute(query)).all()
+        if not rows and await self.session.get(User, user_id) is None:
+            raise NotFoundInDBError
+
+        return rows
+
+
+    @handle_db_errors
+    async def deactivate_users(self, user_ids: list[int], batch_size: int = 1000) -> int:
+        """
+            set-based deactivation, one UPDATE + commit per batch of ids
+        """
+        deactivated = 0
+        for i in range(0, len(user_ids), batch_size):
+            batch = user_ids[i:i + batch_size]
+            query = (update(User)
+                     .where(User.id.in_(batch), User.active.is_(True))
+                     .values(active=False, refresh_token=None, updated_at=datetime.utcnow())
+                     .execution_options(synchronize_session=False))
+            result = await self.session.execute(query)
+            await self.session.commit()
+            deactivated += result.rowcount
+
+        return deactivated
+
+
+    @handle_db_errors
+    async def purge_inactive_users(self, batch_size: int = 100, tasks_batch_size: int = 5000) -> int:
+        """
+            delete inactive users in bounded batches.
+            tasks and archived tasks are removed first in chunks so no single transaction deletes
+            an unbounded number of rows; ON DELETE CASCADE covers the rest
+        """
+        purged = 0
+        while True:
+            ids_query = (select(User.id).where(User.active.is_(False))
+                         .order_by(User.id).limit(batch_size))
+            user_ids = (await self.session.scalars(ids_query)).all()
+            if not user_ids:
+                if purged:
+                    # bulk task deletes bypass per-row invalidation
+                    await clear_tasks_query_caches()
+                return purged
+
+            if len(AsyncDatabase.shards) > 1:
+                await self._purge_sharded_tasks(user_ids, tasks_batch_size)
+            else:
+                await self._purge_tasks(self.session, user_ids, tasks_batch_size)
+                await self._purge_archived_tasks(self.session, user_ids, tasks_batch_size)
+
+            result = await self.session.execute(
+                delete(User).where(User.id.in_(user_ids)).execution_options(synchronize_session=False)
+            )
+            await self.session.commit()
+            purged += result.rowcount
+
+
+    @staticmethod
+    async def _purge_tasks(session: AsyncSession, user_ids: list[int], tasks_batch_size: int) -> None:
+        while True:
+            task_ids = (select(Task.id).where(Task.user_id.in_(user_ids))
+                        .limit(tasks_batch_size).scalar_subquery())
+            deleted = (delete(Task).where(Task.id.in_(task_ids))
+                       .returning(Task.id).cte("deleted_tasks"))
+            # tombstones for delta sync are written by the same statement
+            await reserve_change_seq(session, tasks_change_seq)
+            now = func.timezone('UTC', func.now())
+            query = insert(TaskTombstone).from_select(
+                ["record_id", "change_seq", "created_at", "updated_at"],
+                select(deleted.c.id, tasks_change_seq.next_value(), now, now),
+            )
+            result = await session.execute(query)
+            await session.commit()
+            if result.rowcount < tasks_batch_size:
+                break
+
+
+    @staticmethod
+    async def _purge_archived_tasks(session: AsyncSession, user_ids: list[int], tasks_batch_size: int) -> None:
+        while True:
+            archived_ids = (select(ArchivedTask.id).where(ArchivedTask.user_id.in_(user_ids))
+                            .limit(tasks_batch_size).scalar_subquery())
+            result = await session.execute(delete(ArchivedTask).where(ArchivedTask.id.in_(archived_ids)))
+            await session.commit()
+            if result.rowcount < tasks_batch_size:
+                break
+
+
+    async def _purge_sharded_tasks(self, user_ids: list[int], tasks_batch_size: int) -> None:
+        """
+            each user's tasks on the user's shard; shards have no foreign keys to users,
+            so counters are deleted explicitly instead of by ON DELETE CASCADE
+        """
+        by_shard = {}
+        for user_id in user_ids:
+            by_shard.setdefault(shard_of(user_id, len(AsyncDatabase.shards)), []).append(user_id)
+
+        for shard, shard_user_ids in by_shard.items():
+            async with AsyncDatabase.shards[shard].session() as session:
+                await self._purge_tasks(session, shard_user_ids, tasks_batch_size)
+                await self._purge_archived_tasks(session, shard_user_ids, tasks_batch_size)
+                await session.execute(delete(UserTaskCounter).where(UserTaskCounter.user_id.in_(shard_user_ids)))
+                await session.commit()
+
+
 async def get_users_repository(session: AsyncSession = Depends(get_session)):
     return UsersRepository(session)
 
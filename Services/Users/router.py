@@ -1,19 +1,63 @@
 import logging
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Depends
 
+from Services.Users.schema import UsersPage, UsersDeactivate, UserTaskStats
 from Services.Users.serivce import users_service
+from Shared.Auth.auth import get_me, get_admin
+from Shared.CustomError.custom_error import NotFoundInDBError
 
 users_router = APIRouter()
 
 
-@users_router.get('/users/', name='получение всех пользователей')
-async def all_users(user = users_service):
+@users_router.get('/users/', name='получение пользователей постранично', response_model=UsersPage)
+async def all_users(
+        cursor: int | None = Query(None, description="id последнего пользователя предыдущей страницы"),
+        limit: int = Query(50, ge=1, le=500),
+        active: bool | None = None,
+        name_prefix: str | None = Query(None, min_length=1),
+        user = users_service
+):
     try:
-        db_users =  await user.get_all_users()
-        logging.info(f"Get all users")
+        page = await user.get_users_page(cursor, limit, active, name_prefix)
+        logging.info(f"Get users page")
 
-        return db_users
+        return page
     except Exception as e:
-        logging.error(f"Failed get all users: {e}")
-        raise HTTPException(status_code=500, detail=e)
\ No newline at end of file
+        logging.error(f"Failed get users page: {e}")
+        raise HTTPException(status_code=500, detail=e)
+
+
+@users_router.get('/users/{user_id}/stats', name='статистика задач пользователя', response_model=UserTaskStats)
+async def user_task_stats(user_id: int, user = users_service, me=Depends(get_me)):
+    try:
+        return await user.get_task_stats(user_id)
+    except NotFoundInDBError:
+        raise HTTPException(status_code=404, detail='Пользователь не найден')
+    except Exception as e:
+        logging.error(f"Failed get user task stats: {e}")
+        raise HTTPException(status_code=500, detail=e)
+
+
+@users_router.post('/users/deactivate', name='массовая деактивация пользователей')
+async def deactivate_users(data: UsersDeactivate, user = users_service, me=Depends(get_admin)):
+    try:
+        deactivated = await user.deactivate_users(data.ids)
+        logging.info(f"Deactivated users: {deactivated}")
+
+        return {"deactivated": deactivated}
+    except Exception as e:
+        logging.error(f"Failed deactivate users: {e}")
+        raise HTTPException(status_code=500, detail=e)
+
+
+@users_router.delete('/users/inactive', name='удаление деактивированных пользователей')
+async def purge_inactive_users(user = users_service, me=Depends(get_admin)):
+    try:
+        purged = await user.purge_inactive_users()
+        logging.info(f"Purged inactive users: {purged}")
+
+        return {"purged": purged}
+    except Exception as e:
+        logging.error(f"Failed purge inactive users: {e}")
+        raise HTTPException(status_code=500, detail=e)
@@ -2,6 +2,8 @@ from typing import Optional
 
 from pydantic import BaseModel, Field, field_validator
 
+from Services.Tasks.schema import TaskStatus, TaskPriority
+
 
 class UserCreate(BaseModel):
     name: str
@@ -16,6 +18,23 @@ class UserCreate(BaseModel):
 
 
 class UserRead(BaseModel):
+    id: int | None = None
     name: str
     email: Optional[str] = Field(default=None)
-    active: bool
\ No newline at end of file
+    active: bool
+
+
+class UsersPage(BaseModel):
+    items: list[UserRead]
+    next_cursor: int | None = None
+
+
+class UsersDeactivate(BaseModel):
+    ids: list[int]
+
+
+class UserTaskStats(BaseModel):
+    user_id: int
+    total: int
+    by_status: dict[TaskStatus, int]
+    by_priority: dict[TaskPriority, int]
@@ -15,12 +15,48 @@ class UsersService:
         self._repository = repository
 
 
-    async def get_all_users(self):
+    async def get_users_page(self, cursor: int | None = None, limit: int = 50,
+                             active: bool | None = None, name_prefix: str | None = None):
         """
-            Получение всех пользователей
+            Получение страницы пользователей (keyset-пагинация по id)
         """
-        return await self._repository.all()
+        rows = await self._repository.get_page(cursor, limit, active, name_prefix)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1]["id"]
 
+        return {"items": rows, "next_cursor": next_cursor}
+
+
+
+    async def get_task_stats(self, user_id: int):
+        """
+            Счетчики задач пользователя по статусу и приоритету
+        """
+        rows = await self._repository.task_counters(user_id)
+        by_status, by_priority = {}, {}
+        for status, priority, count in rows:
+            if count:
+                by_status[status] = by_status.get(status, 0) + count
+                by_priority[priority] = by_priority.get(priority, 0) + count
+
+        return {"user_id": user_id, "total": sum(by_status.values()),
+                "by_status": by_status, "by_priority": by_priority}
+
+
+    async def deactivate_users(self, user_ids: list[int]) -> int:
+        """
+            Массовая деактивация пользователей
+        """
+        return await self._repository.deactivate_users(user_ids)
+
+
+    async def purge_inactive_users(self) -> int:
+        """
+            Удаление деактивированных пользователей вместе с их задачами
+        """
+        return await self._repository.purge_inactive_users()
 
 
     async def create_user(self, user_data: dict):
@@ -9,6 +9,7 @@ from fastapi import Depends, HTTPException
 from jose import jwt
 
 from Services.Users.model import User
+from Shared.Auth.tokens import token_verifier, TokenExpiredError, InvalidTokenError
 from Shared.Database.Sessions import get_session
 from Shared.Base.Settings import Settings
 
@@ -66,19 +67,15 @@ async def get_me(token: str = Depends(oauth2_scheme), session = Depends(get_sess
         logging.error(f"Token not provided")
         raise HTTPException(status_code=401, detail="Token not provided")
     try:
-        payload = jwt.decode(token=token, key=Settings.auth.secret_key, algorithms=[Settings.auth.algorithm])
+        payload = token_verifier.verify(token)
 
-    except jwt.ExpiredSignatureError:
+    except TokenExpiredError:
         logging.error(f"Token has expired")
         raise HTTPException(status_code=401, detail="Token has expired")
-    except Exception as e:
+    except InvalidTokenError as e:
         logging.error("Invalid token: " + str(e))
         raise HTTPException(status_code=401, detail="Invalid token: " + str(e))
 
-    if payload.get("exp") and payload["exp"] < datetime.timestamp(datetime.utcnow()):
-        logging.error(f"Token has expired")
-        raise HTTPException(status_code=401, detail="Token expired")
-
     try:
         user = await session.get(User, int(payload.get('user_id')))
         if user.active is False:
@@ -89,4 +86,12 @@ async def get_me(token: str = Depends(oauth2_scheme), session = Depends(get_sess
         logging.error(f"unexpected error: {e}")
         raise HTTPException(status_code=500, detail="unexpected")
     finally:
-        await session.close()
\ No newline at end of file
+        await session.close()
+
+
+async def get_admin(me=Depends(get_me)):
+    """get_me for operator routes: 403 unless the user has the admin role"""
+    if not me.is_admin:
+        logging.error(f"User {me.id} is not an admin")
+        raise HTTPException(status_code=403, detail="Admin rights required")
+    return me
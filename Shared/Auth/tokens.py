@@ -0,0 +1,142 @@
+import base64
+import hashlib
+import hmac
+import time
+from collections import OrderedDict
+
+import orjson
+from jose import jwt
+
+from Shared.Base.Settings import Settings
+
+
+class InvalidTokenError(Exception):
+    """the token can not be trusted: malformed, wrong signature or algorithm"""
+
+
+class TokenExpiredError(InvalidTokenError):
+    """the token was valid, its exp has passed"""
+
+
+class JoseJWTBackend:
+    """python-jose, any algorithm it supports"""
+
+    def __init__(self, secret_key: str, algorithm: str):
+        self.secret_key = secret_key
+        self.algorithms = [algorithm]
+
+
+    def decode(self, token: str) -> dict:
+        try:
+            return jwt.decode(token=token, key=self.secret_key, algorithms=self.algorithms)
+        except jwt.ExpiredSignatureError as e:
+            raise TokenExpiredError(str(e))
+        except Exception as e:
+            raise InvalidTokenError(str(e))
+
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+class HmacJWTBackend:
+    """
+        HS256/HS384/HS512 on hmac + orjson only, several times cheaper per token than python-jose
+        (no key objects, no generic claim machinery); checks the same claims our tokens carry:
+        alg, signature, exp and nbf, and rejects aud like python-jose does without an audience
+    """
+
+    digests = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+
+    def __init__(self, secret_key: str, algorithm: str):
+        if algorithm not in self.digests:
+            raise ValueError(f"HmacJWTBackend supports {', '.join(self.digests)}, not {algorithm}")
+        self.key = secret_key.encode()
+        self.algorithm = algorithm
+        self.digest = self.digests[algorithm]
+
+
+    def decode(self, token: str) -> dict:
+        try:
+            signing_input, _, signature = token.rpartition(".")
+            header_segment, _, payload_segment = signing_input.partition(".")
+            header = orjson.loads(_b64decode(header_segment))
+            payload = orjson.loads(_b64decode(payload_segment))
+            signature = _b64decode(signature)
+        except (ValueError, TypeError) as e:
+            raise InvalidTokenError(f"Malformed token: {e}")
+
+        if not isinstance(header, dict) or not isinstance(payload, dict):
+            raise InvalidTokenError("Malformed token")
+        if header.get("alg") != self.algorithm:
+            raise InvalidTokenError("The specified alg value is not allowed")
+        expected = hmac.new(self.key, signing_input.encode(), self.digest).digest()
+        if not hmac.compare_digest(expected, signature):
+            raise InvalidTokenError("Signature verification failed.")
+
+        now = time.time()
+        exp, nbf = payload.get("exp"), payload.get("nbf")
+        if exp is not None and (not isinstance(exp, (int, float)) or exp < now):
+            raise TokenExpiredError("Signature has expired.")
+        if nbf is not None and (not isinstance(nbf, (int, float)) or nbf > now):
+            raise InvalidTokenError("The token is not yet valid (nbf)")
+        if "aud" in payload:
+            raise InvalidTokenError("Invalid audience")
+        return payload
+
+
+def create_jwt_backend(name: str, secret_key: str, algorithm: str):
+    if name == "hmac":
+        return HmacJWTBackend(secret_key, algorithm)
+    return JoseJWTBackend(secret_key, algorithm)
+
+
+class TokenVerifier:
+    """
+        Verified token -> claims, in process. Keyed by a digest of the token (raw tokens are not kept),
+        an entry lives until the token's exp, so a hit is exactly as valid as a fresh verification.
+        Tokens without exp and failed verifications are not cached; least recently used entries
+        are dropped past max_size, 0 turns the cache off
+    """
+
+    def __init__(self, backend, max_size: int = 10_000):
+        self.backend = backend
+        self.max_size = max_size
+        self._claims: OrderedDict[bytes, tuple[dict, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+
+    def verify(self, token: str) -> dict:
+        """claims of a valid token; TokenExpiredError / InvalidTokenError otherwise"""
+        if not self.max_size:
+            return self.backend.decode(token)
+
+        key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+        cached = self._claims.get(key)
+        if cached is not None:
+            claims, exp = cached
+            if exp >= time.time():
+                self.hits += 1
+                self._claims.move_to_end(key)
+                return claims
+            del self._claims[key]
+
+        self.misses += 1
+        claims = self.backend.decode(token)
+        exp = claims.get("exp")
+        if isinstance(exp, (int, float)):
+            self._claims[key] = (claims, exp)
+            if len(self._claims) > self.max_size:
+                self._claims.popitem(last=False)
+        return claims
+
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._claims)}
+
+
+token_verifier = TokenVerifier(
+    create_jwt_backend(Settings.auth.jwt_backend, Settings.auth.secret_key, Settings.auth.algorithm),
+    Settings.auth.token_cache_size,
+)
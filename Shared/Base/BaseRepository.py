@@ -1,11 +1,14 @@
+import contextlib
 import logging
-from datetime import datetime
+import dataclasses
+from datetime import datetime, timezone
 from typing import Any
 
-from sqlalchemy import select, Column
+from sqlalchemy import select, Column, func, union_all, literal_column, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from Shared.CustomError.custom_error import NotFoundInDBError
+from Shared.CustomError.custom_error import NotFoundInDBError, ArchivedRecordError
+from Shared.Database.ChangeFeed import reserve_change_seq
 from Shared.Utils.Handle_db_errors import handle_db_errors
 
 
@@ -15,14 +18,136 @@ class BaseRepository:
     """
 
     model = None
+    # slotted dataclass for list reads; when set, list methods select only
+    # its columns with Core and build no ORM instances
+    row_struct = None
+    # Shared.Cache.query_cache.QueryCache for get_by_filters / facet_counts, invalidated by create/update/delete
+    query_cache = None
+    # Sequence bumped by update/delete for delta sync, deletes leave a tombstone_model(record_id, change_seq) row;
+    # writes reserve it first (Shared.Database.ChangeFeed), so readers never pass a value still uncommitted
+    change_seq = None
+    tombstone_model = None
+    # cold table with the same columns; list reads include it only on request, id lookups fall back to it
+    archive_model = None
+    # Shared.Database.Counters.GroupCounters updated by create/update/delete in the same transaction
+    counters = None
+    # Shared.Cache.single_flight.SingleFlight: concurrent identical list reads share one query
+    single_flight = None
+    # Shared.Database.History.HistoryLog: changes of its fields made by update() are logged after the commit
+    history = None
 
     def __init__(self, session):
         self.session: AsyncSession = session
 
 
+    def _select(self, fields: list[str] | None = None, model=None):
+        """
+            fields - sparse fieldset, only these columns are selected
+        """
+        model = model or self.model
+        if fields:
+            return select(*(getattr(model, name) for name in fields))
+        if self.row_struct is None:
+            return select(model)
+        return select(*(getattr(model, field.name) for field in dataclasses.fields(self.row_struct)))
+
+
+    def _with_archive(self, build, include_archived: bool = False):
+        """
+            build(model) -> select; with include_archived the same select
+            over archive_model is appended with UNION ALL
+        """
+        if include_archived and self.archive_model is not None:
+            return union_all(build(self.model), build(self.archive_model))
+        return build(self.model)
+
+
+    async def _fetch_rows(self, query, fields: list[str] | None = None, coalesce: bool = False):
+        """
+            coalesce - join an identical query already in flight in this process (row_struct/fields
+            results only, never inside single_transaction where the session may see uncommitted rows)
+        """
+        if (coalesce and self.single_flight is not None and (fields or self.row_struct is not None)
+                and not self._in_single_transaction):
+            compiled = query.compile(dialect=self.session.bind.dialect)
+            key = f"{compiled}\n{sorted(compiled.params.items())!r}\n{fields!r}"
+            return await self.single_flight.do(key, lambda: self._execute_rows(query, fields))
+        return await self._execute_rows(query, fields)
+
+
+    async def _execute_rows(self, query, fields: list[str] | None = None):
+        result = await self.session.execute(query)
+        if fields:
+            return [dict(zip(fields, row)) for row in result]
+        if self.row_struct is None:
+            return result.scalars().all()
+        row_struct = self.row_struct
+        return [row_struct(*row) for row in result]
+
+
+    def _row_state(self, instance) -> dict:
+        return {attr.key: getattr(instance, attr.key) for attr in self.model.__mapper__.column_attrs}
+
+
+    @property
+    def _in_single_transaction(self) -> bool:
+        return "deferred_invalidations" in self.session.info
+
+
+    async def _commit(self):
+        """commit, or only flush inside single_transaction()"""
+        if self._in_single_transaction:
+            await self.session.flush()
+        else:
+            await self.session.commit()
+
+
+    async def _invalidate(self, *rows: dict, history: list[dict] | None = None):
+        """
+            after a committed write: drop matching cached reads, stop joining reads in flight
+            and hand the write's `history` entries to the history log
+        """
+        if self._in_single_transaction:
+            self.session.info["deferred_invalidations"].append((self, rows, history))
+            return
+        if history:
+            self.history.record(history)
+        if self.single_flight is not None:
+            self.single_flight.forget()
+        if self.query_cache is not None:
+            await self.query_cache.invalidate(*rows)
+
+
+    @contextlib.asynccontextmanager
+    async def single_transaction(self):
+        """
+            create/update/delete inside the block (of any repository on this session) share one transaction:
+            one commit at the end, rollback on error. Cache invalidation and history wait for the commit
+            and cached reads are bypassed, so uncommitted rows never reach the cache
+        """
+        deferred = self.session.info["deferred_invalidations"] = []
+        try:
+            yield
+            await self.session.commit()
+        except BaseException:
+            await self.session.rollback()
+            raise
+        finally:
+            del self.session.info["deferred_invalidations"]
+
+        for repository, rows, history in deferred:
+            await repository._invalidate(*rows, history=history)
+
+
     @handle_db_errors
-    async def id(self, model_id: int):
+    async def id(self, model_id: int, include_archived: bool = False):
+        """the live row, or the archived one with include_archived; ArchivedRecordError if only archived"""
         model = await self.session.get(self.model, model_id)
+        if model is None and self.archive_model is not None:
+            archived = await self.session.get(self.archive_model, model_id)
+            if archived is not None and not include_archived:
+                raise ArchivedRecordError
+            model = archived
         if model is not None:
             return model
         raise NotFoundInDBError
@@ -30,17 +155,21 @@ class BaseRepository:
 
     @handle_db_errors
     async def all(self):
-        query = select(self.model)
-        result = await self.session.execute(query)
-        return result.scalars().all()
+        return await self._fetch_rows(self._select())
 
 
     @handle_db_errors
     async def create(self, data: dict):
         model = self.model(**data)
+        if self.change_seq is not None:
+            await reserve_change_seq(self.session, self.change_seq)
         self.session.add(model)
-        await self.session.commit()
+        if self.counters is not None:
+            await self.session.flush()
+            await self.counters.apply(self.session, None, self._row_state(model))
+        await self._commit()
         await self.session.refresh(model)
+        await self._invalidate(self._row_state(model))
         return model
 
 
@@ -49,8 +178,16 @@ class BaseRepository:
         model = await self.id(model_id)
         if not model:
             raise NotFoundInDBError
+        state = self._row_state(model)
+        if self.change_seq is not None:
+            await reserve_change_seq(self.session, self.change_seq)
+        if self.tombstone_model is not None:
+            self.session.add(self.tombstone_model(record_id=model.id, change_seq=self.change_seq.next_value()))
+        if self.counters is not None:
+            await self.counters.apply(self.session, state, None)
         await self.session.delete(model)
-        await self.session.commit()
+        await self._commit()
+        await self._invalidate(state)
         return 200
 
 
@@ -60,6 +197,9 @@ class BaseRepository:
             Update model instance
             excluding None values,and sets updated_at to the current time.
         """
+        tracked = self.query_cache is not None or self.counters is not None or self.history is not None
+        before = self._row_state(instance) if tracked else None
+
         for key, value in update_data.items():
             if value is None:
                 continue
@@ -78,22 +218,208 @@ class BaseRepository:
                 raise ValueError
 
         instance .updated_at = datetime.utcnow()
-        await self.session.commit()
+        if self.change_seq is not None:
+            await reserve_change_seq(self.session, self.change_seq)
+            instance.change_seq = self.change_seq.next_value()
+        if self.counters is not None:
+            await self.counters.apply(self.session, before, self._row_state(instance))
+        await self._commit()
+        if self.change_seq is not None:
+            await self.session.refresh(instance, ["change_seq"])
+        after = self._row_state(instance) if tracked else None
+        history = self.history.diff(before, after) if self.history is not None else None
+        await self._invalidate(*((before, after) if tracked else ()), history=history)
         return instance
 
 
     @handle_db_errors
-    async def get_by_filters(self, created_after: datetime = None, filters: dict[Column[Any], Any | None] | None = None):
-        query = select(self.model)
+    async def get_by_filters(self, created_after: datetime = None, filters: dict[Column[Any], Any | None] | None = None,
+                             fields: list[str] | None = None, include_archived: bool = False,
+                             min_filters: dict[Column[Any], Any | None] | None = None, sort: str | None = None,
+                             order: str = "desc", limit: int | None = None, coalesce: bool = True):
+        """
+            filters - column == value, min_filters - column >= value,
+            sort - column name, order - asc/desc (ties by id in the same direction), limit - top N,
+            coalesce - share the query with identical concurrent calls (see _fetch_rows)
+        """
+        if self.query_cache is None or self._in_single_transaction:
+            return await self._query_by_filters(created_after, filters, fields, include_archived, min_filters,
+                                                sort, order, limit, coalesce)
+
+        key = self.query_cache.key(created_after, filters, fields, min_filters,
+                                   include_archived=include_archived, sort=sort, order=order, limit=limit)
+        generation = await self.query_cache.generation(filters)
+        rows = await self.query_cache.get(key, generation)
+        if rows is None:
+            rows = await self._query_by_filters(created_after, filters, fields, include_archived, min_filters,
+                                                sort, order, limit, coalesce)
+            await self.query_cache.set(key, generation, rows)
+        return rows
+
+
+    @handle_db_errors
+    async def get_versioned_by_filters(self, created_after: datetime = None,
+                                       filters: dict[Column[Any], Any | None] | None = None,
+                                       fields: list[str] | None = None, include_archived: bool = False,
+                                       min_filters: dict[Column[Any], Any | None] | None = None,
+                                       sort: str | None = None, order: str = "desc", limit: int | None = None,
+                                       unchanged=None):
+        """
+            (filters_version, get_by_filters rows) read together for an ETag: the version is queried
+            before the rows and cached in the same entry, so rows are never older than their version.
+            unchanged(version) -> True: the client has this version, rows are not loaded (None)
+        """
+        if self.query_cache is None or self._in_single_transaction:
+            generation = key = None
+        else:
+            key = self.query_cache.key(created_after, filters, fields, min_filters, include_archived=include_archived,
+                                       sort=sort, order=order, limit=limit, versioned=True)
+            generation = await self.query_cache.generation(filters)
+            cached = await self.query_cache.get(key, generation)
+            if cached is not None:
+                return cached
 
+        version = await self._query_filters_version(created_after, filters, include_archived, min_filters)
+        if unchanged is not None and unchanged(version):
+            return version, None
+        rows = await self._query_by_filters(created_after, filters, fields, include_archived, min_filters,
+                                            sort, order, limit, coalesce=key is not None)
+        if key is not None:
+            await self.query_cache.set(key, generation, (version, rows))
+        return version, rows
+
+
+    def _apply_filters(self, query, created_after: datetime = None,
+                       filters: dict[Column[Any], Any | None] | None = None, model=None,
+                       min_filters: dict[Column[Any], Any | None] | None = None):
+        """filters are given as self.model columns and applied to the same-named columns of `model`"""
+        model = model or self.model
         if filters:
             for column, value in filters.items():
                 if value is not None:
-                    query = query.filter(column == value)
+                    query = query.filter(getattr(model, column.key) == value)
+
+        if min_filters:
+            for column, value in min_filters.items():
+                if value is not None:
+                    query = query.filter(getattr(model, column.key) >= value)
 
         if created_after:
-            query = query.filter(self.model.created_at >= created_after)
+            if created_after.tzinfo is not None:
+                # created_at is naive UTC; a plain column comparison keeps partition pruning
+                created_after = created_after.astimezone(timezone.utc).replace(tzinfo=None)
+            query = query.filter(model.created_at >= created_after)
 
-        result = await self.session.execute(query)
-        return result.scalars().all()
+        return query
+
+
+    async def _query_by_filters(self, created_after: datetime = None,
+                                filters: dict[Column[Any], Any | None] | None = None,
+                                fields: list[str] | None = None, include_archived: bool = False,
+                                min_filters: dict[Column[Any], Any | None] | None = None, sort: str | None = None,
+                                order: str = "desc", limit: int | None = None, coalesce: bool = False):
+        unrequested = None
+        if fields and sort and sort not in fields:
+            # ORDER BY over UNION ALL can only use selected columns, the extra one is dropped from the rows
+            unrequested = sort
+            fields = fields + [sort]
+
+        query = self._with_archive(
+            lambda model: self._apply_filters(self._select(fields, model), created_after, filters, model, min_filters),
+            include_archived,
+        )
+        if sort:
+            direction = "asc" if order == "asc" else "desc"
+            query = query.order_by(getattr(literal_column(sort), direction)(),
+                                   getattr(literal_column("id"), direction)())
+        if limit:
+            query = query.limit(limit)
+
+        rows = await self._fetch_rows(query, fields, coalesce)
+        if unrequested:
+            rows = [{name: value for name, value in row.items() if name != unrequested} for row in rows]
+        return rows
+
+
+    @handle_db_errors
+    async def facet_counts(self, facets: list[str], created_after: datetime = None,
+                           filters: dict[Column[Any], Any | None] | None = None, include_archived: bool = False,
+                           min_filters: dict[Column[Any], Any | None] | None = None) -> dict:
+        """
+            {"total": n, facet: {value: count}} over the rows matching the filters,
+            one GROUPING SETS pass (cached like get_by_filters)
+        """
+        if self.query_cache is None or self._in_single_transaction:
+            return await self._query_facet_counts(facets, created_after, filters, include_archived, min_filters)
+
+        key = self.query_cache.key(created_after, filters, None, min_filters,
+                                   include_archived=include_archived, facets=facets)
+        generation = await self.query_cache.generation(filters)
+        counts = await self.query_cache.get(key, generation)
+        if counts is None:
+            counts = await self._query_facet_counts(facets, created_after, filters, include_archived, min_filters)
+            await self.query_cache.set(key, generation, counts)
+        return counts
+
+
+    async def _query_facet_counts(self, facets: list[str], created_after: datetime = None,
+                                  filters: dict[Column[Any], Any | None] | None = None, include_archived: bool = False,
+                                  min_filters: dict[Column[Any], Any | None] | None = None) -> dict:
+        rows = self._with_archive(
+            lambda model: self._apply_filters(select(*(getattr(model, name) for name in facets)),
+                                              created_after, filters, model, min_filters),
+            include_archived,
+        ).subquery()
+        columns = [rows.c[name] for name in facets]
+        # grouping(column) is 0 in the rows of that column's grouping set, the () set gives the total
+        query = (select(*columns, *(func.grouping(column) for column in columns), func.count())
+                 .group_by(func.grouping_sets(*columns, tuple_())))
+
+        counts = {"total": 0, **{name: {} for name in facets}}
+        for row in await self.session.execute(query):
+            values, grouped, count = row[:len(facets)], row[len(facets):-1], row[-1]
+            for name, value, is_aggregated in zip(facets, values, grouped):
+                if not is_aggregated:
+                    counts[name][value] = count
+                    break
+            else:
+                counts["total"] = count
+        return counts
+
+
+    @handle_db_errors
+    async def filters_version(self, created_after: datetime = None,
+                              filters: dict[Column[Any], Any | None] | None = None,
+                              include_archived: bool = False,
+                              min_filters: dict[Column[Any], Any | None] | None = None):
+        """
+            (max(updated_at), count) of the rows matching the filters - changes whenever
+            a matching row is created, updated or deleted; no rows are loaded
+        """
+        return await self._query_filters_version(created_after, filters, include_archived, min_filters)
+
+
+    async def _query_filters_version(self, created_after: datetime = None,
+                                     filters: dict[Column[Any], Any | None] | None = None,
+                                     include_archived: bool = False,
+                                     min_filters: dict[Column[Any], Any | None] | None = None):
+        rows = self._with_archive(
+            lambda model: self._apply_filters(select(model.updated_at), created_after, filters, model, min_filters),
+            include_archived,
+        ).subquery()
+        result = await self.session.execute(select(func.max(rows.c.updated_at), func.count()).select_from(rows))
+        return tuple(result.one())
+
+
+    @handle_db_errors
+    async def id_version(self, model_id: int, include_archived: bool = False):
+        """updated_at of a single row, NotFoundInDBError if there is no such row"""
+        updated_at = await self.session.scalar(select(self.model.updated_at).where(self.model.id == model_id))
+        if updated_at is None and include_archived and self.archive_model is not None:
+            updated_at = await self.session.scalar(
+                select(self.archive_model.updated_at).where(self.archive_model.id == model_id)
+            )
+        if updated_at is None:
+            raise NotFoundInDBError
+        return updated_at
 
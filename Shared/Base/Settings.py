@@ -10,6 +10,8 @@ class DbConfig:
     database: str
     port: str
     url: str
+    pool_timeout: float
+    shards: list[str]
 
 
 @dataclass
@@ -17,12 +19,87 @@ class Auth:
     secret_key: str
     algorithm: str
     access_token_expire_minutes: int
+    jwt_backend: str
+    token_cache_size: int
+
+
+@dataclass
+class CacheConfig:
+    backend: str
+    ttl: int
+    max_size: int
+    url: str | None
+
+
+@dataclass
+class PartitionsConfig:
+    months_ahead: int
+    retention_months: int
+    check_interval: int
+
+
+@dataclass
+class ArchiveConfig:
+    older_than_days: int
+    batch_size: int
+    interval: int
+
+
+@dataclass
+class HistoryConfig:
+    flush_interval: float
+    batch_size: int
+    retention_months: int
+
+
+@dataclass
+class QueueConfig:
+    lease_seconds: int
+
+
+@dataclass
+class StatsConfig:
+    repair_interval: int
+    repair_batch_size: int
+
+
+@dataclass
+class RateLimitConfig:
+    backend: str
+    url: str | None
+    tasks_list: int
+    tasks_search: int
+    tasks_write: int
+    login: int
+
+
+@dataclass
+class DeadlineConfig:
+    default: float
+    routes: dict[str, float]
+
+
+@dataclass
+class ProfilingConfig:
+    token: str | None
+    sample_rate: float
+    directory: str
+    interval: float
 
 
 @dataclass
 class Config:
     database: DbConfig
     auth: Auth
+    cache: CacheConfig
+    partitions: PartitionsConfig
+    archive: ArchiveConfig
+    history: HistoryConfig
+    queue: QueueConfig
+    stats: StatsConfig
+    rate_limit: RateLimitConfig
+    deadlines: DeadlineConfig
+    profiling: ProfilingConfig
 
 
 def get_settings():
@@ -38,11 +115,61 @@ def get_settings():
             database=env.str('POSTGRES_DB'),
             port=env.str('DB_LB_PORT'),
             url=f"postgresql+asyncpg://{env.str('DB_USER')}:{env.str('DB_PASSWORD')}@{env.str('DB_LB_HOST')}:{env.str('DB_LB_PORT')}/{env.str('POSTGRES_DB')}",
+            pool_timeout=env.float('DB_POOL_TIMEOUT', 5),
+            shards=env.list('TASKS_SHARDS', []),
         ),
         auth=Auth(
             secret_key=env.str('SECRET_KEY'),
             algorithm=env.str('ALGORITHM'),
             access_token_expire_minutes=env.str('ACCESS_TOKEN_EXPIRE_MINUTES'),
+            jwt_backend=env.str('JWT_BACKEND', 'jose'),
+            token_cache_size=env.int('JWT_CACHE_SIZE', 10000),
+        ),
+        cache=CacheConfig(
+            backend=env.str('QUERY_CACHE_BACKEND', 'memory'),
+            ttl=env.int('QUERY_CACHE_TTL', 30),
+            max_size=env.int('QUERY_CACHE_MAX_SIZE', 1024),
+            url=env.str('QUERY_CACHE_URL', None),
+        ),
+        partitions=PartitionsConfig(
+            months_ahead=env.int('TASKS_PARTITION_MONTHS_AHEAD', 3),
+            retention_months=env.int('TASKS_PARTITION_RETENTION_MONTHS', 0),
+            check_interval=env.int('TASKS_PARTITION_CHECK_INTERVAL', 3600),
+        ),
+        archive=ArchiveConfig(
+            older_than_days=env.int('TASKS_ARCHIVE_AFTER_DAYS', 0),
+            batch_size=env.int('TASKS_ARCHIVE_BATCH_SIZE', 1000),
+            interval=env.int('TASKS_ARCHIVE_INTERVAL', 600),
+        ),
+        history=HistoryConfig(
+            flush_interval=env.float('TASKS_HISTORY_FLUSH_INTERVAL', 1),
+            batch_size=env.int('TASKS_HISTORY_BATCH_SIZE', 1000),
+            retention_months=env.int('TASKS_HISTORY_RETENTION_MONTHS', 0),
+        ),
+        queue=QueueConfig(
+            lease_seconds=env.int('TASKS_CLAIM_LEASE_SECONDS', 300),
+        ),
+        stats=StatsConfig(
+            repair_interval=env.int('TASKS_STATS_REPAIR_INTERVAL', 0),
+            repair_batch_size=env.int('TASKS_STATS_REPAIR_BATCH_SIZE', 500),
+        ),
+        rate_limit=RateLimitConfig(
+            backend=env.str('RATE_LIMIT_BACKEND', 'memory'),
+            url=env.str('RATE_LIMIT_URL', None),
+            tasks_list=env.int('RATE_LIMIT_TASKS_LIST', 600),
+            tasks_search=env.int('RATE_LIMIT_TASKS_SEARCH', 120),
+            tasks_write=env.int('RATE_LIMIT_TASKS_WRITE', 300),
+            login=env.int('RATE_LIMIT_LOGIN', 60),
+        ),
+        deadlines=DeadlineConfig(
+            default=env.float('REQUEST_DEADLINE', 30),
+            routes=env.dict('REQUEST_DEADLINES', {}, subcast_values=float),
+        ),
+        profiling=ProfilingConfig(
+            token=env.str('PROFILE_TOKEN', None),
+            sample_rate=env.float('PROFILE_SAMPLE_RATE', 0),
+            directory=env.str('PROFILE_DIR', 'profiles'),
+            interval=env.float('PROFILE_INTERVAL', 0.001),
         ),
     )
 
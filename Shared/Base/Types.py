@@ -0,0 +1,25 @@
+from enum import Enum
+
+from sqlalchemy import SmallInteger
+from sqlalchemy.types import TypeDecorator
+
+
+class IntEnum(TypeDecorator):
+    """
+        int Enum stored as its numeric value (smallint),
+        so ordering and range filters follow the numbers
+    """
+    impl = SmallInteger
+    cache_ok = True
+
+    def __init__(self, enum_class: type[Enum], *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.enum_class = enum_class
+
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else int(value)
+
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else self.enum_class(value)
@@ -0,0 +1,274 @@
+import json
+import pickle
+import secrets
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Any
+
+
+class CacheBackend(ABC):
+    """
+        Storage for cached query results.
+        Keys are strings, values are whatever the repository returned.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Any | None:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: int) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, *keys: str) -> None:
+        ...
+
+    @abstractmethod
+    async def keys(self) -> list[str]:
+        ...
+
+    @abstractmethod
+    async def generations(self, tags: list[str], create: bool = True) -> list[str | None]:
+        """current generation token per tag; a missing one is created when `create`"""
+
+    @abstractmethod
+    async def bump(self, tags: list[str]) -> None:
+        """new generation tokens: entries stored under the old ones are stale"""
+
+    async def clear(self) -> None:
+        await self.delete(*await self.keys())
+
+    async def size(self) -> int:
+        return len(await self.keys())
+
+
+class MemoryCacheBackend(CacheBackend):
+    """
+        In-process LRU with per-entry TTL. One per worker: a write invalidates the entries
+        of its own process only, so with several workers use the redis backend
+    """
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._generations: dict[str, str] = {}
+
+
+    async def get(self, key: str) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+
+    async def set(self, key: str, value: Any, ttl: int) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+
+    async def keys(self) -> list[str]:
+        return list(self._entries)
+
+
+    async def generations(self, tags: list[str], create: bool = True) -> list[str | None]:
+        if create:
+            return [self._generations.setdefault(tag, secrets.token_hex(8)) for tag in tags]
+        return [self._generations.get(tag) for tag in tags]
+
+
+    async def bump(self, tags: list[str]) -> None:
+        for tag in tags:
+            self._generations[tag] = secrets.token_hex(8)
+
+
+    async def clear(self) -> None:
+        self._entries.clear()
+        self._generations.clear()
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+        Shared backend for several workers, needs the optional `redis` package.
+        Size bound / LRU eviction is redis' maxmemory-policy (allkeys-lru).
+    """
+
+    def __init__(self, url: str, prefix: str = "query_cache:"):
+        try:
+            from redis import asyncio as redis
+        except ImportError:
+            raise RuntimeError("RedisCacheBackend requires the `redis` package")
+
+        self.prefix = prefix
+        self._redis = redis.from_url(url)
+
+
+    async def get(self, key: str) -> Any | None:
+        value = await self._redis.get(self.prefix + key)
+        return None if value is None else pickle.loads(value)
+
+
+    async def set(self, key: str, value: Any, ttl: int) -> None:
+        await self._redis.set(self.prefix + key, pickle.dumps(value), ex=ttl)
+
+
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await self._redis.delete(*(self.prefix + key for key in keys))
+
+
+    async def keys(self) -> list[str]:
+        """entry keys, for stats and clear() only: a scan over the whole prefix"""
+        return [key.decode()[len(self.prefix):] async for key in self._redis.scan_iter(match=self.prefix + "*")]
+
+
+    async def generations(self, tags: list[str], create: bool = True) -> list[str | None]:
+        names = [self.prefix + "gen:" + tag for tag in tags]
+        tokens = await self._redis.mget(names)
+        if create and None in tokens:
+            # no expiry: an evicted token is recreated with a new value, never with an old one
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for name, token in zip(names, tokens):
+                    if token is None:
+                        pipe.set(name, secrets.token_hex(8), nx=True)
+                await pipe.execute()
+            tokens = await self._redis.mget(names)
+        return [None if token is None else token.decode() for token in tokens]
+
+
+    async def bump(self, tags: list[str]) -> None:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for tag in tags:
+                pipe.set(self.prefix + "gen:" + tag, secrets.token_hex(8))
+            await pipe.execute()
+
+
+class QueryCache:
+    """
+        Read-through cache for get_by_filters results.
+
+        key - normalized filter parameters (json). Every entry belongs to one tag: its equality filter
+        on the first of `tag_columns` it filters by (e.g. status=done), "*" without one. A write bumps
+        the generation of "*" and of the tags of the row's values, so invalidation costs a few token
+        writes whatever the cache size; entries of untouched tags stay. Readers take the generation
+        before their query and store it with the entry, which is served only while the generation
+        is unchanged: rows read before a concurrent write never become a hit
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: int = 30, namespace: str = "",
+                 tag_columns: tuple[str, ...] = ()):
+        self.backend = backend
+        self.ttl = ttl
+        self.namespace = namespace
+        self.tag_columns = tag_columns
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+
+    @staticmethod
+    def _normalize(value: Any) -> Any:
+        if isinstance(value, Enum):
+            return value.value
+        if isinstance(value, datetime):
+            if value.tzinfo is not None:
+                value = value.astimezone(timezone.utc).replace(tzinfo=None)
+            return value.isoformat()
+        return value
+
+
+    def key(self, created_after: datetime | None, filters: dict | None, fields: list[str] | None = None,
+            min_filters: dict | None = None, **options) -> str:
+        """options - other query switches that change the result but are not row filters"""
+        params = {
+            "created_after": self._normalize(created_after) if created_after else None,
+            "filters": {column.key: self._normalize(value)
+                        for column, value in (filters or {}).items() if value is not None},
+            "min_filters": {column.key: self._normalize(value)
+                            for column, value in (min_filters or {}).items() if value is not None},
+            "fields": fields,
+            "options": options,
+        }
+        return self.namespace + json.dumps(params, sort_keys=True)
+
+
+    def _tag(self, column: str | None = None, value: Any = None) -> str:
+        if column is None:
+            return self.namespace + "*"
+        return f"{self.namespace}{column}={self._normalize(value)}"
+
+
+    def tag(self, filters: dict | None) -> str:
+        """tag of the entries of these filters"""
+        values = {column.key: value for column, value in (filters or {}).items() if value is not None}
+        for column in self.tag_columns:
+            if column in values:
+                return self._tag(column, values[column])
+        return self._tag()
+
+
+    async def generation(self, filters: dict | None) -> str:
+        """take before running the query whose result is stored with set()"""
+        return (await self.backend.generations([self.tag(filters)]))[0]
+
+
+    async def get(self, key: str, generation: str) -> Any | None:
+        entry = await self.backend.get(key)
+        if entry is None or entry[0] != generation:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+
+    async def set(self, key: str, generation: str, value: Any) -> None:
+        await self.backend.set(key, (generation, value), self.ttl)
+
+
+    async def invalidate(self, *rows: dict) -> None:
+        """
+            make stale the entries whose filters may match any of the given row states
+            (for update - the row before and after the change)
+        """
+        tags = {self._tag()}
+        for row in rows:
+            tags.update(self._tag(column, row[column]) for column in self.tag_columns if column in row)
+        await self.backend.bump(sorted(tags))
+        self.invalidations += 1
+
+
+    async def clear(self) -> None:
+        await self.backend.clear()
+
+
+    async def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "size": await self.backend.size(),
+        }
+
+
+def create_query_cache(backend: str, ttl: int, max_size: int, url: str | None = None, namespace: str = "",
+                       tag_columns: tuple[str, ...] = ()) -> QueryCache:
+    if backend == "redis":
+        return QueryCache(RedisCacheBackend(url), ttl=ttl, namespace=namespace, tag_columns=tag_columns)
+    return QueryCache(MemoryCacheBackend(max_size=max_size), ttl=ttl, namespace=namespace, tag_columns=tag_columns)
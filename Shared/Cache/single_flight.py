@@ -0,0 +1,66 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+
+class _LeaderCancelled(Exception):
+    """the caller running the shared call was cancelled, waiters run the call themselves"""
+
+
+class SingleFlight:
+    """
+        Coalesces concurrent identical calls inside one process: the first caller runs the call,
+        callers arriving while it is in flight await its result. Nothing is kept once
+        the call completes, so it adds no staleness on top of the query itself
+    """
+
+    def __init__(self):
+        self._calls: dict[str, asyncio.Future] = {}
+        self.executed = 0
+        self.shared = 0
+
+
+    async def do(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._calls.get(key)
+        if future is not None:
+            self.shared += 1
+            try:
+                return await asyncio.shield(future)
+            except _LeaderCancelled:
+                return await self.do(key, call)
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self.executed += 1
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            self._fail(future, _LeaderCancelled())
+            raise
+        except BaseException as e:
+            self._fail(future, e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+
+    @staticmethod
+    def _fail(future: asyncio.Future, error: BaseException) -> None:
+        future.set_exception(error)
+        # mark the exception as retrieved, there may be no waiters
+        future.exception()
+
+
+    def forget(self) -> None:
+        """
+            new callers start a fresh call instead of joining the ones in flight,
+            called after a write so a reader never gets a result that started before it
+        """
+        self._calls.clear()
+
+
+    def stats(self) -> dict:
+        return {"executed": self.executed, "shared": self.shared}
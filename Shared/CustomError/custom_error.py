@@ -29,6 +29,15 @@ class NotFoundInDBError(CustomException):
         super().__init__(message)
 
 
+class ArchivedRecordError(NotFoundInDBError):
+    """
+    Исключение, возникающее когда запись перенесена в архив и изменить ее нельзя
+    """
+
+    def __init__(self, message="Запись перенесена в архив"):
+        super().__init__(message)
+
+
 class NotValidPassword(CustomException):
     """
     Исключение, возникающее когда ввели неверный пароль
@@ -0,0 +1,31 @@
+from sqlalchemy import Sequence, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+# bigint advisory locks (objsubid 1) of this database held by other backends, as their bigint key
+HELD_KEYS = text(
+    "SELECT min((classid::bigint << 32) | objid::bigint) FROM pg_locks "
+    "WHERE locktype = 'advisory' AND objsubid = 1 AND pid <> pg_backend_pid() "
+    "AND database = (SELECT oid FROM pg_database WHERE datname = current_database())"
+)
+
+
+async def reserve_change_seq(session: AsyncSession, sequence: Sequence) -> None:
+    """
+        before a transaction draws values of `sequence` (a change cursor): a shared advisory lock
+        keyed by the sequence's current value, held until commit / rollback. Every value the
+        transaction draws afterwards is above the key, see change_seq_watermark
+    """
+    await session.execute(text(f"SELECT pg_advisory_xact_lock_shared(last_value) FROM {sequence.name}"))
+
+
+async def change_seq_watermark(session: AsyncSession, sequence: Sequence) -> int:
+    """
+        highest value of `sequence` below which no transaction still in flight holds a value:
+        change_seq is drawn when a statement runs, not when it commits, so a reader must not
+        move its cursor past a value an open transaction may still commit. The sequence is read
+        before the locks: whatever was drawn by then is covered by a lock held now, or committed
+    """
+    last_value = await session.scalar(text(f"SELECT last_value FROM {sequence.name}"))
+    held = await session.scalar(HELD_KEYS)
+    return last_value if held is None else min(last_value, held - 1)
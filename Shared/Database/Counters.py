@@ -0,0 +1,74 @@
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import delete, select, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+class GroupCounters:
+    """
+        Row counts of a table grouped by `group_by` columns, stored in `model`
+        (the group_by columns, unique together, plus `count`).
+        Writers apply +1/-1 deltas in their own transaction, so a read is a lookup
+        instead of an aggregate over the source table
+    """
+
+    def __init__(self, model, group_by: tuple[str, ...]):
+        self.model = model
+        self.group_by = group_by
+
+
+    def deltas(self, before: dict | None, after: dict | None) -> dict[tuple, int]:
+        """net change per group for one row going from `before` to `after` (None - no row)"""
+        deltas = defaultdict(int)
+        if before is not None:
+            deltas[tuple(before[name] for name in self.group_by)] -= 1
+        if after is not None:
+            deltas[tuple(after[name] for name in self.group_by)] += 1
+        # fixed order: concurrent writers lock the same counter rows in the same order
+        return {key: delta for key, delta in sorted(deltas.items()) if delta}
+
+
+    async def apply(self, session: AsyncSession, before: dict | None, after: dict | None) -> None:
+        await self.add(session, self.deltas(before, after))
+
+
+    async def add(self, session: AsyncSession, deltas: dict[tuple, int]) -> None:
+        """add net deltas per group (keys in group_by order), e.g. counted over a bulk insert"""
+        deltas = {key: delta for key, delta in sorted(deltas.items()) if delta}
+        if not deltas:
+            return
+
+        now = datetime.utcnow()
+        query = insert(self.model).values([
+            {**dict(zip(self.group_by, key)), "count": delta, "created_at": now, "updated_at": now}
+            for key, delta in deltas.items()
+        ])
+        query = query.on_conflict_do_update(
+            index_elements=list(self.group_by),
+            set_={"count": self.model.count + query.excluded.count, "updated_at": now},
+        )
+        await session.execute(query)
+
+
+    async def rebuild(self, session: AsyncSession, source, scope: str, values: list) -> None:
+        """
+            recount the groups whose `scope` column is in `values` from `source`
+            (a selectable with the group_by columns). Existing counter rows are deleted first,
+            which locks them: writers blocked on them add their delta on top of the recount after commit
+        """
+        scope_column = getattr(self.model, scope)
+        await session.execute(delete(self.model).where(scope_column.in_(values)))
+
+        columns = [source.c[name] for name in self.group_by]
+        now = func.timezone('UTC', func.now())
+        query = insert(self.model).from_select(
+            [*self.group_by, "count", "created_at", "updated_at"],
+            select(*columns, func.count(), now, now).where(source.c[scope].in_(values)).group_by(*columns),
+        )
+        query = query.on_conflict_do_update(
+            index_elements=list(self.group_by),
+            set_={"count": self.model.count + query.excluded.count},
+        )
+        await session.execute(query)
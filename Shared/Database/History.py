@@ -0,0 +1,134 @@
+import asyncio
+import logging
+from enum import Enum
+
+from sqlalchemy import select, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def _json_value(value):
+    return value.value if isinstance(value, Enum) else value
+
+
+class HistoryLog:
+    """
+        Append-only log of field changes of `model` rows, stored in `model`
+        (key, field, old_value, new_value, changed_at). update() hands over the before/after
+        row states it already has; the changes of `fields` are buffered in process and written
+        in multi-row inserts by flush(), so an update pays for a dict comparison, not for an INSERT.
+        Buffered entries are served by read() until flushed and lost if the process dies
+    """
+
+    def __init__(self, model, key: str, fields: tuple[str, ...], batch_size: int = 1000,
+                 max_pending: int = 100_000):
+        self.model = model
+        self.key = key
+        self.fields = fields
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        # set by run_forever: a full batch is flushed right away instead of waiting for the interval
+        self.database = None
+        self._pending: list[dict] = []
+        self._lock = asyncio.Lock()
+        self._flushing: asyncio.Task | None = None
+        self.written = 0
+        self.dropped = 0
+
+
+    def diff(self, before: dict, after: dict) -> list[dict]:
+        """entries for the tracked fields that differ, stamped with the row's updated_at"""
+        return [
+            {self.key: after["id"], "field": name, "old_value": _json_value(before[name]),
+             "new_value": _json_value(after[name]), "changed_at": after["updated_at"]}
+            for name in self.fields if before[name] != after[name]
+        ]
+
+
+    def record(self, entries: list[dict]) -> None:
+        """buffer entries of a committed write"""
+        if not entries:
+            return
+        self._pending.extend(entries)
+        self._trim()
+        if (len(self._pending) >= self.batch_size and self.database is not None
+                and (self._flushing is None or self._flushing.done())):
+            self._flushing = asyncio.create_task(self._flush_logged(self.database))
+
+
+    def _trim(self) -> None:
+        overflow = len(self._pending) - self.max_pending
+        if overflow > 0:
+            # the database is not keeping up (or is down): keep the newest entries
+            del self._pending[:overflow]
+            self.dropped += overflow
+            logging.error(f"History of {self.model.__tablename__}: {overflow} unflushed entries dropped")
+
+
+    async def flush(self, session: AsyncSession) -> int:
+        """
+            write everything buffered so far, one transaction per batch; a failed batch goes back
+            to the buffer, still capped at max_pending
+        """
+        written = 0
+        async with self._lock:
+            while self._pending:
+                batch = self._pending[:self.batch_size]
+                del self._pending[:self.batch_size]
+                try:
+                    await session.execute(insert(self.model), batch)
+                    await session.commit()
+                except BaseException:
+                    await session.rollback()
+                    self._pending[:0] = batch
+                    self._trim()
+                    raise
+                written += len(batch)
+                self.written += len(batch)
+        return written
+
+
+    async def flush_database(self, database) -> int:
+        async with database.session() as session:
+            return await self.flush(session)
+
+
+    async def _flush_logged(self, database) -> None:
+        try:
+            await self.flush_database(database)
+        except Exception as e:
+            logging.error(f"History flush of {self.model.__tablename__} failed: {e}")
+
+
+    async def read(self, session: AsyncSession, key_value) -> list[tuple]:
+        """
+            (field, old_value, new_value, changed_at) of the row, oldest first: the (key, changed_at)
+            index range plus entries of this process not flushed yet. Waits for a flush in progress,
+            so an entry being written is never returned twice or missed
+        """
+        model = self.model
+        query = (select(model.field, model.old_value, model.new_value, model.changed_at)
+                 .where(getattr(model, self.key) == key_value)
+                 .order_by(model.changed_at, model.id))
+        async with self._lock:
+            rows = [tuple(row) for row in await session.execute(query)]
+            rows += [(entry["field"], entry["old_value"], entry["new_value"], entry["changed_at"])
+                     for entry in self._pending if entry[self.key] == key_value]
+        rows.sort(key=lambda row: row[3])
+        return rows
+
+
+    async def run_forever(self, database, interval: float) -> None:
+        """flush loop, started from the app lifespan"""
+        self.database = database
+        while True:
+            await asyncio.sleep(interval)
+            await self._flush_logged(database)
+
+
+    def clear(self) -> None:
+        """drop the buffered entries"""
+        self._pending.clear()
+
+
+    def stats(self) -> dict:
+        return {"pending": len(self._pending), "written": self.written, "dropped": self.dropped}
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import re
+from datetime import date, datetime
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+
+def month_start(value: date, shift: int = 0) -> date:
+    """first day of the month of `value`, shifted by `shift` months"""
+    month = value.year * 12 + value.month - 1 + shift
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def partition_name(table: str, start: date) -> str:
+    return f"{table}_y{start.year}m{start.month:02d}"
+
+
+def create_partition_sql(table: str, start: date) -> str:
+    return (f"CREATE TABLE IF NOT EXISTS {partition_name(table, start)} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{month_start(start, 1).isoformat()}')")
+
+
+class MonthlyPartitions:
+    """
+        Monthly range partitions of a natively partitioned table:
+        partitions are created `months_ahead` in advance and detached (not dropped)
+        once they are older than `retention_months` (0 - never detach)
+    """
+
+    def __init__(self, table: str, months_ahead: int = 3, retention_months: int = 0):
+        self.table = table
+        self.months_ahead = months_ahead
+        self.retention_months = retention_months
+        self._name = re.compile(rf"^{table}_y(\d{{4}})m(\d{{2}})$")
+
+
+    async def is_partitioned(self, conn: AsyncConnection) -> bool:
+        query = text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)")
+        return await conn.scalar(query, {"table": self.table}) is not None
+
+
+    async def default_partition(self, conn: AsyncConnection) -> tuple[str, str] | None:
+        """(DEFAULT partition, partition key column), None without a DEFAULT partition"""
+        query = text("SELECT p.partdefid::regclass::text, a.attname FROM pg_partitioned_table p "
+                     "JOIN pg_attribute a ON a.attrelid = p.partrelid AND a.attnum = p.partattrs[0] "
+                     "WHERE p.partrelid = to_regclass(:table) AND p.partdefid <> 0")
+        row = (await conn.execute(query, {"table": self.table})).first()
+        return tuple(row) if row else None
+
+
+    async def partitions(self, conn: AsyncConnection) -> dict[str, date]:
+        query = text("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                     "WHERE i.inhparent = to_regclass(:table)")
+        result = {}
+        for name in await conn.scalars(query, {"table": self.table}):
+            match = self._name.match(name)
+            if match:
+                result[name] = date(int(match[1]), int(match[2]), 1)
+        return result
+
+
+    async def ensure(self, conn: AsyncConnection, today: date | None = None) -> list[str]:
+        """
+            partitions from the current month to `months_ahead` months on; a month that is not
+            created (the database error is logged) is retried by the next call
+        """
+        start = month_start(today or datetime.utcnow().date())
+        existing = await self.partitions(conn)
+        default = await self.default_partition(conn)
+        created = []
+        for shift in range(self.months_ahead + 1):
+            month = month_start(start, shift)
+            name = partition_name(self.table, month)
+            if name in existing:
+                continue
+            try:
+                async with conn.begin_nested():
+                    await self._create(conn, month, default)
+            except DBAPIError as e:
+                logging.error(f"Partition {name} of {self.table} not created: {e}")
+                continue
+            created.append(name)
+        return created
+
+
+    async def _create(self, conn: AsyncConnection, month: date, default: tuple[str, str] | None) -> None:
+        """
+            while maintenance was behind, rows of the month went to the DEFAULT partition and
+            a plain CREATE ... PARTITION OF would fail on them: they are moved to the new table first,
+            then it is attached
+        """
+        name = partition_name(self.table, month)
+        bounds = {"start": month, "end": month_start(month, 1)}
+        if default is not None:
+            default_name, column = default
+            in_month = f"{column} >= :start AND {column} < :end"
+            query = text(f"SELECT 1 FROM {default_name} WHERE {in_month} LIMIT 1")
+            if await conn.scalar(query, bounds) is not None:
+                await conn.execute(text(f"CREATE TABLE {name} (LIKE {self.table} INCLUDING DEFAULTS)"))
+                await conn.execute(text(f"WITH moved AS (DELETE FROM {default_name} WHERE {in_month} RETURNING *) "
+                                        f"INSERT INTO {name} SELECT * FROM moved"), bounds)
+                await conn.execute(text(f"ALTER TABLE {self.table} ATTACH PARTITION {name} FOR VALUES "
+                                        f"FROM ('{month.isoformat()}') TO ('{bounds['end'].isoformat()}')"))
+                return
+        await conn.execute(text(create_partition_sql(self.table, month)))
+
+
+    async def detach_expired(self, conn: AsyncConnection, today: date | None = None) -> list[str]:
+        if not self.retention_months:
+            return []
+
+        cutoff = month_start(today or datetime.utcnow().date(), -self.retention_months)
+        detached = []
+        for name, month in sorted((await self.partitions(conn)).items(), key=lambda item: item[1]):
+            if month_start(month, 1) <= cutoff:
+                await conn.execute(text(f"ALTER TABLE {self.table} DETACH PARTITION {name}"))
+                detached.append(name)
+        return detached
+
+
+    async def maintain(self, database) -> None:
+        async with database.connect() as conn:
+            if not await self.is_partitioned(conn):
+                return
+            created = await self.ensure(conn)
+            detached = await self.detach_expired(conn)
+
+        if created or detached:
+            logging.info(f"Partitions of {self.table}: created {created}, detached {detached}")
+
+
+    async def run_forever(self, database, interval: int) -> None:
+        """maintenance loop, started from the app lifespan"""
+        while True:
+            try:
+                await self.maintain(database)
+            except Exception as e:
+                logging.error(f"Partition maintenance of {self.table} failed: {e}")
+            await asyncio.sleep(interval)
@@ -9,19 +9,25 @@ from Shared.Base.Settings import Settings
 
 class AsyncDBSessions:
 
-    def __init__(self):
+    def __init__(self, database: str | None = None, shards: list[str] | None = None):
+        database = database or Settings.database.database
         self._URL = SQURL.URL.create(
             drivername="postgresql+asyncpg",
             username=Settings.database.user,
             password=Settings.database.password,
             host=Settings.database.host,
             port=Settings.database.port,
-            database=Settings.database.database,
+            database=database,
         )
         self._engine = create_async_engine(self._URL,
                                           pool_size=5,
-                                          max_overflow=10,)
+                                          max_overflow=10,
+                                          # bounded checkout wait, surfaces as 503 (Shared.Utils.Deadlines)
+                                          pool_timeout=Settings.database.pool_timeout,)
         self._sessionmaker = async_sessionmaker(self._engine, class_=AsyncSession, expire_on_commit=False)
+        # tasks shard map, databases on the same server, position = shard number
+        # (Services.Tasks.repository.ShardedTasksRepository); this database itself may be one of them
+        self.shards = [self if name == database else AsyncDBSessions(name) for name in shards or ()]
 
 
     def get_url(self):
@@ -37,6 +43,9 @@ class AsyncDBSessions:
 
 
     async def close(self) -> None:
+        for shard in self.shards:
+            if shard is not self:
+                await shard.close()
         if self._engine is None:
             return
         await self._engine.dispose()
@@ -68,7 +77,7 @@ class AsyncDBSessions:
                 raise
 
 
-AsyncDatabase = AsyncDBSessions()
+AsyncDatabase = AsyncDBSessions(shards=Settings.database.shards)
 
 
 async def get_session() -> AsyncSession:
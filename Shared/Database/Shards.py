@@ -0,0 +1,86 @@
+import hashlib
+import heapq
+from itertools import islice
+
+from sqlalchemy import text, inspect
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.schema import CreateTable, CreateIndex
+from sqlalchemy.types import SchemaType
+
+
+def shard_of(key, count: int) -> int:
+    """shard number of a key: a stable hash (unlike hash(), the same in every worker and after restarts)"""
+    if count <= 1:
+        return 0
+    digest = hashlib.blake2b(str(key).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % count
+
+
+def id_shard(record_id: int, count: int) -> int:
+    """shard that allocated the id, see interleave_ids"""
+    if count <= 1:
+        return 0
+    return (record_id - 1) % count
+
+
+def merge_sorted(results: list[list], sort: str | None = None, order: str = "desc", limit: int | None = None) -> list:
+    """
+        merge per-shard results, each ordered by (sort, id) and cut to `limit` already,
+        into one list in the same order and limit; unsorted results are concatenated.
+        Rows are row structs or dicts (sparse fields, id is the tiebreaker only when selected)
+    """
+    if not sort:
+        rows = [row for result in results for row in result]
+        return rows[:limit] if limit else rows
+
+    first = next((result[0] for result in results if result), None)
+    if first is None:
+        return []
+    if isinstance(first, dict):
+        names = [sort, "id"] if "id" in first else [sort]
+        key = lambda row: tuple(row[name] for name in names)
+    else:
+        key = lambda row: (getattr(row, sort), row.id)
+
+    rows = heapq.merge(*results, key=key, reverse=order != "asc")
+    return list(islice(rows, limit)) if limit else list(rows)
+
+
+async def create_shard_schema(conn: AsyncConnection, tables: list, sequences: list = ()) -> None:
+    """
+        create the tables (with their indexes, enum types and `sequences`) on a shard database,
+        without foreign keys: the referenced rows stay on the main database. Existing tables are kept
+    """
+
+    def create(sync_conn):
+        for sequence in sequences:
+            sequence.create(sync_conn, checkfirst=True)
+        existing = set(inspect(sync_conn).get_table_names())
+        for table in tables:
+            if table.name in existing:
+                continue
+            for column in table.columns:
+                if isinstance(column.type, SchemaType):
+                    column.type.create(sync_conn, checkfirst=True)
+            sync_conn.execute(CreateTable(table, include_foreign_key_constraints=[]))
+            for index in table.indexes:
+                sync_conn.execute(CreateIndex(index))
+
+    await conn.run_sync(create)
+
+
+async def max_id(conn: AsyncConnection, tables: list[str]) -> int:
+    result = 0
+    for table in tables:
+        result = max(result, await conn.scalar(text(f"SELECT coalesce(max(id), 0) FROM {table}")))
+    return result
+
+
+async def interleave_ids(conn: AsyncConnection, sequence: str, shard: int, count: int, above: int = 0) -> None:
+    """
+        shard `shard` of `count` hands out ids shard+1, shard+1+count, ... above `above`
+        (the largest id on any shard), so ids stay unique across shards and id_shard()
+        finds the owner without asking every shard
+    """
+    start = above + 1 + (shard - above) % count
+    await conn.execute(text(f"ALTER SEQUENCE {sequence} INCREMENT BY {count} RESTART WITH {start}"))
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import time
+from contextvars import ContextVar
+
+import orjson
+from fastapi.exception_handlers import http_exception_handler
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError, DBAPIError
+from sqlalchemy.orm import Session
+from starlette.exceptions import HTTPException as StarletteHTTPException
+
+
+# absolute time.monotonic() deadline of the current request, None - no deadline
+request_deadline: ContextVar[float | None] = ContextVar("request_deadline", default=None)
+
+# Postgres gives up a bit after the request does, so the middleware normally answers first
+# and statement_timeout is the backstop that stops the query even if the cancel is lost
+STATEMENT_TIMEOUT_GRACE = 0.25
+
+# query_canceled: statement_timeout or a cancel request
+QUERY_CANCELED = "57014"
+
+
+@event.listens_for(Session, "after_begin")
+def apply_statement_timeout(session, transaction, connection):
+    """every transaction opened inside a request with a deadline gets the time left as statement_timeout"""
+    deadline = request_deadline.get()
+    if deadline is None:
+        return
+    timeout_ms = max(1, int((deadline - time.monotonic() + STATEMENT_TIMEOUT_GRACE) * 1000))
+    connection.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout_ms}")
+
+
+class DeadlineMiddleware:
+    """
+        Pure ASGI middleware: each HTTP request runs with a deadline (longest matching path prefix
+        from `routes`, otherwise `default`, 0 - none). The handler is cancelled when the deadline
+        passes (503 + Retry-After if the response has not started) or the client disconnects;
+        cancelling an awaited asyncpg query also cancels it in Postgres
+    """
+
+    def __init__(self, app, default: float = 0, routes: dict[str, float] | None = None):
+        self.app = app
+        self.default = default
+        self.routes = sorted((routes or {}).items(), key=lambda route: len(route[0]), reverse=True)
+
+
+    def timeout_for(self, path: str) -> float:
+        for prefix, timeout in self.routes:
+            if path.startswith(prefix):
+                return timeout
+        return self.default
+
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timeout = self.timeout_for(scope["path"])
+        # the handler reads the request through the queue, the listener keeps reading
+        # the real channel so a disconnect is seen while the handler is still busy
+        messages = asyncio.Queue(maxsize=1)
+        response = {"started": False, "complete": False}
+
+        async def listen():
+            while True:
+                message = await receive()
+                await messages.put(message)
+                if message["type"] == "http.disconnect":
+                    return
+
+        async def send_tracked(message):
+            if message["type"] == "http.response.start":
+                response["started"] = True
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                response["complete"] = True
+            await send(message)
+
+        token = request_deadline.set(time.monotonic() + timeout if timeout else None)
+        handler = asyncio.create_task(self.app(scope, messages.get, send_tracked))
+        request_deadline.reset(token)
+        listener = asyncio.create_task(listen())
+
+        try:
+            done, _ = await asyncio.wait({handler, listener}, timeout=timeout or None,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            # servers report a disconnect once the response is complete, that is not a cancellation
+            if handler in done or response["complete"]:
+                return await handler
+        finally:
+            listener.cancel()
+
+        handler.cancel()
+        await asyncio.gather(handler, return_exceptions=True)
+        if listener in done:
+            logging.info(f"Client disconnected, request cancelled: {scope['path']}")
+            return
+
+        logging.error(f"Request deadline exceeded ({timeout}s): {scope['path']}")
+        if not response["started"]:
+            await send({"type": "http.response.start", "status": 503,
+                        "headers": [(b"content-type", b"application/json"), (b"retry-after", b"1")]})
+            await send({"type": "http.response.body", "body": orjson.dumps({"detail": "Request deadline exceeded"})})
+
+
+def is_overload_error(exc: BaseException) -> bool:
+    """pool checkout timed out or the query was cancelled by statement_timeout"""
+    if isinstance(exc, PoolTimeoutError):
+        return True
+    return isinstance(exc, DBAPIError) and getattr(exc.orig, "pgcode", None) == QUERY_CANCELED
+
+
+async def overload_handler(request, exc):
+    return ORJSONResponse({"detail": "Database is busy, retry later"}, status_code=503, headers={"Retry-After": "1"})
+
+
+async def http_overload_handler(request, exc: StarletteHTTPException):
+    # routers wrap unexpected errors as HTTPException(500, detail=e)
+    if is_overload_error(exc.detail):
+        return await overload_handler(request, exc.detail)
+    return await http_exception_handler(request, exc)
+
+
+def install_overload_handlers(app) -> None:
+    """503 + Retry-After instead of 500 when the DB pool or the request deadline is exhausted"""
+    app.add_exception_handler(PoolTimeoutError, overload_handler)
+    app.add_exception_handler(StarletteHTTPException, http_overload_handler)
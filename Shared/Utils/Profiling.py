@@ -0,0 +1,143 @@
+import asyncio
+import hmac
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+
+from pyinstrument import Profiler
+from pyinstrument.renderers import SpeedscopeRenderer
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+@dataclass(slots=True)
+class RequestTimings:
+    """wall time of a profiled request spent in DB queries and in response serialization"""
+    db: float = 0.0
+    queries: int = 0
+    serialize: float = 0.0
+
+
+# set only for profiled requests, everything below is a no-op otherwise
+request_timings: ContextVar[RequestTimings | None] = ContextVar("request_timings", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if request_timings.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = request_timings.get()
+    started = conn.info.get("query_started")
+    if timings is not None and started:
+        timings.db += time.perf_counter() - started.pop()
+        timings.queries += 1
+
+
+@contextmanager
+def serialization_timer():
+    timings = request_timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.serialize += time.perf_counter() - started
+
+
+class ProfilingMiddleware:
+    """
+        Pure ASGI middleware: requests with `X-Profile: <token>` or a `sample_rate` share of all
+        requests run under the pyinstrument sampling profiler.
+        Profiled responses carry a Server-Timing header (db / serialize / app / total);
+        the header request gets the speedscope profile instead of its response,
+        sampled ones are saved to `directory` as <ms>-<method>-<path>.speedscope.json
+    """
+
+    header = b"x-profile"
+
+    def __init__(self, app, token: str | None = None, sample_rate: float = 0.0,
+                 directory: str = "profiles", interval: float = 0.001):
+        self.app = app
+        self.token = token.encode() if token else None
+        self.sample_rate = sample_rate
+        self.directory = Path(directory)
+        self.interval = interval
+
+        if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+    def _requested(self, scope) -> bool:
+        if self.token is None:
+            return False
+        value = dict(scope["headers"]).get(self.header)
+        return value is not None and hmac.compare_digest(value, self.token)
+
+
+    @staticmethod
+    def server_timing(timings: RequestTimings, total: float) -> bytes:
+        app = max(0.0, total - timings.db - timings.serialize)
+        return (f'db;dur={timings.db * 1000:.1f};desc="{timings.queries} queries", '
+                f'serialize;dur={timings.serialize * 1000:.1f}, app;dur={app * 1000:.1f}, '
+                f'total;dur={total * 1000:.1f}').encode()
+
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        inline = self._requested(scope)
+        if not inline and not (self.sample_rate and random.random() < self.sample_rate):
+            return await self.app(scope, receive, send)
+
+        timings = RequestTimings()
+        timings_token = request_timings.set(timings)
+        profiler = Profiler(interval=self.interval, async_mode="enabled")
+        started = time.perf_counter()
+
+        async def send_timed(message):
+            if message["type"] == "http.response.start":
+                headers = [*message.get("headers", []),
+                           (b"server-timing", self.server_timing(timings, time.perf_counter() - started))]
+                message = {**message, "headers": headers}
+            if not inline:
+                await send(message)
+
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            profiler.stop()
+            request_timings.reset(timings_token)
+
+        total = time.perf_counter() - started
+        profile = profiler.output(SpeedscopeRenderer()).encode()
+        logging.info(f"Profiled {scope['method']} {scope['path']}: {self.server_timing(timings, total).decode()}")
+
+        if inline:
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": [(b"content-type", b"application/json"),
+                                    (b"server-timing", self.server_timing(timings, total))]})
+            await send({"type": "http.response.body", "body": profile})
+            return
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name = scope["path"].strip("/").replace("/", "_") or "root"
+        path = self.directory / f"{int(time.time() * 1000)}-{scope['method']}-{name}.speedscope.json"
+        await asyncio.to_thread(path.write_bytes, profile)
+
+
+def install_profiling(app, token: str | None, sample_rate: float, directory: str, interval: float) -> None:
+    """adds ProfilingMiddleware only when profiling is configured, zero overhead otherwise"""
+    if token or sample_rate:
+        app.add_middleware(ProfilingMiddleware, token=token, sample_rate=sample_rate,
+                           directory=directory, interval=interval)
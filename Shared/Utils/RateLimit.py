@@ -0,0 +1,132 @@
+import math
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException, Request
+
+from Shared.Auth.tokens import token_verifier, InvalidTokenError
+from Shared.Base.Settings import Settings
+
+
+class MemoryTokenBuckets:
+    """
+        In-process token buckets (one set per worker), least recently used keys are dropped
+        past max_keys - a dropped bucket simply starts full again
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+
+    async def take(self, key: str, capacity: int, rate: float) -> float:
+        """take one token; 0 if allowed, otherwise seconds until a token is available"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class RedisTokenBuckets:
+    """
+        Buckets shared by all workers, needs the optional `redis` package.
+        Refill and take are one Lua script, so concurrent workers can not overspend a bucket
+    """
+
+    SCRIPT = """
+        local capacity = tonumber(ARGV[1])
+        local rate = tonumber(ARGV[2])
+        local now = tonumber(ARGV[3])
+        local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+        local tokens = tonumber(bucket[1]) or capacity
+        local updated = tonumber(bucket[2]) or now
+        tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+        local wait = 0
+        if tokens >= 1 then
+            tokens = tokens - 1
+        else
+            wait = (1 - tokens) / rate
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+        redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+        return tostring(wait)
+    """
+
+    def __init__(self, url: str, prefix: str = "rate_limit:"):
+        try:
+            from redis import asyncio as redis
+        except ImportError:
+            raise RuntimeError("RedisTokenBuckets requires the `redis` package")
+
+        self.prefix = prefix
+        self._redis = redis.from_url(url)
+        self._take = self._redis.register_script(self.SCRIPT)
+
+
+    async def take(self, key: str, capacity: int, rate: float) -> float:
+        wait = await self._take(keys=[self.prefix + key], args=[capacity, rate, time.time()])
+        return float(wait)
+
+
+def create_token_buckets(backend: str, url: str | None = None):
+    if backend == "redis":
+        return RedisTokenBuckets(url)
+    return MemoryTokenBuckets()
+
+
+token_buckets = create_token_buckets(Settings.rate_limit.backend, Settings.rate_limit.url)
+
+
+def request_user_id(request: Request) -> str | None:
+    """
+        user id from the bearer token, the same claim get_me trusts; verification is CPU only
+        (and cached, get_me then reuses it), so the limit is checked before any DB session is used
+    """
+    authorization = request.headers.get("Authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        payload = token_verifier.verify(token)
+    except InvalidTokenError:
+        return None
+    return payload.get("user_id")
+
+
+class RateLimit:
+    """
+        Route dependency: token bucket of `per_minute` requests (also the burst size)
+        per authenticated user, or per client IP with by_ip / without a valid token.
+        Over the limit -> 429 with Retry-After. per_minute=0 turns the limit off
+    """
+
+    def __init__(self, scope: str, per_minute: int, by_ip: bool = False):
+        self.scope = scope
+        self.per_minute = per_minute
+        self.by_ip = by_ip
+
+
+    async def __call__(self, request: Request) -> None:
+        if not self.per_minute:
+            return
+
+        user_id = None if self.by_ip else request_user_id(request)
+        if user_id is not None:
+            identity = f"user:{user_id}"
+        else:
+            identity = f"ip:{request.client.host if request.client else 'unknown'}"
+
+        wait = await token_buckets.take(f"{self.scope}:{identity}", self.per_minute, self.per_minute / 60)
+        if wait:
+            raise HTTPException(status_code=429, detail="Too many requests",
+                                headers={"Retry-After": str(math.ceil(wait))})
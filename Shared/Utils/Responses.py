@@ -0,0 +1,124 @@
+from datetime import date, datetime, time
+from enum import Enum
+from typing import Any
+
+import msgpack
+from fastapi.responses import ORJSONResponse as BaseORJSONResponse
+from pydantic import TypeAdapter
+from starlette.requests import ClientDisconnect
+from starlette.responses import Response, StreamingResponse
+
+from Shared.Utils.Profiling import serialization_timer
+
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+
+class ORJSONResponse(BaseORJSONResponse):
+    """fastapi ORJSONResponse, render time is reported to the profiler"""
+
+    def render(self, content: Any) -> bytes:
+        with serialization_timer():
+            return super().render(content)
+
+
+class AdapterJSONResponse(Response):
+    """
+        JSON response serialized in one pass by a prebuilt (compiled) pydantic-core serializer,
+        skips FastAPI response_model validation and jsonable_encoder
+    """
+    media_type = "application/json"
+
+    def __init__(self, content: Any, adapter: TypeAdapter, **kwargs):
+        self.adapter = adapter
+        super().__init__(content, **kwargs)
+
+
+    def render(self, content: Any) -> bytes:
+        with serialization_timer():
+            return self.adapter.dump_json(content)
+
+
+def _msgpack_default(value):
+    """the values orjson encodes natively, encoded the same way"""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not MessagePack serializable")
+
+
+class MsgPackResponse(Response):
+    """
+        MessagePack body of exactly what the JSON response would carry: with an `adapter`
+        the content is dumped through it in JSON mode first (same field names and values,
+        datetimes as ISO strings), plain content is encoded like ORJSONResponse does
+    """
+    media_type = "application/msgpack"
+
+    def __init__(self, content: Any, adapter: TypeAdapter | None = None, **kwargs):
+        self.adapter = adapter
+        super().__init__(content, **kwargs)
+
+
+    def render(self, content: Any) -> bytes:
+        with serialization_timer():
+            if self.adapter is not None:
+                content = self.adapter.dump_python(content, mode="json")
+            return msgpack.packb(content, default=_msgpack_default)
+
+
+def prefers_msgpack(accept: str | None) -> bool:
+    """
+        the Accept header ranks MessagePack at least as high as JSON (ties go to MessagePack,
+        the client asked for it by name); JSON stays the default
+    """
+    if not accept:
+        return False
+
+    quality = {}
+    for media_range in accept.lower().split(","):
+        media_type, *params = (part.strip() for part in media_range.split(";"))
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        quality[media_type] = max(q, quality.get(media_type, 0.0))
+
+    msgpack_q = max(quality.get(media_type, 0.0) for media_type in MSGPACK_MEDIA_TYPES)
+    json_q = quality.get("application/json", quality.get("application/*", quality.get("*/*", 0.0)))
+    return msgpack_q > 0 and msgpack_q >= json_q
+
+
+def negotiated_response(content: Any, adapter: TypeAdapter | None = None, accept: str | None = None,
+                        headers: dict | None = None) -> Response:
+    """
+        MsgPackResponse when the Accept header prefers it, otherwise AdapterJSONResponse
+        (with an adapter) or ORJSONResponse; the response varies by Accept
+    """
+    headers = {**(headers or {}), "Vary": "Accept"}
+    if prefers_msgpack(accept):
+        return MsgPackResponse(content, adapter, headers=headers)
+    if adapter is not None:
+        return AdapterJSONResponse(content, adapter, headers=headers)
+    return ORJSONResponse(content, headers=headers)
+
+
+class UploadStreamingResponse(StreamingResponse):
+    """
+        StreamingResponse whose body generator still reads the request body (a streamed upload).
+        Starlette's own disconnect listener would consume the body messages, so it is not run;
+        a disconnect cancels the handler in DeadlineMiddleware
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect()
+        if self.background is not None:
+            await self.background()
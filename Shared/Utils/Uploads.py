@@ -0,0 +1,137 @@
+import codecs
+import csv
+from typing import AsyncIterator, Iterator
+
+import orjson
+
+
+# longest line kept in memory, a longer one aborts the upload
+MAX_RECORD_SIZE = 1 << 20
+# most lines a quoted CSV value may span, past that (or MAX_RECORD_SIZE) the open quote is a bad row
+MAX_RECORD_LINES = 1000
+
+
+class UploadError(ValueError):
+    """the upload as a whole can not be read any further (encoding, oversized line, bad header row)"""
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_size: int = MAX_RECORD_SIZE) -> AsyncIterator[str]:
+    """lines of a streamed UTF-8 body; only the current partial line is buffered"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    try:
+        async for chunk in chunks:
+            buffer += decoder.decode(chunk)
+            *lines, buffer = buffer.split("\n")
+            for line in lines:
+                yield line.removesuffix("\r")
+            if len(buffer) > max_size:
+                raise UploadError(f"Line longer than {max_size} characters")
+        buffer += decoder.decode(b"", final=True)
+    except UnicodeDecodeError as e:
+        raise UploadError(f"Upload is not valid UTF-8: {e}")
+    if buffer:
+        yield buffer.removesuffix("\r")
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, dict | None, str | None]]:
+    """(row number, object, None) per line of newline-delimited JSON, (row number, None, error) for bad lines"""
+    number = 0
+    async for line in iter_lines(chunks):
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            record = orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            yield number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield number, None, "Expected a JSON object"
+            continue
+        yield number, record, None
+
+
+def _ends_in_quotes(line: str, quoted: bool) -> bool:
+    """
+        whether a quoted value is still open at the end of the line, as csv.reader reads it:
+        only a quote at the start of a value opens one, a quote inside an unquoted value is literal
+    """
+    if '"' not in line:
+        return quoted
+    at_start, after_quote = not quoted, False
+    for char in line:
+        if quoted:
+            if char == '"':
+                quoted, after_quote = False, True
+        elif char == '"' and (at_start or after_quote):
+            # a value's opening quote, or the second one of an escaped "" inside it
+            quoted = True
+        elif char == ",":
+            at_start = True
+            continue
+        at_start = False
+        if char != '"':
+            after_quote = False
+    return quoted
+
+
+def _take_records(pending: list[str], max_size: int, max_lines: int,
+                  final: bool) -> Iterator[tuple[str | None, str | None]]:
+    """
+        (record, None) per complete CSV record at the head of the pending lines, taken out of them.
+        A quoted value still open after max_lines lines / max_size characters (or at the end of the upload)
+        is reported as (None, error) for its first line only, the lines after it are read as records again
+    """
+    while pending:
+        quoted = False
+        for end, line in enumerate(pending, 1):
+            quoted = _ends_in_quotes(line, quoted)
+            if not quoted:
+                break
+        else:
+            # a quoted value goes on on the next line
+            if not final and len(pending) < max_lines and sum(map(len, pending)) <= max_size:
+                return
+            del pending[0]
+            yield None, "Unterminated quoted value"
+            continue
+        record = "\n".join(pending[:end])
+        del pending[:end]
+        yield record, None
+
+
+async def iter_csv(chunks: AsyncIterator[bytes], max_size: int = MAX_RECORD_SIZE,
+                   max_lines: int = MAX_RECORD_LINES) -> AsyncIterator[tuple[int, dict | None, str | None]]:
+    """
+        (row number, {column: value}, None) per CSV record after the header row,
+        (row number, None, error) for bad records. Empty values are left out (model defaults apply);
+        quoted values may span up to max_lines lines
+    """
+    header = None
+    number = 0
+    pending = []
+    lines = iter_lines(chunks, max_size)
+    while True:
+        line = await anext(lines, None)
+        if line is not None:
+            pending.append(line)
+        for record, error in _take_records(pending, max_size, max_lines, final=line is None):
+            if error is None and not record.strip():
+                continue
+            if header is None:
+                if error is not None:
+                    raise UploadError(f"Header row: {error}")
+                header = [name.strip() for name in next(csv.reader([record]))]
+                continue
+            number += 1
+            if error is not None:
+                yield number, None, error
+                continue
+            values = next(csv.reader([record]))
+            if len(values) != len(header):
+                yield number, None, f"Expected {len(header)} columns, got {len(values)}"
+                continue
+            yield number, {name: value for name, value in zip(header, values) if value != ""}, None
+        if line is None:
+            return
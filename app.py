@@ -1,17 +1,59 @@
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 
 import uvicorn
 from fastapi import APIRouter, FastAPI
 
+from Services.Tasks.archive import TasksArchiver
+from Services.Tasks.batch_router import batch_router
+from Services.Tasks.repository import tasks_partitions, task_history, task_history_partitions
 from Services.Tasks.router import tasks_router
+from Services.Tasks.stats import TaskCountersRepair
 from Services.Users.auth_router import auth_router
 from Services.Users.router import users_router
+from Shared.Base.Settings import Settings
+from Shared.Database.Sessions import AsyncDatabase
+from Shared.Utils.Deadlines import DeadlineMiddleware, install_overload_handlers
+from Shared.Utils.Profiling import install_profiling
+from Shared.Utils.Responses import ORJSONResponse
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
 
-app = FastAPI(docs_url='/api/docs')
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # shard databases are maintained like the main one, their tasks tables are not partitioned (no-op)
+    background = [asyncio.create_task(tasks_partitions.run_forever(database, Settings.partitions.check_interval))
+                  for database in AsyncDatabase.shards or [AsyncDatabase]]
+    # task history is kept on the main database only
+    background.append(asyncio.create_task(
+        task_history_partitions.run_forever(AsyncDatabase, Settings.partitions.check_interval)))
+    background.append(asyncio.create_task(task_history.run_forever(AsyncDatabase, Settings.history.flush_interval)))
+    if Settings.archive.older_than_days:
+        archiver = TasksArchiver(Settings.archive.older_than_days, Settings.archive.batch_size)
+        background.append(asyncio.create_task(archiver.run_forever(AsyncDatabase, Settings.archive.interval)))
+    if Settings.stats.repair_interval:
+        repair = TaskCountersRepair(Settings.stats.repair_batch_size)
+        background.append(asyncio.create_task(repair.run_forever(AsyncDatabase, Settings.stats.repair_interval)))
+    yield
+    for task in background:
+        task.cancel()
+    try:
+        await task_history.flush_database(AsyncDatabase)
+    except Exception as e:
+        logging.error(f"Final history flush failed: {e}")
+
+
+app = FastAPI(docs_url='/api/docs', default_response_class=ORJSONResponse, lifespan=lifespan)
+# profiling goes inside the deadline middleware, it runs in the handler task
+install_profiling(app, Settings.profiling.token, Settings.profiling.sample_rate, Settings.profiling.directory,
+                  Settings.profiling.interval)
+# a bulk import runs as long as the upload does, chunks have no deadline unless configured
+app.add_middleware(DeadlineMiddleware, default=Settings.deadlines.default,
+                   routes={"/api/v1/tasks/tasks/import": 0, **Settings.deadlines.routes})
+install_overload_handlers(app)
 
 # Routers
 router = APIRouter()
@@ -21,6 +63,8 @@ router.include_router(users_router, tags=['Users | users'], prefix='/users')
 router.include_router(tasks_router, tags=['Tasks | tasks'], prefix='/tasks')
 # Auth
 router.include_router(auth_router, tags=['Auth | auth'], prefix='/auth')
+# Batch
+router.include_router(batch_router, tags=['Batch | batch'])
 
 
 app.include_router(router, prefix='/api/v1')
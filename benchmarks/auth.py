@@ -0,0 +1,64 @@
+"""
+    Per-request CPU cost of bearer token verification in get_me (the user lookup is unchanged and excluded):
+    python-jose decode + manual exp re-check as before, against TokenVerifier with each backend,
+    with and without the verified-token cache.
+
+    CPU only, no database needed.
+    run: python -m benchmarks.auth [requests] [users]
+"""
+import asyncio
+import sys
+import time
+from datetime import datetime
+
+from jose import jwt
+
+from Shared.Auth.auth import create_access_token
+from Shared.Auth.tokens import TokenVerifier, JoseJWTBackend, HmacJWTBackend
+from Shared.Base.Settings import Settings
+
+
+def verify_before(token: str) -> dict:
+    """get_me token handling before the verifier"""
+    payload = jwt.decode(token=token, key=Settings.auth.secret_key, algorithms=[Settings.auth.algorithm])
+    if payload.get("exp") and payload["exp"] < datetime.timestamp(datetime.utcnow()):
+        raise ValueError("Token expired")
+    return payload
+
+
+def measure(verify, tokens: list[str], requests: int, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for i in range(requests):
+            verify(tokens[i % len(tokens)])
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+async def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    # one live access token per user, every user makes requests / users requests
+    tokens = [await create_access_token({"user_id": user_id}) for user_id in range(1, users + 1)]
+
+    secret_key, algorithm = Settings.auth.secret_key, Settings.auth.algorithm
+    variants = {
+        "before: jose + exp re-check": verify_before,
+        "jose, no cache": TokenVerifier(JoseJWTBackend(secret_key, algorithm), max_size=0).verify,
+        "hmac, no cache": TokenVerifier(HmacJWTBackend(secret_key, algorithm), max_size=0).verify,
+        "jose + cache": TokenVerifier(JoseJWTBackend(secret_key, algorithm), max_size=users).verify,
+        "hmac + cache": TokenVerifier(HmacJWTBackend(secret_key, algorithm), max_size=users).verify,
+    }
+    assert len({str(verify(tokens[0])) for verify in variants.values()}) == 1
+
+    before = None
+    print(f"requests: {requests}, users: {users}")
+    for name, verify in variants.items():
+        elapsed = measure(verify, tokens, requests)
+        before = before or elapsed
+        print(f"{name}: {elapsed * 1e6 / requests:.2f} us/request (x{before / elapsed:.1f})")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,56 @@
+"""
+    Encode / decode cost and size of a task list body: JSON (compiled pydantic-core serializer,
+    orjson on the client) against MessagePack of the same JSON-mode data (Accept: application/msgpack).
+
+    CPU only, no database needed, needs the optional msgpack package.
+    run: python -m benchmarks.msgpack [rows]
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+
+import msgpack
+import orjson
+
+from Services.Tasks.schema import TaskRow, TaskStatus, TaskPriority, TaskRowsAdapter
+from Shared.Utils.Responses import MsgPackResponse, AdapterJSONResponse
+
+
+def make_rows(count: int) -> list[TaskRow]:
+    now = datetime.utcnow()
+    return [TaskRow(i, "customer", f"task {i}", "description " * 5, TaskStatus.PENDING,
+                    TaskPriority(i % 5 + 1), i % 100, now - timedelta(seconds=i), now)
+            for i in range(1, count + 1)]
+
+
+def measure(call, repeat: int = 20) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    rows = make_rows(count)
+
+    as_json = AdapterJSONResponse(rows, TaskRowsAdapter).body
+    packed = MsgPackResponse(rows, TaskRowsAdapter).body
+    assert msgpack.unpackb(packed) == orjson.loads(as_json)
+
+    print(f"rows: {count}")
+    print(f"size: json {len(as_json)} B, msgpack {len(packed)} B ({len(packed) / len(as_json):.0%})")
+    timings = {
+        "encode json": lambda: TaskRowsAdapter.dump_json(rows),
+        "encode msgpack": lambda: MsgPackResponse(rows, TaskRowsAdapter).body,
+        "decode json (orjson)": lambda: orjson.loads(as_json),
+        "decode msgpack": lambda: msgpack.unpackb(packed),
+    }
+    for name, call in timings.items():
+        print(f"{name}: {measure(call) * 1e3:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+    Per-row CPU cost of the task list read path: ORM instances + jsonable_encoder
+    against Core column select + TaskRow + orjson / compiled pydantic-core serializer.
+
+    Runs against the test database (db_name_test), tables are recreated.
+    run: python -m benchmarks.read_path [rows]
+"""
+import asyncio
+import sys
+import time
+from datetime import datetime
+
+import orjson
+import sqlalchemy.engine.url as SQURL
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select, insert
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+
+from Services.Tasks.model import Task
+from Services.Tasks.repository import TasksRepository
+from Services.Tasks.schema import TaskRow, TaskStatus, TaskPriority, TaskRowsAdapter
+from Services.Users.model import User
+from Shared.Base.BaseModel import Base
+from Shared.Base.Settings import Settings
+
+
+BENCH_DATABASE_URL = SQURL.URL.create(
+    drivername="postgresql+asyncpg",
+    username=Settings.database.user,
+    password=Settings.database.password,
+    host=Settings.database.host,
+    port=Settings.database.port,
+    database=Settings.database.database + '_test',
+)
+
+
+async def seed(session: AsyncSession, rows: int):
+    user = User(name="bench", email="bench@example.com", password="x")
+    session.add(user)
+    await session.flush()
+    now = datetime.utcnow()
+    await session.execute(insert(Task), [
+        {"customer_name": "bench", "title": f"task {i}", "description": "description " * 20,
+         "status": TaskStatus.PENDING, "priority": TaskPriority.MEDIUM, "user_id": user.id,
+         "created_at": now, "updated_at": now}
+        for i in range(rows)
+    ])
+    await session.commit()
+
+
+async def run_orm(session: AsyncSession):
+    session.expunge_all()
+    tasks = (await session.execute(select(Task))).scalars().all()
+    return orjson.dumps(jsonable_encoder(tasks))
+
+
+async def run_core(session: AsyncSession):
+    repository = TasksRepository(session)
+    rows = await repository._fetch_rows(repository._select())
+    return orjson.dumps(rows)
+
+
+async def run_core_adapter(session: AsyncSession):
+    repository = TasksRepository(session)
+    rows = await repository._fetch_rows(repository._select())
+    return TaskRowsAdapter.dump_json(rows)
+
+
+async def measure(func, session: AsyncSession, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await func(session)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+async def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    engine = create_async_engine(BENCH_DATABASE_URL)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        await seed(session, rows)
+        assert len(orjson.loads(await run_orm(session))) == len(orjson.loads(await run_core(session))) == rows
+
+        orm = await measure(run_orm, session)
+        core = await measure(run_core, session)
+        core_adapter = await measure(run_core_adapter, session)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await engine.dispose()
+
+    print(f"rows: {rows}")
+    print(f"orm + jsonable_encoder: {orm * 1e6 / rows:.2f} us/row")
+    print(f"core + TaskRow + orjson: {core * 1e6 / rows:.2f} us/row")
+    print(f"core + TaskRow + pydantic-core: {core_adapter * 1e6 / rows:.2f} us/row")
+    print(f"speedup: x{orm / core:.1f} / x{orm / core_adapter:.1f}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,41 @@
+"""tasks_priority_smallint
+
+Revision ID: 0f329c4a0000
+Revises: a41e84768d90
+Create Date: 2026-10-19 16:02:13.885104
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0f329c4a0000'
+down_revision: Union[str, None] = 'a41e84768d90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+PRIORITIES = ('LOWEST', 'LOW', 'MEDIUM', 'HIGH', 'HIGHEST')
+TABLES = ('tasks', 'tasks_archive')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # enum labels are declared in TaskPriority order, so the label position is the numeric value
+    for table in TABLES:
+        op.execute(f"ALTER TABLE {table} ALTER COLUMN priority TYPE smallint "
+                   f"USING array_position(enum_range(NULL::taskpriority), priority)::smallint")
+    op.execute("DROP TYPE taskpriority")
+    op.create_index('ix_tasks_priority_id', 'tasks', ['priority', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tasks_priority_id', table_name='tasks')
+    sa.Enum(*PRIORITIES, name='taskpriority').create(op.get_bind())
+    for table in TABLES:
+        op.execute(f"ALTER TABLE {table} ALTER COLUMN priority TYPE taskpriority "
+                   f"USING (enum_range(NULL::taskpriority))[priority]")
@@ -0,0 +1,46 @@
+"""tasks_change_seq_and_tombstones
+
+Revision ID: 1e021fd743d4
+Revises: 7d415d29fde6
+Create Date: 2026-10-19 13:05:52.402817
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1e021fd743d4'
+down_revision: Union[str, None] = '7d415d29fde6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(sa.schema.CreateSequence(sa.Sequence('tasks_change_seq')))
+    op.add_column('tasks', sa.Column('change_seq', sa.BigInteger(), nullable=False,
+                                     server_default=sa.text("nextval('tasks_change_seq')")))
+    op.create_index(op.f('ix_tasks_change_seq'), 'tasks', ['change_seq'], unique=False)
+    op.create_table('task_tombstones',
+    sa.Column('record_id', sa.Integer(), nullable=False),
+    sa.Column('change_seq', sa.BigInteger(), nullable=False),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_task_tombstones_change_seq'), 'task_tombstones', ['change_seq'], unique=False)
+    op.create_index(op.f('ix_task_tombstones_id'), 'task_tombstones', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_task_tombstones_id'), table_name='task_tombstones')
+    op.drop_index(op.f('ix_task_tombstones_change_seq'), table_name='task_tombstones')
+    op.drop_table('task_tombstones')
+    op.drop_index(op.f('ix_tasks_change_seq'), table_name='tasks')
+    op.drop_column('tasks', 'change_seq')
+    op.execute(sa.schema.DropSequence(sa.Sequence('tasks_change_seq')))
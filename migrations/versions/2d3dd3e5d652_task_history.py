@@ -0,0 +1,56 @@
+"""task_history
+
+Revision ID: 2d3dd3e5d652
+Revises: f2a65669d68f
+Create Date: 2026-10-19 19:02:41.318207
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from Shared.Database.Partitions import month_start, create_partition_sql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2d3dd3e5d652'
+down_revision: Union[str, None] = 'f2a65669d68f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+MONTHS_AHEAD = 3
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # the partition key has to be part of the primary key
+    op.create_table('task_history',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('task_id', sa.Integer(), nullable=False),
+    sa.Column('field', sa.String(), nullable=False),
+    sa.Column('old_value', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    sa.Column('new_value', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    sa.Column('changed_at', sa.DateTime(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id', 'changed_at'),
+    postgresql_partition_by='RANGE (changed_at)'
+    )
+    op.create_index('ix_task_history_task_id_changed_at', 'task_history', ['task_id', 'changed_at'], unique=False)
+
+    today = datetime.utcnow().date()
+    month = month_start(today)
+    while month <= month_start(today, MONTHS_AHEAD):
+        op.execute(create_partition_sql('task_history', month))
+        month = month_start(month, 1)
+    op.execute("CREATE TABLE task_history_default PARTITION OF task_history DEFAULT")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_task_history_task_id_changed_at', table_name='task_history')
+    op.execute("DROP TABLE task_history CASCADE")
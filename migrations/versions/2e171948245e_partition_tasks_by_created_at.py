@@ -0,0 +1,82 @@
+"""partition_tasks_by_created_at
+
+Revision ID: 2e171948245e
+Revises: 1e021fd743d4
+Create Date: 2026-10-19 14:11:37.028419
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from Shared.Database.Partitions import month_start, create_partition_sql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2e171948245e'
+down_revision: Union[str, None] = '1e021fd743d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+MONTHS_AHEAD = 3
+
+
+def create_indexes() -> None:
+    op.create_index(op.f('ix_tasks_id'), 'tasks', ['id'], unique=False)
+    op.create_index(op.f('ix_tasks_user_id'), 'tasks', ['user_id'], unique=False)
+    op.create_index(op.f('ix_tasks_change_seq'), 'tasks', ['change_seq'], unique=False)
+    op.create_index('ix_tasks_status_priority_created_at', 'tasks', ['status', 'priority', 'created_at'],
+                    unique=False, postgresql_include=['updated_at'])
+
+
+def drop_indexes(table: str) -> None:
+    op.drop_index('ix_tasks_status_priority_created_at', table_name=table)
+    op.drop_index(op.f('ix_tasks_change_seq'), table_name=table)
+    op.drop_index(op.f('ix_tasks_user_id'), table_name=table)
+    op.drop_index(op.f('ix_tasks_id'), table_name=table)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.rename_table('tasks', 'tasks_unpartitioned')
+    op.execute("ALTER TABLE tasks_unpartitioned RENAME CONSTRAINT tasks_pkey TO tasks_unpartitioned_pkey")
+    drop_indexes('tasks_unpartitioned')
+    op.execute("ALTER SEQUENCE tasks_id_seq OWNED BY NONE")
+
+    # the partition key has to be part of the primary key
+    op.execute("CREATE TABLE tasks (LIKE tasks_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)")
+    op.create_primary_key('tasks_pkey', 'tasks', ['id', 'created_at'])
+    op.execute("ALTER SEQUENCE tasks_id_seq OWNED BY tasks.id")
+    op.create_foreign_key('tasks_user_id_fkey', 'tasks', 'users', ['user_id'], ['id'], ondelete='CASCADE')
+
+    first = op.get_bind().execute(sa.text("SELECT min(created_at) FROM tasks_unpartitioned")).scalar()
+    today = datetime.utcnow().date()
+    month = month_start(first.date() if first else today)
+    while month <= month_start(today, MONTHS_AHEAD):
+        op.execute(create_partition_sql('tasks', month))
+        month = month_start(month, 1)
+    op.execute("CREATE TABLE tasks_default PARTITION OF tasks DEFAULT")
+
+    op.execute("INSERT INTO tasks SELECT * FROM tasks_unpartitioned")
+    op.drop_table('tasks_unpartitioned')
+    create_indexes()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.rename_table('tasks', 'tasks_partitioned')
+    op.execute("ALTER TABLE tasks_partitioned RENAME CONSTRAINT tasks_pkey TO tasks_partitioned_pkey")
+    drop_indexes('tasks_partitioned')
+    op.execute("ALTER SEQUENCE tasks_id_seq OWNED BY NONE")
+
+    op.execute("CREATE TABLE tasks (LIKE tasks_partitioned INCLUDING DEFAULTS)")
+    op.create_primary_key('tasks_pkey', 'tasks', ['id'])
+    op.execute("ALTER SEQUENCE tasks_id_seq OWNED BY tasks.id")
+    op.create_foreign_key('tasks_user_id_fkey', 'tasks', 'users', ['user_id'], ['id'], ondelete='CASCADE')
+
+    op.execute("INSERT INTO tasks SELECT * FROM tasks_partitioned")
+    op.execute("DROP TABLE tasks_partitioned CASCADE")
+    create_indexes()
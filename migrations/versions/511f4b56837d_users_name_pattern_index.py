@@ -0,0 +1,29 @@
+"""users_name_pattern_index
+
+Revision ID: 511f4b56837d
+Revises: a653a0cb492e
+Create Date: 2026-10-19 10:12:31.514202
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '511f4b56837d'
+down_revision: Union[str, None] = 'a653a0cb492e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_users_name_pattern', 'users', ['name'], unique=False,
+                    postgresql_ops={'name': 'varchar_pattern_ops'})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_name_pattern', table_name='users')
@@ -0,0 +1,28 @@
+"""users_is_admin
+
+Revision ID: 52670308a16b
+Revises: 2d3dd3e5d652
+Create Date: 2026-10-19 20:14:05.517302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '52670308a16b'
+down_revision: Union[str, None] = '2d3dd3e5d652'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('is_admin', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'is_admin')
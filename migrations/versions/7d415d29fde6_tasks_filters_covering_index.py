@@ -0,0 +1,29 @@
+"""tasks_filters_covering_index
+
+Revision ID: 7d415d29fde6
+Revises: c8652e5fa7d6
+Create Date: 2026-10-19 12:24:05.771390
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d415d29fde6'
+down_revision: Union[str, None] = 'c8652e5fa7d6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_tasks_status_priority_created_at', 'tasks', ['status', 'priority', 'created_at'],
+                    unique=False, postgresql_include=['updated_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tasks_status_priority_created_at', table_name='tasks')
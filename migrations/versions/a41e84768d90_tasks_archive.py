@@ -0,0 +1,48 @@
+"""tasks_archive
+
+Revision ID: a41e84768d90
+Revises: 2e171948245e
+Create Date: 2026-10-19 15:20:44.613092
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a41e84768d90'
+down_revision: Union[str, None] = '2e171948245e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('tasks_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('customer_name', sa.String(), nullable=False),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('description', sa.String(), nullable=False),
+    sa.Column('status', postgresql.ENUM(name='taskstatus', create_type=False), nullable=False),
+    sa.Column('priority', postgresql.ENUM(name='taskpriority', create_type=False), nullable=False),
+    sa.Column('change_seq', sa.BigInteger(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_tasks_archive_user_id'), 'tasks_archive', ['user_id'], unique=False)
+    op.create_index('ix_tasks_done_updated_at', 'tasks', ['updated_at'], unique=False,
+                    postgresql_where=sa.text("status = 'DONE'"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tasks_done_updated_at', table_name='tasks')
+    op.drop_index(op.f('ix_tasks_archive_user_id'), table_name='tasks_archive')
+    op.drop_table('tasks_archive')
@@ -0,0 +1,35 @@
+"""tasks_claim_indexes
+
+Revision ID: b3a1f512e87f
+Revises: 52670308a16b
+Create Date: 2026-10-19 21:02:37.184205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3a1f512e87f'
+down_revision: Union[str, None] = '52670308a16b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_index('ix_tasks_pending_priority_id', table_name='tasks')
+    op.create_index('ix_tasks_unclaimed_priority_id', 'tasks', [sa.text('priority DESC'), 'id'], unique=False,
+                    postgresql_where=sa.text("status = 'PENDING' AND claimed_until IS NULL"))
+    op.create_index('ix_tasks_pending_claimed_until', 'tasks', ['claimed_until'], unique=False,
+                    postgresql_where=sa.text("status = 'PENDING' AND claimed_until IS NOT NULL"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tasks_pending_claimed_until', table_name='tasks')
+    op.drop_index('ix_tasks_unclaimed_priority_id', table_name='tasks')
+    op.create_index('ix_tasks_pending_priority_id', 'tasks', [sa.text('priority DESC'), 'id'], unique=False,
+                    postgresql_where=sa.text("status = 'PENDING'"))
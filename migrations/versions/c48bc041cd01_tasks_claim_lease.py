@@ -0,0 +1,38 @@
+"""tasks_claim_lease
+
+Revision ID: c48bc041cd01
+Revises: 82f3fd25442e
+Create Date: 2026-10-19 17:05:51.402316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c48bc041cd01'
+down_revision: Union[str, None] = '82f3fd25442e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TABLES = ('tasks', 'tasks_archive')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in TABLES:
+        op.add_column(table, sa.Column('claimed_by', sa.Integer(), nullable=True))
+        op.add_column(table, sa.Column('claimed_until', sa.DateTime(), nullable=True))
+    op.create_index('ix_tasks_pending_priority_id', 'tasks', [sa.text('priority DESC'), 'id'], unique=False,
+                    postgresql_where=sa.text("status = 'PENDING'"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tasks_pending_priority_id', table_name='tasks')
+    for table in TABLES:
+        op.drop_column(table, 'claimed_until')
+        op.drop_column(table, 'claimed_by')
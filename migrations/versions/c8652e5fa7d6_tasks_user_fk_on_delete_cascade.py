@@ -0,0 +1,32 @@
+"""tasks_user_fk_on_delete_cascade
+
+Revision ID: c8652e5fa7d6
+Revises: 511f4b56837d
+Create Date: 2026-10-19 11:02:47.190533
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8652e5fa7d6'
+down_revision: Union[str, None] = '511f4b56837d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_constraint('tasks_user_id_fkey', 'tasks', type_='foreignkey')
+    op.create_foreign_key('tasks_user_id_fkey', 'tasks', 'users', ['user_id'], ['id'], ondelete='CASCADE')
+    op.create_index(op.f('ix_tasks_user_id'), 'tasks', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_tasks_user_id'), table_name='tasks')
+    op.drop_constraint('tasks_user_id_fkey', 'tasks', type_='foreignkey')
+    op.create_foreign_key('tasks_user_id_fkey', 'tasks', 'users', ['user_id'], ['id'])
@@ -0,0 +1,51 @@
+"""user_task_counters
+
+Revision ID: f2a65669d68f
+Revises: c48bc041cd01
+Create Date: 2026-10-19 17:48:12.640915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2a65669d68f'
+down_revision: Union[str, None] = 'c48bc041cd01'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('user_task_counters',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('status', postgresql.ENUM(name='taskstatus', create_type=False), nullable=False),
+    sa.Column('priority', sa.SmallInteger(), nullable=False),
+    sa.Column('count', sa.BigInteger(), nullable=False),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'status', 'priority', name='uq_user_task_counters_group')
+    )
+    op.create_index(op.f('ix_user_task_counters_id'), 'user_task_counters', ['id'], unique=False)
+    # initial counts; afterwards kept by the writes themselves
+    op.execute("""
+        INSERT INTO user_task_counters (user_id, status, priority, count, created_at, updated_at)
+        SELECT user_id, status, priority, count(*), timezone('UTC', now()), timezone('UTC', now())
+        FROM (SELECT user_id, status, priority FROM tasks
+              UNION ALL
+              SELECT user_id, status, priority FROM tasks_archive) t
+        GROUP BY user_id, status, priority
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_user_task_counters_id'), table_name='user_task_counters')
+    op.drop_table('user_task_counters')
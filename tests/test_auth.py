@@ -1,4 +1,5 @@
 import asyncio
+from datetime import timedelta
 from typing import AsyncGenerator
 
 import pytest
@@ -10,6 +11,10 @@ from starlette import status
 
 from tests.test_db import TEST_DATABASE_URL
 from Services.Users.model import User
+from Shared.Auth.auth import create_access_token
+from Shared.Auth.tokens import (JoseJWTBackend, HmacJWTBackend, TokenVerifier, TokenExpiredError,
+                                InvalidTokenError, token_verifier)
+from Shared.Base.Settings import Settings
 from Shared.Base.BaseModel import Base
 from Shared.Database.Sessions import get_session
 from app import app
@@ -146,4 +151,36 @@ async def test_refresh_token(ac: AsyncClient, create_test_database, cleanup_tabl
     assert "access_token" in data
     assert data["token_type"] == "bearer"
 
-    app.dependency_overrides = {}
\ No newline at end of file
+    app.dependency_overrides = {}
+
+@pytest.mark.asyncio
+async def test_token_verification_cache(ac: AsyncClient, create_test_database, cleanup_tables):
+    """Verified tokens are cached until exp; the hmac backend accepts and rejects what python-jose does"""
+    token = await create_access_token({"user_id": 1})
+    expired = await create_access_token({"user_id": 1}, expires_delta=timedelta(seconds=-1))
+    jose_backend = JoseJWTBackend(Settings.auth.secret_key, Settings.auth.algorithm)
+    hmac_backend = HmacJWTBackend(Settings.auth.secret_key, Settings.auth.algorithm)
+
+    assert hmac_backend.decode(token) == jose_backend.decode(token)
+    for backend in (jose_backend, hmac_backend):
+        with pytest.raises(TokenExpiredError):
+            backend.decode(expired)
+        with pytest.raises(InvalidTokenError):
+            backend.decode(token[:-2] + ("AA" if token[-2:] != "AA" else "BB"))
+        with pytest.raises(InvalidTokenError):
+            backend.decode("not.a.token")
+
+    verifier = TokenVerifier(hmac_backend, max_size=2)
+    assert verifier.verify(token) == verifier.verify(token)
+    assert verifier.stats() == {"hits": 1, "misses": 1, "size": 1}
+    with pytest.raises(TokenExpiredError):
+        verifier.verify(expired)
+    assert verifier.stats()["size"] == 1
+
+    override_dependencies()  # test_refresh_token resets the overrides
+    await register_user(ac, {"name": "tokenuser", "email": "tokenuser@example.com", "password": "password123"})
+    login_data = await login_user(ac, "tokenuser", "password123")
+    hits = token_verifier.stats()["hits"]
+    response = await ac.get("/api/v1/tasks/tasks", headers={"Authorization": f"Bearer {login_data['access_token']}"})
+    assert response.status_code == status.HTTP_200_OK
+    assert token_verifier.stats()["hits"] > hits
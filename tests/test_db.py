@@ -1,15 +1,26 @@
+import asyncio
 import contextlib
+import time
+from datetime import date, datetime, timedelta
 from typing import AsyncIterator
 
 import pytest
 import sqlalchemy.engine.url as SQURL
 from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession, AsyncConnection
 
 from Services.Tasks.model import Task
+from Services.Tasks.repository import ShardedTasksRepository
+from Services.Tasks.shards import init_shards
 from Services.Users.model import User
 from Shared.Base.BaseModel import Base
 from Shared.Base.Settings import Settings
+from Shared.CustomError.custom_error import NotFoundInDBError
+from Shared.Database.Partitions import MonthlyPartitions, month_start, partition_name, create_partition_sql
+from Shared.Database.Sessions import AsyncDBSessions
+from Shared.Database.Shards import shard_of, id_shard
+from Shared.Utils.Deadlines import request_deadline, DeadlineMiddleware, is_overload_error
 
 TEST_DATABASE_URL = SQURL.URL.create(
     drivername="postgresql+asyncpg",
@@ -212,3 +223,229 @@ async def test_update_task(get_test_session):
         assert updated_task.status == "done"
 
 
+
+
+@pytest.mark.asyncio
+async def test_statement_timeout_from_deadline(get_test_session):
+    """
+    A query running inside a request deadline is cancelled by Postgres once the deadline passes.
+    """
+    async with get_test_session as session:
+        await session.commit()
+        token = request_deadline.set(time.monotonic() + 0.1)
+        try:
+            with pytest.raises(DBAPIError) as error:
+                await session.execute(text("SELECT pg_sleep(5)"))
+        finally:
+            request_deadline.reset(token)
+
+        assert is_overload_error(error.value)
+
+
+@pytest.mark.asyncio
+async def test_deadline_middleware():
+    """
+    A handler past its deadline gets cancelled and the client gets 503 with Retry-After;
+    a client disconnect cancels the handler as well.
+    """
+    cancelled = []
+
+    async def slow_app(scope, receive, send):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(scope["path"])
+            raise
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def receive():
+        await asyncio.sleep(10)
+
+    middleware = DeadlineMiddleware(slow_app, default=0, routes={"/slow": 0.1})
+    await middleware({"type": "http", "path": "/slow"}, receive, send)
+    assert sent[0]["status"] == 503
+    assert (b"retry-after", b"1") in sent[0]["headers"]
+
+    async def disconnect():
+        await asyncio.sleep(0.1)
+        return {"type": "http.disconnect"}
+
+    sent.clear()
+    await middleware({"type": "http", "path": "/other"}, disconnect, send)
+    assert sent == []
+    assert cancelled == ["/slow", "/other"]
+
+
+@pytest.mark.asyncio
+async def test_sharded_tasks():
+    """
+    Tasks spread over two databases of the test server by user_id hash: creates and id lookups
+    hit the owning shard, list reads fan out and come back merged in order.
+    """
+    main_name = Settings.database.database + '_test'
+    shard_name = Settings.database.database + '_test_shard1'
+    engine = create_async_engine(TEST_DATABASE_URL, isolation_level="AUTOCOMMIT")
+    async with engine.connect() as conn:
+        exists = await conn.scalar(text("SELECT 1 FROM pg_database WHERE datname = :name"), {"name": shard_name})
+        if not exists:
+            await conn.execute(text(f'CREATE DATABASE "{shard_name}"'))
+    await engine.dispose()
+
+    database = AsyncDBSessions(main_name, shards=[main_name, shard_name])
+    async with database.shards[1].connect() as conn:
+        await conn.execute(text("DROP SCHEMA public CASCADE;"))
+        await conn.execute(text("CREATE SCHEMA public;"))
+    await init_shards(database)
+
+    try:
+        async with database.session() as session:
+            users = [User(name=f"ShardUser{i}", email=f"shard{i}@example.com", password="x") for i in range(8)]
+            session.add_all(users)
+            await session.commit()
+            user_ids = [user.id for user in users]
+
+        started = datetime.utcnow()
+        async with ShardedTasksRepository.open(database.shards) as repository:
+            created = []
+            for i in range(16):
+                task = await repository.create({"customer_name": "Customer", "title": f"sharded {i}",
+                                                "description": "sharded task", "priority": i % 3 + 1,
+                                                "user_id": user_ids[i % len(user_ids)]})
+                created.append(task)
+            assert all(id_shard(task.id, 2) == shard_of(task.user_id, 2) for task in created)
+
+            expected = [0, 0]
+            for task in created:
+                expected[shard_of(task.user_id, 2)] += 1
+            for shard, shard_database in enumerate(database.shards):
+                async with shard_database.session() as session:
+                    count = await session.scalar(text("SELECT count(*) FROM tasks WHERE title LIKE 'sharded%'"))
+                    assert count == expected[shard]
+
+            top = await repository.get_by_filters(started, sort="priority", order="desc", limit=5)
+            ordered = sorted(created, key=lambda task: (task.priority, task.id), reverse=True)
+            assert [row.id for row in top] == [task.id for task in ordered[:5]]
+            sparse = await repository.get_by_filters(started, fields=["id", "title"], sort="priority", limit=5)
+            assert [row["id"] for row in sparse] == [task.id for task in ordered[:5]]
+            assert all(set(row) == {"id", "title"} for row in sparse)
+            version, versioned = await repository.get_versioned_by_filters(started, sort="priority", limit=5)
+            assert [row.id for row in versioned] == [task.id for task in ordered[:5]]
+            assert version == await repository.filters_version(started)
+
+            other = next(task for task in created if shard_of(task.user_id, 2) == 1)
+            task = await repository.id(other.id)
+            await repository.update(task, {"title": "sharded renamed"})
+            assert (await repository.id(other.id)).title == "sharded renamed"
+            await repository.delete(other.id)
+            with pytest.raises(NotFoundInDBError):
+                await repository.id(other.id)
+
+            assert len(await repository.search_tasks("sharded")) == len(created) - 1
+            counts = await repository.facet_counts(["priority"], started)
+            assert counts["total"] == len(created) - 1
+
+            changes = await repository.get_changes(0)
+            synced = sorted(row.id for row in changes.changed if row.title.startswith("sharded"))
+            assert synced == sorted(task.id for task in created if task.id != other.id)
+            assert other.id in changes.deleted
+            cursor = [int(seq) for seq in changes.cursor.split(".")]
+            assert len(cursor) == 2
+            await repository.update(await repository.id(created[0].id), {"title": "sharded synced"})
+            changes = await repository.get_changes(cursor)
+            assert [row.title for row in changes.changed] == ["sharded synced"]
+            assert (await repository.get_changes([int(seq) for seq in changes.cursor.split(".")])).changed == []
+
+            # claim order is global: the highest priority tasks of all shards, not of the first shard tried
+            claimable = []
+            for shard, shard_database in enumerate(database.shards):
+                async with shard_database.session() as session:
+                    rows = await session.execute(text("SELECT id, priority FROM tasks WHERE status = 'PENDING' "
+                                                      "AND claimed_until IS NULL"))
+                    claimable += [(-priority, task_id, shard) for task_id, priority in rows]
+            expected = sorted(claimable)[:6]
+            assert {shard for _, _, shard in expected} == {0, 1}
+            claim = await repository.claim(1, 6, timedelta(minutes=5))
+            assert [task.id for task in claim.tasks] == [task_id for _, task_id, _ in expected]
+            claim = await repository.claim(2, 6, timedelta(minutes=5))
+            assert [task.id for task in claim.tasks] == [task_id for _, task_id, _ in sorted(claimable)[6:12]]
+    finally:
+        await database.close()
+
+
+def test_partition_helpers():
+    assert month_start(date(2026, 11, 17)) == date(2026, 11, 1)
+    assert month_start(date(2026, 11, 17), 2) == date(2027, 1, 1)
+    assert month_start(date(2026, 1, 31), -1) == date(2025, 12, 1)
+    assert month_start(date(2026, 5, 1), -17) == date(2024, 12, 1)
+    assert partition_name("tasks", date(2027, 3, 1)) == "tasks_y2027m03"
+    assert create_partition_sql("tasks", date(2026, 12, 1)) == (
+        "CREATE TABLE IF NOT EXISTS tasks_y2026m12 PARTITION OF tasks "
+        "FOR VALUES FROM ('2026-12-01') TO ('2027-01-01')")
+
+
+@pytest.mark.asyncio
+async def test_monthly_partitions():
+    """
+    Partitions are created ahead, rows that went to the DEFAULT partition while maintenance was behind
+    are moved into their month's new partition, old partitions are detached past the retention.
+    """
+    engine = create_async_engine(TEST_DATABASE_URL)
+    partitions = MonthlyPartitions("partition_probe", months_ahead=2, retention_months=0)
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text("DROP TABLE IF EXISTS partition_probe CASCADE"))
+            await conn.execute(text("CREATE TABLE partition_probe (id int, created_at timestamp NOT NULL, "
+                                    "PRIMARY KEY (id, created_at)) PARTITION BY RANGE (created_at)"))
+            assert await partitions.is_partitioned(conn)
+            assert await partitions.default_partition(conn) is None
+            await conn.execute(text("CREATE TABLE partition_probe_default PARTITION OF partition_probe DEFAULT"))
+            assert await partitions.default_partition(conn) == ("partition_probe_default", "created_at")
+
+            assert await partitions.ensure(conn, date(2026, 11, 20)) == [
+                "partition_probe_y2026m11", "partition_probe_y2026m12", "partition_probe_y2027m01"]
+            assert await partitions.ensure(conn, date(2026, 11, 20)) == []
+
+            # maintenance fell behind: March rows land in the DEFAULT partition
+            await conn.execute(text("INSERT INTO partition_probe VALUES (1, '2027-03-05'), (2, '2027-04-01')"))
+            assert await partitions.ensure(conn, date(2027, 3, 1)) == [
+                "partition_probe_y2027m03", "partition_probe_y2027m04", "partition_probe_y2027m05"]
+            assert await conn.scalar(text("SELECT count(*) FROM partition_probe_default")) == 0
+            assert await conn.scalar(text("SELECT id FROM partition_probe_y2027m03")) == 1
+            assert await conn.scalar(text("SELECT id FROM partition_probe_y2027m04")) == 2
+
+            assert await partitions.detach_expired(conn, date(2027, 3, 1)) == []
+            partitions.retention_months = 2
+            assert await partitions.detach_expired(conn, date(2027, 3, 1)) == [
+                "partition_probe_y2026m11", "partition_probe_y2026m12"]
+            assert set(await partitions.partitions(conn)) == {
+                "partition_probe_y2027m01", "partition_probe_y2027m03",
+                "partition_probe_y2027m04", "partition_probe_y2027m05"}
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text("DROP TABLE IF EXISTS partition_probe, partition_probe_y2026m11, "
+                                    "partition_probe_y2026m12 CASCADE"))
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_partitions_run_forever():
+    """a failed maintenance run is logged, the loop goes on"""
+    calls = []
+
+    class ProbePartitions(MonthlyPartitions):
+        async def maintain(self, database):
+            calls.append(database)
+            if len(calls) == 1:
+                raise RuntimeError("database is down")
+
+    loop = asyncio.create_task(ProbePartitions("partition_probe").run_forever("database", 0))
+    while len(calls) < 3:
+        await asyncio.sleep(0)
+    loop.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await loop
+    assert calls[:3] == ["database"] * 3
@@ -1,18 +1,26 @@
 import asyncio
+import re
 from datetime import datetime, timedelta
 from typing import AsyncGenerator
 
+import msgpack
+import orjson
 import pytest
 from httpx import AsyncClient, ASGITransport
-from sqlalchemy import delete
+from sqlalchemy import delete, select, update
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from starlette import status
 
 from tests.test_db import TEST_DATABASE_URL
-from Services.Tasks.model import Task
+from Services.Tasks.model import Task, ArchivedTask, TaskHistory
+from Services.Tasks.repository import tasks_query_cache, tasks_single_flight, TasksRepository, task_history
+from Services.Tasks.router import search_rate_limit
+from Shared.Utils.Profiling import ProfilingMiddleware
 from Services.Tasks.schema import TaskStatus, TaskPriority
 from Services.Users.model import User
 from Shared.Base.BaseModel import Base
+from Shared.Cache.query_cache import CacheBackend, MemoryCacheBackend
+from Shared.Database.History import HistoryLog
 from Shared.Database.Sessions import get_session
 from app import app
 
@@ -54,8 +62,11 @@ async def cleanup_tables(create_test_database):
     """Очистка таблиц после каждого теста."""
     async with AsyncSession(test_engine) as session:
         await session.execute(delete(Task))
+        await session.execute(delete(ArchivedTask))
         await session.execute(delete(User))
         await session.commit()
+    await tasks_query_cache.clear()
+    task_history.clear()
 
 
 # Выполняем подмену зависимостей
@@ -212,4 +223,580 @@ async def test_search_tasks(ac: AsyncClient,  create_test_database, cleanup_tabl
     assert response.status_code == status.HTTP_200_OK
     data = response.json()
     assert len(data) == 1
-    assert data[0]["title"] == "test"
\ No newline at end of file
+    assert data[0]["title"] == "test"
+
+@pytest.mark.asyncio
+async def test_sparse_fields(ac: AsyncClient, create_test_database, cleanup_tables):
+    authorized_client, login_data = await create_authorized_client(ac, "sparseuser", "password123")
+
+    task_data = {
+        'title': 'test',
+        'description': 'long description',
+        'status': TaskStatus.PENDING,
+        'priority': TaskPriority.HIGH
+    }
+
+    await create_task(authorized_client, task_data)
+
+    response = await authorized_client.get("/api/v1/tasks/tasks?fields=title,status,priority")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert set(data[0]) == {"id", "title", "status", "priority"}
+    assert data[0]["priority"] == TaskPriority.HIGH
+
+    response = await authorized_client.get("/api/v1/tasks/tasks/search?search_term=tes&fields=title")
+    assert response.status_code == status.HTTP_200_OK
+    assert set(response.json()[0]) == {"id", "title"}
+
+    # the sort column orders the rows but is not returned unless requested
+    await create_task(authorized_client, {**task_data, 'title': 'low', 'priority': TaskPriority.LOW})
+    for include_archived in ["false", "true"]:
+        response = await authorized_client.get(f"/api/v1/tasks/tasks?fields=title&sort=priority&order=asc"
+                                               f"&include_archived={include_archived}")
+        assert response.status_code == status.HTTP_200_OK
+        assert [set(task) for task in response.json()] == [{"id", "title"}] * 2
+        assert [task["title"] for task in response.json()] == ["low", "test"]
+
+    response = await authorized_client.get("/api/v1/tasks/tasks?fields=title,password")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.asyncio
+async def test_filters_cache_invalidation(ac: AsyncClient, create_test_database, cleanup_tables):
+    authorized_client, login_data = await create_authorized_client(ac, "cacheuser", "password123")
+
+    task = await create_task(authorized_client, {'title': 'cached', 'description': 'test'})
+
+    response = await authorized_client.get("/api/v1/tasks/tasks?status=pending")
+    assert len(response.json()) == 1
+    stats_before = (await authorized_client.get("/api/v1/tasks/cache/stats")).json()
+
+    response = await authorized_client.get("/api/v1/tasks/tasks?status=pending")
+    assert len(response.json()) == 1
+    stats = (await authorized_client.get("/api/v1/tasks/cache/stats")).json()
+    assert stats["hits"] == stats_before["hits"] + 1
+
+    response = await authorized_client.get("/api/v1/tasks/tasks?status=done")
+    assert response.json() == []
+
+    # moving the task from pending to done must drop both cached lists
+    response = await authorized_client.put(f"/api/v1/tasks/tasks/{task['id']}", json={"status": "done"})
+    assert response.status_code == status.HTTP_200_OK
+
+    response = await authorized_client.get("/api/v1/tasks/tasks?status=pending")
+    assert response.json() == []
+    response = await authorized_client.get("/api/v1/tasks/tasks?status=done")
+    assert [t["id"] for t in response.json()] == [task["id"]]
+
+    # a write invalidates the entries of its own status (and unfiltered ones) only
+    await create_task(authorized_client, {'title': 'other status', 'description': 'test'})
+    stats_before = (await authorized_client.get("/api/v1/tasks/cache/stats")).json()
+    response = await authorized_client.get("/api/v1/tasks/tasks?status=done")
+    assert [t["id"] for t in response.json()] == [task["id"]]
+    stats = (await authorized_client.get("/api/v1/tasks/cache/stats")).json()
+    assert stats["hits"] == stats_before["hits"] + 1
+
+
+@pytest.mark.asyncio
+async def test_cache_fill_races_write(ac: AsyncClient, create_test_database, cleanup_tables):
+    authorized_client, login_data = await create_authorized_client(ac, "raceuser", "password123")
+    task = await create_task(authorized_client, {'title': 'before', 'description': 'test'})
+    filters = {Task.status: TaskStatus.PENDING}
+
+    class RacingRepository(TasksRepository):
+        async def _query_by_filters(self, *args, **kwargs):
+            rows = await super()._query_by_filters(*args, **kwargs)
+            # a write commits (and invalidates) after the query, before the result is cached
+            async with TestingAsyncSessionLocal() as session:
+                await TasksRepository(session).create({"customer_name": "raceuser", "title": "during",
+                                                       "description": "test", "user_id": task["user_id"]})
+            return rows
+
+    async with TestingAsyncSessionLocal() as session:
+        rows = await RacingRepository(session).get_by_filters(filters=filters)
+        assert [row.title for row in rows] == ["before"]
+
+    # the rows read before the write were not served from the cache afterwards
+    async with TestingAsyncSessionLocal() as session:
+        rows = await TasksRepository(session).get_by_filters(filters=filters)
+        assert sorted(row.title for row in rows) == ["before", "during"]
+
+
+def test_cache_backend_is_abstract():
+    class IncompleteBackend(CacheBackend):
+        async def get(self, key):
+            return None
+
+    # a backend missing methods fails when created, not on its first cache call
+    with pytest.raises(TypeError):
+        IncompleteBackend()
+    assert MemoryCacheBackend().max_size == 1024
+
+
+@pytest.mark.asyncio
+async def test_etag_matches_cached_body(ac: AsyncClient, create_test_database, cleanup_tables):
+    authorized_client, login_data = await create_authorized_client(ac, "etagcacheuser", "password123")
+    task = await create_task(authorized_client, {'title': 'cached', 'description': 'test'})
+    first = await authorized_client.get("/api/v1/tasks/tasks")
+
+    # a write the cache does not hear about (e.g. another worker with the memory backend)
+    async with AsyncSession(test_engine) as session:
+        await session.execute(update(Task).where(Task.id == task["id"])
+                              .values(title="renamed", updated_at=datetime.utcnow()))
+        await session.commit()
+
+    # the cached body is served with the ETag it was cached with, never with the newer one
+    response = await authorized_client.get("/api/v1/tasks/tasks")
+    assert response.headers["etag"] == first.headers["etag"]
+    assert response.json() == first.json()
+
+    await tasks_query_cache.clear()
+    response = await authorized_client.get("/api/v1/tasks/tasks", headers={"If-None-Match": first.headers["etag"]})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["etag"] != first.headers["etag"]
+    assert response.json()[0]["title"] == "renamed"
+
+
+@pytest.mark.asyncio
+async def test_conditional_get(ac: AsyncClient, create_test_database, cleanup_tables):
+    authorized_client, login_data = await create_authorized_client(ac, "etaguser", "password123")
+
+    task = await create_task(authorized_client, {'title': 'etag', 'description': 'test'})
+
+    response = await authorized_client.get("/api/v1/tasks/tasks")
+    etag = response.headers["etag"]
+    response = await authorized_client.get("/api/v1/tasks/tasks", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    response = await authorized_client.get("/api/v1/tasks/tasks?status=pending", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+
+    response = await authorized_client.get(f"/api/v1/tasks/tasks/{task['id']}")
+    assert response.json()["title"] == "etag"
+    task_etag = response.headers["etag"]
+    response = await authorized_client.get(f"/api/v1/tasks/tasks/{task['id']}", headers={"If-None-Match": task_etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    await authorized_client.put(f"/api/v1/tasks/tasks/{task['id']}", json={"title": "changed"})
+
+    response = await authorized_client.get("/api/v1/tasks/tasks", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    response = await authorized_client.get(f"/api/v1/tasks/tasks/{task['id']}", headers={"If-None-Match": task_etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["title"] == "changed"
+
+    response = await authorized_client.get("/api/v1/tasks/tasks/100500")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_changes_since_cursor(ac: AsyncClient, create_test_database, cleanup_tables):
+    authorized_client, login_data = await create_authorized_client(ac, "syncuser", "password123")
+
+    first = await create_task(authorized_client, {'title': 'first', 'description': 'test'})
+    second = await create_task(authorized_client, {'title': 'second', 'description': 'test'})
+
+    response = await authorized_client.get("/api/v1/tasks/changes")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert [t["id"] for t in data["changed"]] == [first["id"], second["id"]]
+    assert data["deleted"] == []
+    cursor = data["cursor"]
+
+    response = await authorized_client.get(f"/api/v1/tasks/changes?since={cursor}")
+    assert response.json() == {"changed": [], "deleted": [], "cursor": cursor}
+    response = await authorized_client.get(f"/api/v1/tasks/changes?since={cursor}.{cursor}")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    await authorized_client.put(f"/api/v1/tasks/tasks/{first['id']}", json={"title": "first updated"})
+    response = await authorized_client.delete(f"/api/v1/tasks/tasks/{second['id']}")
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    response = await authorized_client.get(f"/api/v1/tasks/changes?since={cursor}")
+    data = response.json()
+    assert [t["title"] for t in data["changed"]] == ["first updated"]
+    assert data["deleted"] == [second["id"]]
+    assert data["cursor"] > cursor
+
+
+@pytest.mark.asyncio
+async def test_changes_wait_for_open_transaction(ac: AsyncClient, create_test_database, cleanup_tables):
+    authorized_client, login_data = await create_authorized_client(ac, "slowsyncuser", "password123")
+    slow = await create_task(authorized_client, {'title': 'slow', 'description': 'test'})
+    fast = await create_task(authorized_client, {'title': 'fast', 'description': 'test'})
+    cursor = (await authorized_client.get("/api/v1/tasks/changes")).json()["cursor"]
+
+    async with TestingAsyncSessionLocal() as slow_session:
+        repository = TasksRepository(slow_session)
+        async with repository.single_transaction():
+            # draws its change_seq first, commits last
+            await repository.update(await repository.id(slow["id"]), {"title": "slow updated"})
+            await authorized_client.put(f"/api/v1/tasks/tasks/{fast['id']}", json={"title": "fast updated"})
+
+            data = (await authorized_client.get(f"/api/v1/tasks/changes?since={cursor}")).json()
+            assert data == {"changed": [], "deleted": [], "cursor": cursor}
+
+    data = (await authorized_client.get(f"/api/v1/tasks/changes?since={cursor}")).json()
+    assert [t["title"] for t in data["changed"]] == ["slow updated", "fast updated"]
+
+
+@pytest.mark.asyncio
+async def test_archived_tasks(ac: AsyncClient, create_test_database, cleanup_tables):
+    authorized_client, login_data = await create_authorized_client(ac, "archiveuser", "password123")
+
+    done = await create_task(authorized_client, {'title': 'old done', 'description': 'test', 'status': 'done'})
+    await create_task(authorized_client, {'title': 'pending', 'description': 'test'})
+
+    async with TestingAsyncSessionLocal() as session:
+        assert await TasksRepository(session).archive_done(timedelta(0)) == 1
+
+    response = await authorized_client.get("/api/v1/tasks/tasks")
+    assert [t["title"] for t in response.json()] == ["pending"]
+
+    response = await authorized_client.get("/api/v1/tasks/tasks?include_archived=true")
+    assert sorted(t["title"] for t in response.json()) == ["old done", "pending"]
+
+    response = await authorized_client.get("/api/v1/tasks/tasks/search?search_term=old")
+    assert response.json() == []
+    response = await authorized_client.get("/api/v1/tasks/tasks/search?search_term=old&include_archived=true")
+    assert [t["id"] for t in response.json()] == [done["id"]]
+
+    response = await authorized_client.get(f"/api/v1/tasks/tasks/{done['id']}")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["title"] == "old done"
+
+    # archived tasks are read-only
+    response = await authorized_client.put(f"/api/v1/tasks/tasks/{done['id']}", json={"title": "renamed"})
+    assert response.status_code == status.HTTP_409_CONFLICT
+    response = await authorized_client.delete(f"/api/v1/tasks/tasks/{done['id']}")
+    assert response.status_code == status.HTTP_409_CONFLICT
+    response = await authorized_client.put(f"/api/v1/tasks/tasks/{done['id'] + 1000}", json={"title": "renamed"})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_min_priority_and_sort(ac: AsyncClient, create_test_database, cleanup_tables):
+    authorized_client, login_data = await create_authorized_client(ac, "priorityuser", "password123")
+
+    for title, priority in [('low', TaskPriority.LOW), ('highest', TaskPriority.HIGHEST), ('high', TaskPriority.HIGH)]:
+        await create_task(authorized_client, {'title': title, 'description': 'test', 'priority': priority})
+
+    response = await authorized_client.get("/api/v1/tasks/tasks?min_priority=4&sort=priority")
+    assert response.status_code == status.HTTP_200_OK
+    assert [t["title"] for t in response.json()] == ["highest", "high"]
+
+    # cached min_priority list is invalidated by a matching insert
+    await create_task(authorized_client, {'title': 'high2', 'description': 'test', 'priority': TaskPriority.HIGH})
+    response = await authorized_client.get("/api/v1/tasks/tasks?min_priority=4&sort=priority")
+    assert [t["title"] for t in response.json()] == ["highest", "high2", "high"]
+
+    response = await authorized_client.get("/api/v1/tasks/tasks?min_priority=4&sort=priority&fields=title")
+    assert [set(t) for t in response.json()] == [{"id", "title"}] * 3
+
+
+@pytest.mark.asyncio
+async def test_sort_and_limit(ac: AsyncClient, create_test_database, cleanup_tables):
+    authorized_client, login_data = await create_authorized_client(ac, "sortuser", "password123")
+
+    for title in ['first', 'second', 'third']:
+        await create_task(authorized_client, {'title': title, 'description': 'test'})
+
+    response = await authorized_client.get("/api/v1/tasks/tasks?sort=created_at&limit=2")
+    assert [t["title"] for t in response.json()] == ["third", "second"]
+
+    response = await authorized_client.get("/api/v1/tasks/tasks?sort=created_at&order=asc&limit=2")
+    assert [t["title"] for t in response.json()] == ["first", "second"]
+
+    response = await authorized_client.get("/api/v1/tasks/tasks?sort=title")
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.asyncio
+async def test_claim_tasks(ac: AsyncClient, create_test_database, cleanup_tables):
+    authorized_client, login_data = await create_authorized_client(ac, "claimuser", "password123")
+
+    await create_task(authorized_client, {'title': 'low', 'description': 'test', 'priority': TaskPriority.LOW})
+    await create_task(authorized_client, {'title': 'high', 'description': 'test', 'priority': TaskPriority.HIGH})
+    await create_task(authorized_client, {'title': 'medium', 'description': 'test'})
+    await create_task(authorized_client, {'title': 'done', 'description': 'test', 'status': TaskStatus.DONE,
+                                          'priority': TaskPriority.HIGHEST})
+
+    response = await authorized_client.post("/api/v1/tasks/claim?n=2&lease=1")
+    assert response.status_code == status.HTTP_200_OK
+    assert [t["title"] for t in response.json()["tasks"]] == ["high", "medium"]
+
+    # claimed tasks are not handed out twice, done tasks never
+    response = await authorized_client.post("/api/v1/tasks/claim?n=5")
+    assert [t["title"] for t in response.json()["tasks"]] == ["low"]
+    response = await authorized_client.post("/api/v1/tasks/claim?n=5")
+    assert response.json()["tasks"] == []
+
+    # expired lease returns the task to the queue
+    await asyncio.sleep(1.1)
+    response = await authorized_client.post("/api/v1/tasks/claim?n=5")
+    assert [t["title"] for t in response.json()["tasks"]] == ["high", "medium"]
+
+
+@pytest.mark.asyncio
+async def test_facet_counts(ac: AsyncClient, create_test_database, cleanup_tables):
+    authorized_client, login_data = await create_authorized_client(ac, "facetuser", "password123")
+
+    await create_task(authorized_client, {'title': 'a', 'description': 'test', 'priority': TaskPriority.HIGH})
+    await create_task(authorized_client, {'title': 'b', 'description': 'test', 'priority': TaskPriority.HIGH})
+    await create_task(authorized_client, {'title': 'c', 'description': 'test', 'status': TaskStatus.DONE})
+
+    response = await authorized_client.get("/api/v1/tasks/tasks?facets=true")
+    assert response.status_code == status.HTTP_200_OK
+    body = response.json()
+    assert len(body["tasks"]) == 3
+    assert body["facets"] == {"total": 3, "status": {"pending": 2, "done": 1}, "priority": {"4": 2, "3": 1}}
+
+    response = await authorized_client.get("/api/v1/tasks/tasks?facets=true&min_priority=4&fields=title")
+    assert response.json()["facets"] == {"total": 2, "status": {"pending": 2}, "priority": {"4": 2}}
+
+    # facets are cached and invalidated together with the list
+    task = (await create_task(authorized_client, {'title': 'd', 'description': 'test',
+                                                   'priority': TaskPriority.HIGHEST}))
+    response = await authorized_client.get("/api/v1/tasks/tasks?facets=true&min_priority=4&fields=title")
+    assert response.json()["facets"]["priority"] == {"4": 2, "5": 1}
+    assert task["id"] in [t["id"] for t in response.json()["tasks"]]
+
+
+@pytest.mark.asyncio
+async def test_batch(ac: AsyncClient, create_test_database, cleanup_tables):
+    authorized_client, login_data = await create_authorized_client(ac, "batchuser", "password123")
+
+    first = await create_task(authorized_client, {'title': 'first', 'description': 'test'})
+    second = await create_task(authorized_client, {'title': 'second', 'description': 'test'})
+    # cached before the batch, must be invalidated by it
+    await authorized_client.get("/api/v1/tasks/tasks?status=pending")
+
+    response = await authorized_client.post("/api/v1/batch", json={"operations": [
+        {"op": "create", "data": {"title": "third", "description": "test"}},
+        {"op": "update", "id": first["id"], "data": {"status": "done"}},
+        {"op": "delete", "id": second["id"]},
+        {"op": "list", "status": "pending"},
+    ]})
+    assert response.status_code == status.HTTP_200_OK
+    results = response.json()
+    assert [r["status"] for r in results] == [201, 200, 204, 200]
+    assert results[1]["body"]["status"] == TaskStatus.DONE
+    assert [t["title"] for t in results[3]["body"]] == ["third"]
+
+    response = await authorized_client.get("/api/v1/tasks/tasks?status=pending")
+    assert [t["title"] for t in response.json()] == ["third"]
+
+    # a failing operation rolls back the whole batch
+    response = await authorized_client.post("/api/v1/batch", json={"operations": [
+        {"op": "create", "data": {"title": "rolled back", "description": "test"}},
+        {"op": "get", "id": second["id"]},
+    ]})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json()["detail"]["index"] == 1
+
+    response = await authorized_client.get("/api/v1/tasks/tasks")
+    assert "rolled back" not in [t["title"] for t in response.json()]
+
+
+@pytest.mark.asyncio
+async def test_single_flight(ac: AsyncClient, create_test_database, cleanup_tables):
+    authorized_client, login_data = await create_authorized_client(ac, "flightuser", "password123")
+    await create_task(authorized_client, {'title': 'shared', 'description': 'test'})
+
+    async def search(coalesce: bool = True):
+        async with TestingAsyncSessionLocal() as session:
+            return await TasksRepository(session).search_tasks("shared", coalesce=coalesce)
+
+    stats = tasks_single_flight.stats()
+    results = await asyncio.gather(*(search() for _ in range(5)))
+    assert all([t.title for t in rows] == ["shared"] for rows in results)
+    assert tasks_single_flight.stats() == {"executed": stats["executed"] + 1, "shared": stats["shared"] + 4}
+
+    await asyncio.gather(*(search(coalesce=False) for _ in range(3)))
+    assert tasks_single_flight.stats()["executed"] == stats["executed"] + 1
+
+
+@pytest.mark.asyncio
+async def test_rate_limit(ac: AsyncClient, create_test_database, cleanup_tables, monkeypatch):
+    authorized_client, login_data = await create_authorized_client(ac, "limituser", "password123")
+    monkeypatch.setattr(search_rate_limit, "per_minute", 2)
+
+    for _ in range(2):
+        response = await authorized_client.get("/api/v1/tasks/tasks/search?search_term=x")
+        assert response.status_code == status.HTTP_200_OK
+
+    response = await authorized_client.get("/api/v1/tasks/tasks/search?search_term=x")
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert 0 < int(response.headers["Retry-After"]) <= 30
+
+    # budgets are per route
+    response = await authorized_client.get("/api/v1/tasks/tasks")
+    assert response.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.asyncio
+async def test_profiling(ac: AsyncClient, create_test_database, cleanup_tables, tmp_path):
+    authorized_client, login_data = await create_authorized_client(ac, "profileuser", "password123")
+    await create_task(authorized_client, {'title': 'profiled', 'description': 'test'})
+
+    profiled_app = ProfilingMiddleware(app, token="debug", directory=str(tmp_path))
+    async with AsyncClient(transport=ASGITransport(app=profiled_app), base_url="http://test",
+                           headers=authorized_client.headers) as client:
+        response = await client.get("/api/v1/tasks/tasks")
+        assert "server-timing" not in response.headers
+        assert response.json()[0]["title"] == "profiled"
+
+        response = await client.get("/api/v1/tasks/tasks", headers={"X-Profile": "debug"})
+        assert response.status_code == status.HTTP_200_OK
+        assert "speedscope" in response.json()["$schema"]
+        assert 'desc="' in response.headers["server-timing"] and "serialize;dur=" in response.headers["server-timing"]
+
+        profiled_app.sample_rate = 1
+        response = await client.get("/api/v1/tasks/tasks")
+        assert response.json()[0]["title"] == "profiled"
+        timing = dict(re.findall(r'(\w+);dur=([\d.]+)', response.headers["server-timing"]))
+        assert set(timing) == {"db", "serialize", "app", "total"} and float(timing["db"]) > 0
+        saved = list(tmp_path.glob("*-GET-api_v1_tasks_tasks.speedscope.json"))
+        assert len(saved) == 1
+        profile = orjson.loads(saved[0].read_bytes())
+        assert "speedscope" in profile["$schema"] and profile["profiles"]
+
+
+@pytest.mark.asyncio
+async def test_import_tasks(ac: AsyncClient, create_test_database, cleanup_tables):
+    authorized_client, login_data = await create_authorized_client(ac, "importuser", "password123")
+    # cached before the import, must be invalidated by it
+    await authorized_client.get("/api/v1/tasks/tasks?facets=true")
+
+    csv_body = ('title,description,priority,status\n'
+                'первая,"в две\nстроки",4,\n'
+                'bad priority,test,9,pending\n'
+                'third,test,,done\n'
+                'no description,,2,pending\n'
+                'fourth,test,1,pending\n').encode()
+
+    async def upload(body: bytes, size: int = 7):
+        # small pieces split lines and multi-byte characters
+        for i in range(0, len(body), size):
+            yield body[i:i + size]
+
+    response = await authorized_client.post("/api/v1/tasks/tasks/import?chunk_size=2", content=upload(csv_body),
+                                            headers={"Content-Type": "text/csv"})
+    assert response.status_code == status.HTTP_200_OK
+    report = [orjson.loads(line) for line in response.text.splitlines()]
+    assert report[0] == {"row": 2, "error": "priority: Input should be 1, 2, 3, 4 or 5"}
+    assert {"row": 4, "error": "description: Field required"} in report
+    assert report[-1] == {"rows": 5, "imported": 3, "errors": 2, "done": True}
+
+    body = (await authorized_client.get("/api/v1/tasks/tasks?facets=true&sort=priority&order=desc")).json()
+    assert [task["title"] for task in body["tasks"]] == ["первая", "third", "fourth"]
+    assert body["tasks"][0]["description"] == "в две\nстроки"
+    assert body["tasks"][0]["customer_name"] == "importuser"
+    assert body["facets"] == {"total": 3, "status": {"pending": 2, "done": 1}, "priority": {"4": 1, "3": 1, "1": 1}}
+
+    # a quote inside a value is literal, one never closed fails its own row only
+    stray_body = b'title,description\nstray "quote,test\n"unclosed,test\nafter,test\n'
+    response = await authorized_client.post("/api/v1/tasks/tasks/import", content=upload(stray_body),
+                                            headers={"Content-Type": "text/csv"})
+    report = [orjson.loads(line) for line in response.text.splitlines()]
+    assert report[0] == {"row": 2, "error": "Unterminated quoted value"}
+    assert report[-1] == {"rows": 3, "imported": 2, "errors": 1, "done": True}
+
+    ndjson_body = b'{"title": "json", "description": "test"}\nnot json\n[1]\n'
+    response = await authorized_client.post("/api/v1/tasks/tasks/import", content=ndjson_body,
+                                            headers={"Content-Type": "application/x-ndjson"})
+    report = [orjson.loads(line) for line in response.text.splitlines()]
+    assert [line.get("row") for line in report[:-1]] == [2, 3]
+    assert report[-1] == {"rows": 3, "imported": 1, "errors": 2, "done": True}
+
+    # per-user counters are bumped in bulk
+    stats = (await authorized_client.get(f"/api/v1/users/users/{body['tasks'][0]['user_id']}/stats")).json()
+    assert stats["total"] == 6 and stats["by_status"] == {"pending": 5, "done": 1}
+
+    response = await authorized_client.post("/api/v1/tasks/tasks/import", content=b"{}",
+                                            headers={"Content-Type": "application/json"})
+    assert response.status_code == status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+
+
+@pytest.mark.asyncio
+async def test_task_history(ac: AsyncClient, create_test_database, cleanup_tables):
+    authorized_client, login_data = await create_authorized_client(ac, "historyuser", "password123")
+    task = await create_task(authorized_client, {'title': 'history', 'description': 'history',
+                                                 'priority': TaskPriority.LOW})
+    url = f"/api/v1/tasks/tasks/{task['id']}"
+
+    await authorized_client.put(url, json={"status": TaskStatus.DONE})
+    await authorized_client.put(url, json={"title": "renamed"})
+    await authorized_client.put(url, json={"status": TaskStatus.PENDING, "priority": TaskPriority.HIGH})
+
+    expected = [("status", "pending", "done"), ("status", "done", "pending"), ("priority", 2, 4)]
+
+    # still buffered in process
+    response = await authorized_client.get(f"{url}/history")
+    assert response.status_code == status.HTTP_200_OK
+    history = response.json()
+    assert [(entry["field"], entry["old_value"], entry["new_value"]) for entry in history] == expected
+    assert history[0]["changed_at"] < history[1]["changed_at"] == history[2]["changed_at"]
+
+    # flushed in one batch, served from task_history, outlives the task
+    async with TestingAsyncSessionLocal() as session:
+        assert await task_history.flush(session) == 3
+        assert len((await session.scalars(select(TaskHistory))).all()) == 3
+    assert task_history.stats()["pending"] == 0
+    await authorized_client.delete(url)
+
+    response = await authorized_client.get(f"{url}/history")
+    assert [(entry["field"], entry["old_value"], entry["new_value"]) for entry in response.json()] == expected
+
+    response = await authorized_client.get(f"/api/v1/tasks/tasks/{task['id'] + 1}/history")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    # entries recorded while a flush fails are still capped, the oldest are dropped
+    failing = HistoryLog(TaskHistory, "task_id", ("status",), batch_size=2, max_pending=2)
+    failing.record([{"task_id": task["id"], "field": "status", "old_value": "pending", "new_value": "done",
+                     "changed_at": datetime.utcnow()}])
+
+    class FailingSession:
+        async def execute(self, *args):
+            failing.record([{"task_id": task["id"], "field": "status", "old_value": "done",
+                             "new_value": "pending", "changed_at": datetime.utcnow()}] * 2)
+            raise ConnectionError("database is down")
+
+        async def rollback(self):
+            pass
+
+    with pytest.raises(ConnectionError):
+        await failing.flush(FailingSession())
+    assert failing.stats() == {"pending": 2, "written": 0, "dropped": 1}
+    assert [entry["new_value"] for entry in failing._pending] == ["pending", "pending"]
+
+
+@pytest.mark.asyncio
+async def test_msgpack_responses(ac: AsyncClient, create_test_database, cleanup_tables):
+    authorized_client, login_data = await create_authorized_client(ac, "msgpackuser", "password123")
+    await create_task(authorized_client, {'title': 'packed', 'description': 'test', 'status': TaskStatus.DONE})
+    packed = {"Accept": "application/msgpack"}
+
+    for url in ["/api/v1/tasks/tasks", "/api/v1/tasks/tasks?facets=true", "/api/v1/tasks/tasks?fields=title,status",
+                "/api/v1/tasks/tasks/search?search_term=pack", "/api/v1/tasks/changes"]:
+        as_json = await authorized_client.get(url)
+        assert as_json.headers["content-type"] == "application/json"
+        response = await authorized_client.get(url, headers=packed)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"] == "application/msgpack"
+        assert response.headers["vary"] == "Accept"
+        # same schema and values, only the encoding differs
+        assert msgpack.unpackb(response.content) == as_json.json()
+
+    # JSON stays the default and wins when the client prefers it
+    for accept in ["*/*", "application/json, application/msgpack;q=0.5", "text/html"]:
+        response = await authorized_client.get("/api/v1/tasks/tasks", headers={"Accept": accept})
+        assert response.headers["content-type"] == "application/json"
+
+    # each representation has its own ETag
+    as_json = await authorized_client.get("/api/v1/tasks/tasks")
+    response = await authorized_client.get("/api/v1/tasks/tasks", headers=packed)
+    assert response.headers["etag"] != as_json.headers["etag"]
+    response = await authorized_client.get("/api/v1/tasks/tasks",
+                                           headers={**packed, "If-None-Match": response.headers["etag"]})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
@@ -0,0 +1,208 @@
+import asyncio
+from datetime import timedelta
+from typing import AsyncGenerator
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import delete, update, select, func
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from starlette import status
+
+
+from tests.test_db import TEST_DATABASE_URL
+from Services.Tasks.model import Task, ArchivedTask, UserTaskCounter
+from Services.Tasks.repository import TasksRepository
+from Services.Users.model import User
+from Services.Users.repository import UsersRepository
+from Shared.Base.BaseModel import Base
+from Shared.Database.Sessions import get_session
+from app import app
+
+
+# Создаем асинхронный движок
+test_engine = create_async_engine(TEST_DATABASE_URL, echo=False)
+
+
+# Создаем асинхронную сессию
+TestingAsyncSessionLocal = async_sessionmaker(
+    bind=test_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
+
+
+# Функция для подмены зависимости get_session
+async def override_get_session():
+    async with TestingAsyncSessionLocal() as session:
+        yield session
+
+
+# Функция для подмены зависимостей в тестах
+def override_dependencies():
+    app.dependency_overrides[get_session] = override_get_session
+
+
+@pytest.fixture(scope="function")
+async def create_test_database():
+    """Создает таблицы перед каждым тестом и удаляет данные после."""
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+@pytest.fixture(scope="function")
+async def cleanup_tables(create_test_database):
+    """Очистка таблиц после каждого теста."""
+    async with AsyncSession(test_engine) as session:
+        await session.execute(delete(User))
+        await session.commit()
+
+
+# Выполняем подмену зависимостей
+override_dependencies()
+
+
+@pytest.fixture(scope="session")
+def event_loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="function")
+async def ac(event_loop) -> AsyncGenerator[AsyncClient, None]:
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        yield ac
+
+
+async def register_user(ac: AsyncClient, user_data) -> dict:
+    """Регистрирует пользователя и возвращает данные пользователя."""
+    response = await ac.post("/api/v1/auth/register", json=user_data)
+    assert response.status_code == status.HTTP_201_CREATED
+    return response.json()
+
+
+async def login_user(ac: AsyncClient, username: str, password: str) -> dict:
+    """Логинит пользователя и возвращает токены."""
+    form_data = {"username": username, "password": password}
+    response = await ac.post("/api/v1/auth/login", data=form_data)
+    assert response.status_code == status.HTTP_200_OK
+    return response.json()
+
+
+async def create_authorized_client(ac: AsyncClient, username: str, password: str):
+    """Регистрирует, логинит пользователя и возвращает клиент с токеном авторизации."""
+    user_data = {
+        "name": "testuser",
+        "email": username,
+        "password": password,
+    }
+    await register_user(ac, user_data)
+    login_data = await login_user(ac, username, password)
+    access_token = login_data["access_token"]
+    ac.headers["Authorization"] = f"Bearer {access_token}"  # Добавляем токен в заголовок
+
+    return ac, login_data
+
+
+@pytest.mark.asyncio
+async def test_users_page(ac: AsyncClient, create_test_database, cleanup_tables):
+    """Test for paginated users listing"""
+    for i in range(3):
+        await register_user(ac, {"name": f"pageuser{i}", "email": f"pageuser{i}@example.com", "password": "password123"})
+    await register_user(ac, {"name": "other", "email": "other@example.com", "password": "password123"})
+
+    response = await ac.get("/api/v1/users/users/?limit=2&name_prefix=pageuser")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert [u["name"] for u in data["items"]] == ["pageuser0", "pageuser1"]
+    assert "password" not in data["items"][0]
+    assert "refresh_token" not in data["items"][0]
+    assert data["next_cursor"] is not None
+
+    response = await ac.get(f"/api/v1/users/users/?limit=2&name_prefix=pageuser&cursor={data['next_cursor']}")
+    data = response.json()
+    assert [u["name"] for u in data["items"]] == ["pageuser2"]
+    assert data["next_cursor"] is None
+
+    response = await ac.get("/api/v1/users/users/?active=false")
+    assert response.json()["items"] == []
+
+
+@pytest.mark.asyncio
+async def test_deactivate_and_purge_users(ac: AsyncClient, create_test_database, cleanup_tables):
+    """Test for bulk deactivation and purge of users with their tasks"""
+    victim = await register_user(ac, {"name": "victim", "email": "victim@example.com", "password": "password123"})
+    login_data = await login_user(ac, "victim", "password123")
+    ac.headers["Authorization"] = f"Bearer {login_data['access_token']}"
+    response = await ac.post("/api/v1/tasks/tasks", json={"title": "t", "description": "d"})
+    assert response.status_code == status.HTTP_201_CREATED
+    for _ in range(3):
+        await ac.post("/api/v1/tasks/tasks", json={"title": "t", "description": "d", "status": "done"})
+    async with TestingAsyncSessionLocal() as session:
+        assert await TasksRepository(session).archive_done(timedelta(0)) == 3
+
+    authorized_client, _ = await create_authorized_client(ac, "admin@example.com", "password123")
+
+    # operator routes: a regular user can not deactivate or purge other accounts
+    response = await authorized_client.post("/api/v1/users/users/deactivate", json={"ids": [victim["id"]]})
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+    response = await authorized_client.delete("/api/v1/users/users/inactive")
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    async with AsyncSession(test_engine) as session:
+        await session.execute(update(User).where(User.name == "testuser").values(is_admin=True))
+        await session.commit()
+
+    response = await authorized_client.post("/api/v1/users/users/deactivate", json={"ids": [victim["id"]]})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"deactivated": 1}
+
+    # archived tasks go in batches of tasks_batch_size, like live ones
+    async with TestingAsyncSessionLocal() as session:
+        assert await UsersRepository(session).purge_inactive_users(tasks_batch_size=2) == 1
+        assert await session.scalar(select(func.count()).select_from(ArchivedTask)) == 0
+        assert await session.scalar(select(func.count()).select_from(Task)) == 0
+
+    response = await authorized_client.delete("/api/v1/users/users/inactive")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"purged": 0}
+
+    response = await authorized_client.get("/api/v1/users/users/")
+    assert [u["name"] for u in response.json()["items"]] == ["testuser"]
+
+
+@pytest.mark.asyncio
+async def test_user_task_stats(ac: AsyncClient, create_test_database, cleanup_tables):
+    """Test for per-user task counters and their repair"""
+    authorized_client, _ = await create_authorized_client(ac, "stats@example.com", "password123")
+    me = (await authorized_client.get("/api/v1/users/users/")).json()["items"][0]
+
+    ids = []
+    for priority in [3, 3, 5]:
+        response = await authorized_client.post("/api/v1/tasks/tasks",
+                                                json={"title": "t", "description": "d", "priority": priority})
+        ids.append(response.json()["id"])
+    await authorized_client.put(f"/api/v1/tasks/tasks/{ids[0]}", json={"status": "done", "priority": 4})
+    await authorized_client.delete(f"/api/v1/tasks/tasks/{ids[2]}")
+
+    expected = {"user_id": me["id"], "total": 2,
+                "by_status": {"pending": 1, "done": 1}, "by_priority": {"3": 1, "4": 1}}
+    response = await authorized_client.get(f"/api/v1/users/users/{me['id']}/stats")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == expected
+
+    # drifted counters are rebuilt by the repair job
+    async with AsyncSession(test_engine) as session:
+        await session.execute(delete(UserTaskCounter))
+        await session.commit()
+    async with TestingAsyncSessionLocal() as session:
+        await TasksRepository(session).rebuild_counters([me["id"]])
+    response = await authorized_client.get(f"/api/v1/users/users/{me['id']}/stats")
+    assert response.json() == expected
+
+    response = await authorized_client.get(f"/api/v1/users/users/{me['id'] + 1000}/stats")
+    assert response.status_code == status.HTTP_404_NOT_FOUND